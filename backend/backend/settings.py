@@ -3,9 +3,8 @@ Django settings for backend project.
 """
 
 import os
-import dj_database_url
+from corsheaders.defaults import default_headers
 from pathlib import Path
-import logging
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,12 +40,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be first
+    'core.logs.RequestLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.JsonCompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.sharding.ShardRoutingMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,14 +74,29 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
+def database_from_url(url):
+    """Parse a database URL; SSL is only required for network databases"""
+    import dj_database_url  # only needed when a URL is configured
+
+    return dj_database_url.parse(
+        url,
+        conn_max_age=600,
+        conn_health_checks=True,
+        ssl_require=not url.startswith('sqlite'),
+    )
+
+def parse_env_mapping(value, convert=str):
+    """``"django.db.backends=DEBUG,core=INFO"`` -> ``{name: convert(value)}``"""
+    mapping = {}
+    for item in (value or '').split(','):
+        name, sep, setting = item.partition('=')
+        if sep and name.strip():
+            mapping[name.strip()] = convert(setting.strip())
+    return mapping
+
 if 'DATABASE_URL' in os.environ:
     DATABASES = {
-        'default': dj_database_url.config(
-            default=os.environ.get('DATABASE_URL'),
-            conn_max_age=600,
-            conn_health_checks=True,
-            ssl_require=True,
-        )
+        'default': database_from_url(os.environ.get('DATABASE_URL'))
     }
 else:
     DATABASES = {
@@ -92,6 +110,16 @@ else:
     }
 }
 
+# Owner sharding: extra databases for Client/Worker/Task rows, e.g.
+# SHARD_DATABASE_URLS="sqlite:///shard_1.sqlite3,sqlite:///shard_2.sqlite3"
+# 'default' is always shard 0 and keeps users, sessions and the shard lookup table.
+SHARD_DATABASES = ['default']
+for index, url in enumerate(filter(None, os.environ.get('SHARD_DATABASE_URLS', '').split(',')), start=1):
+    DATABASES[f'shard_{index}'] = database_from_url(url.strip())
+    SHARD_DATABASES.append(f'shard_{index}')
+
+DATABASE_ROUTERS = ['core.sharding.OwnerShardRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -206,7 +234,7 @@ if not DEBUG:
     
     # CRITICAL: Add these lines
     CORS_ALLOW_CREDENTIALS = True
-    CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+    CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Preference-Applied', 'X-Request-ID', 'Idempotent-Replayed', 'X-Profile-ID']
     
     # HTTP settings
     CSRF_COOKIE_SECURE = True
@@ -229,7 +257,7 @@ else:
         "https://osv-founder-command-center.vercel.app",
     ]
     CORS_ALLOW_CREDENTIALS = True
-    CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken']
+    CORS_EXPOSE_HEADERS = ['Content-Type', 'X-CSRFToken', 'ETag', 'Preference-Applied', 'X-Request-ID', 'Idempotent-Replayed', 'X-Profile-ID']
     
     CSRF_TRUSTED_ORIGINS = [
         "http://localhost:3000",
@@ -240,6 +268,7 @@ else:
     ]
 
 # These should be outside the if/else block to apply in both environments
+CORS_ALLOW_HEADERS = (*default_headers, 'if-match', 'prefer', 'idempotency-key', 'x-profile')
 CSRF_COOKIE_SAMESITE = 'None'
 SESSION_COOKIE_SAMESITE = 'None'
 CSRF_COOKIE_HTTPONLY = False
@@ -253,17 +282,120 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # The browsable API (templates, forms) is only loaded where it is used
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
-        'rest_framework.renderers.BrowsableAPIRenderer',
+        *(['rest_framework.renderers.BrowsableAPIRenderer']
+          if os.environ.get('BROWSABLE_API', str(DEBUG)) == 'True' else []),
     ],
+    # Token buckets (core/throttling.py): N tokens, refilled N per period
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),       # per client IP
+        'csrf': os.environ.get('THROTTLE_CSRF_RATE', '60/min'),         # per client IP
+        'expensive': os.environ.get('THROTTLE_EXPENSIVE_RATE', '30/min'),  # per owner
+    },
+    # Render's proxy appends the client address to X-Forwarded-For
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0 if DEBUG else 1)),
+}
+
+# Shared state for throttling and admission control. Without REDIS_URL every
+# worker process counts on its own, so budgets are per worker.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+
+# Cluster-wide cap on concurrently running heavy actions, and how long a
+# crashed request can hold its slot
+ADMISSION_CONCURRENCY = {
+    'analytics': 4,
+    'calendar': 4,
+    'sync': 4,
+    **parse_env_mapping(os.environ.get('ADMISSION_CONCURRENCY'), int),
 }
+ADMISSION_LEASE_SECONDS = int(os.environ.get('ADMISSION_LEASE_SECONDS', 60))
+
+# Offline replay (POST /api/sync/): how long a retried idempotency key returns
+# its first result, and the largest mutation log accepted in one request
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', 24 * 7))
+SYNC_MAX_MUTATIONS = int(os.environ.get('SYNC_MAX_MUTATIONS', 500))
+
+# Staff request profiling (core/profiling.py): X-Profile: 1 or ?_profile=1,
+# off unless REQUEST_PROFILING=True. Stack sampling interval, and how many
+# profiles admin keeps.
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', 'False') == 'True'
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILE_SAMPLE_INTERVAL_MS', 1))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+# Process-wide GIL switch interval while a profile runs (e.g. 0.25); unset
+# leaves the interpreter default, which limits samples to about one per 5 ms
+PROFILE_SWITCH_INTERVAL_MS = float(os.environ.get('PROFILE_SWITCH_INTERVAL_MS', 0)) or None
+
+# ==================== EMAIL & DIGESTS ====================
+# Locally, mail is written to files (or set EMAIL_BACKEND to the locmem backend)
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.filebased.EmailBackend' if DEBUG else 'django.core.mail.backends.smtp.EmailBackend'
+)
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True') == 'True'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'OSV Command Center <noreply@localhost>')
+
+# send_digests (core/digest.py): delivery backend, owners per batch, tasks
+# listed per section
+DIGEST_BACKEND = os.environ.get('DIGEST_BACKEND', 'core.digest.EmailDigestBackend')
+DIGEST_BATCH_SIZE = int(os.environ.get('DIGEST_BATCH_SIZE', 100))
+DIGEST_MAX_ITEMS = int(os.environ.get('DIGEST_MAX_ITEMS', 10))
+
+# materialize_recurring_tasks (core/recurrence.py): how many days ahead
+# occurrences are created, and rules read per batch
+RECURRENCE_WINDOW_DAYS = int(os.environ.get('RECURRENCE_WINDOW_DAYS', 14))
+RECURRENCE_BATCH_SIZE = int(os.environ.get('RECURRENCE_BATCH_SIZE', 500))
+
+# JSON bodies smaller than this are sent uncompressed
+JSON_COMPRESSION_MIN_BYTES = int(os.environ.get('JSON_COMPRESSION_MIN_BYTES', 1024))
 
-# Debug CORS
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
+# Admin changelists count exactly up to this many rows (or the page being viewed),
+# then use planner estimates or show "N+"
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', 10000))
 
-# Log CORS settings
-logger.debug(f"DEBUG: {DEBUG}")
-logger.debug(f"CORS_ALLOWED_ORIGINS: {CORS_ALLOWED_ORIGINS}")
-logger.debug(f"CORS_ALLOW_CREDENTIALS: {CORS_ALLOW_CREDENTIALS}")
\ No newline at end of file
+# ==================== LOGGING ====================
+# JSON lines written by a background thread (see core/logs.py).
+# LOG_LEVELS="django.db.backends=DEBUG,core=DEBUG" sets per-logger levels;
+# LOG_SAMPLE="django.db.backends=0.01" keeps a fraction of their debug/info records.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = {name: level.upper() for name, level in parse_env_mapping(os.environ.get('LOG_LEVELS')).items()}
+LOG_SAMPLE = parse_env_mapping(os.environ.get('LOG_SAMPLE'), float)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {'()': 'core.logs.SamplingFilter', 'rates': LOG_SAMPLE},
+        'request_context': {'()': 'core.logs.RequestContextFilter'},
+    },
+    'handlers': {
+        'background': {
+            'class': 'core.logs.BackgroundJsonHandler',
+            'filters': ['sampling', 'request_context'],
+            'queue_size': int(os.environ.get('LOG_QUEUE_SIZE', 10000)),
+        },
+    },
+    'root': {'handlers': ['background'], 'level': LOG_LEVEL},
+    'loggers': {
+        # Replace Django's console/mail_admins handlers; records reach root
+        'django': {'level': LOG_LEVEL, 'propagate': True},
+        'django.server': {'level': LOG_LEVEL, 'propagate': True},
+        **{name: {'level': level} for name, level in LOG_LEVELS.items()},
+    },
+}
@@ -1,20 +1,340 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Client, Worker, Task
+from django.contrib.admin.views.main import PAGE_VAR
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, models, transaction
+from django.utils.functional import cached_property
+from django.utils.text import Truncator
+from .counters import lock_counter_state
+from .models import Client, Worker, Task, RecurringTask, OwnerShard, RequestProfile
+from .sharding import shard_aliases, shard_for_owner, is_sharded, is_sharded_model, ensure_owner_stub
+
+ADMIN_SHARD_SESSION_KEY = 'admin_shard'
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """Pick which shard the changelist reads from (only shown when sharded)"""
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in shard_aliases()]
+
+    def value(self):
+        return super().value() or 'default'
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.value() == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}),
+                'display': title,
+            }
+
+    def queryset(self, request, queryset):
+        # ShardedModelAdmin.get_queryset already picked the database
+        return queryset
+
+
+class ShardedModelAdmin(admin.ModelAdmin):
+    """
+    Admin for owner-sharded models. Staff choose a shard from the sidebar; the
+    choice is kept in the session so change, delete and autocomplete views read
+    and write the same database. New rows always go to their owner's shard,
+    and edits that would move a row to another shard are refused.
+    """
+
+    def admin_shard(self, request):
+        alias = request.GET.get('shard') or request.session.get(ADMIN_SHARD_SESSION_KEY)
+        return alias if alias in shard_aliases() else 'default'
+
+    def changelist_view(self, request, extra_context=None):
+        if request.GET.get('shard') in shard_aliases():
+            request.session[ADMIN_SHARD_SESSION_KEY] = request.GET['shard']
+        return super().changelist_view(request, extra_context)
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if is_sharded():
+            return (ShardListFilter,) + tuple(list_filter)
+        return list_filter
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).using(self.admin_shard(request))
+
+    def get_form(self, request, obj=None, change=False, **kwargs):
+        form = super().get_form(request, obj, change=change, **kwargs)
+        stored_on = obj._state.db if obj is not None else None
+
+        class ShardCheckedForm(form):
+            def clean(self):
+                cleaned_data = super().clean()
+                owner = cleaned_data.get('owner')
+                if owner is None:
+                    return cleaned_data
+                alias = shard_for_owner(owner.pk)
+                if stored_on is not None and alias != stored_on:
+                    self.add_error('owner', (
+                        f"This owner's data is on {alias}, not {stored_on}. "
+                        "Move owners with the move_owner_shard command."
+                    ))
+                for name, value in cleaned_data.items():
+                    if isinstance(value, models.Model) and is_sharded_model(type(value)) and value._state.db != alias:
+                        self.add_error(name, f"Pick one from {alias}, the owner's shard (see the shard filter).")
+                return cleaned_data
+
+        return ShardCheckedForm
+
+    def save_model(self, request, obj, form, change):
+        alias = obj._state.db if change else shard_for_owner(obj.owner_id)
+        ensure_owner_stub(obj.owner_id, alias)
+        obj.save(using=alias)
+
+    def delete_model(self, request, obj):
+        obj.delete(using=obj._state.db)
+
+    def delete_queryset(self, request, queryset):
+        queryset.using(self.admin_shard(request)).delete()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.related_model in (Client, Worker):
+            kwargs['using'] = self.admin_shard(request)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Keeps changelist counts cheap on large tables: unfiltered lists use the
+    planner's row estimate once a table is past ``ADMIN_EXACT_COUNT_LIMIT``,
+    filtered lists count at most that many rows or through the page after
+    ``page_number``. A count that stops early sets ``truncated`` (shown as
+    "10000+") and still leaves the next page reachable.
+    """
+
+    def __init__(self, *args, page_number=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.page_number = page_number
+        self.truncated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset)
+            if estimate is not None and estimate > limit:
+                return estimate
+        window = max(limit, (self.page_number + 1) * self.per_page)
+        count = queryset.order_by()[:window + 1].count()
+        if count > window:
+            self.truncated = True
+            return window
+        return count
+
+
+def estimated_row_count(queryset):
+    """Planner statistics for the queryset's table, or None if unavailable"""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1 means the table was never analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            except DatabaseError:
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class SearchableRelatedFilter(admin.SimpleListFilter):
+    """
+    Sidebar filter with a search box instead of one link per related row, so
+    the page never loads every worker or client in the system. Matches names
+    by prefix; set ``related_field`` on subclasses.
+    """
+    template = 'admin/core/search_filter.html'
+    related_field = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'value': self.value() or '',
+            'preserved': [
+                (name, value) for name, value in changelist.params.items()
+                if name != self.parameter_name
+            ],
+        }
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(**{f'{self.related_field}_id': value})
+        return queryset.filter(**{f'{self.related_field}__name__istartswith': value})
+
+
+class WorkerSearchFilter(SearchableRelatedFilter):
+    title = 'assigned worker'
+    parameter_name = 'worker'
+    related_field = 'assigned_worker'
+
+
+class ClientSearchFilter(SearchableRelatedFilter):
+    title = 'client'
+    parameter_name = 'client'
+    related_field = 'client'
+
+
+class PerformanceModelAdmin(ShardedModelAdmin):
+    """Admin performance mode: bounded counts and no per-row owner lookups"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ('owner',)
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            page_number = int(request.GET.get(PAGE_VAR, 1))
+        except ValueError:
+            page_number = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, page_number=page_number)
+
 
 # Register your models here.
 @admin.register(Client)
-class ClientAdmin(admin.ModelAdmin):
+class ClientAdmin(PerformanceModelAdmin):
     list_display = ('name', 'contact_email', 'created_at')
     search_fields = ('name',)
 
 @admin.register(Worker)
-class WorkerAdmin(admin.ModelAdmin):
+class WorkerAdmin(PerformanceModelAdmin):
     list_display = ('name', 'skills', 'availability')
     search_fields = ('name',)
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
-    list_display = ('description', 'status', 'assigned_worker', 'client', 'due_date')
-    list_filter = ('status', 'assigned_worker')
-    search_fields = ('description',)
+class TaskAdmin(PerformanceModelAdmin):
+    list_display = ('summary', 'status', 'assigned_worker', 'client', 'due_date')
+    list_filter = ('status', WorkerSearchFilter, ClientSearchFilter)
+    list_select_related = ('owner', 'client__owner', 'assigned_worker__owner')
+    search_fields = ('search_text',)
     autocomplete_fields = ('assigned_worker', 'client')  # For easy selection
+    raw_id_fields = ('recurrence',)
+
+    @admin.display(description='Description')
+    def summary(self, obj):
+        return Truncator(obj.search_text).chars(80) or '(empty)'
+
+    # Edits lock the task first, like the API, so a concurrent write can't
+    # make both apply the same counter change (core/counters.py)
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        with transaction.atomic(using=obj._state.db):
+            lock_counter_state(obj, obj._state.db)
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic(using=obj._state.db):
+            lock_counter_state(obj, obj._state.db)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        alias = self.admin_shard(request)
+        tasks = Task._base_manager.using(alias)
+        with transaction.atomic(using=alias):
+            # QuerySet.delete() drops select_for_update, so lock the rows
+            # first; the delete then collects them as stored
+            pks = list(
+                tasks.select_for_update()
+                .filter(pk__in=list(queryset.using(alias).values_list('pk', flat=True)))
+                .values_list('pk', flat=True)
+            )
+            tasks.filter(pk__in=pks).delete()
+
+    def get_search_results(self, request, queryset, search_term):
+        # search_text is stored lower-cased, so plain LIKE works and can use
+        # the trigram index on PostgreSQL; every word must match
+        for word in search_term.lower().split():
+            queryset = queryset.filter(search_text__contains=word)
+        return queryset, False
+
+@admin.register(RecurringTask)
+class RecurringTaskAdmin(PerformanceModelAdmin):
+    list_display = ('rule', 'starts_on', 'is_active', 'materialized_through', 'client', 'assigned_worker')
+    list_filter = ('is_active',)
+    list_select_related = ('owner', 'client__owner', 'assigned_worker__owner')
+    autocomplete_fields = ('assigned_worker', 'client')
+    readonly_fields = ('materialized_through',)
+
+@admin.register(OwnerShard)
+class OwnerShardAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'alias', 'is_frozen', 'assigned_at')
+    list_filter = ('alias', 'is_frozen')
+    search_fields = ('owner__username',)
+    readonly_fields = ('alias', 'is_frozen', 'assigned_at')  # Use move_owner_shard to change
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Read-only list of staff request profiles with artifact downloads"""
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms',
+                    'sql_count', 'sql_ms', 'response_bytes', 'user', 'downloads')
+    list_filter = ('method', 'status_code')
+    search_fields = ('path',)
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    exclude = ('flamegraph', 'sql_report')
+    readonly_fields = ('user', 'method', 'path', 'status_code', 'duration_ms', 'sql_count', 'sql_ms',
+                       'response_bytes', 'samples', 'serializer_fields', 'created_at', 'downloads')
+    artifacts = {
+        'flamegraph': ('flamegraph', 'folded', 'text/plain'),
+        'sql': ('sql_report', 'sql.txt', 'text/plain'),
+    }
+
+    def get_queryset(self, request):
+        # The artifacts can be large; only the download view reads them
+        return super().get_queryset(request).defer('flamegraph', 'sql_report')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/download/<str:artifact>/', self.admin_site.admin_view(self.download),
+                 name='core_requestprofile_download'),
+        ] + super().get_urls()
+
+    def download(self, request, pk, artifact):
+        if not self.has_view_permission(request) or artifact not in self.artifacts:
+            return HttpResponse(status=404)
+        field, extension, content_type = self.artifacts[artifact]
+        profile = get_object_or_404(RequestProfile.objects.only(field), pk=pk)
+        response = HttpResponse(getattr(profile, field), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}.{extension}"'
+        return response
+
+    @admin.display(description='Artifacts')
+    def downloads(self, obj):
+        return format_html(
+            '<a href="{}">flame graph</a> | <a href="{}">SQL</a>',
+            reverse('admin:core_requestprofile_download', args=[obj.pk, 'flamegraph']),
+            reverse('admin:core_requestprofile_download', args=[obj.pk, 'sql']),
+        )
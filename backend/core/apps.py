@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.models.signals import pre_delete, post_migrate, post_save, post_delete
+        from .caching import bump_owner_version
+        from .counters import task_deleted, task_saved
+        from .models import Client, Worker, Task
+        from .sharding import delete_owner_rows, reserve_id_ranges, sync_owner_stub
+
+        pre_delete.connect(delete_owner_rows, sender=User, dispatch_uid='core.delete_owner_rows')
+        post_save.connect(sync_owner_stub, sender=User, dispatch_uid='core.sync_owner_stub')
+        post_migrate.connect(reserve_id_ranges, sender=self, dispatch_uid='core.reserve_id_ranges')
+
+        for model in (Client, Worker, Task):
+            post_save.connect(bump_owner_version, sender=model, dispatch_uid=f'core.bump_version.{model.__name__}')
+            post_delete.connect(bump_owner_version, sender=model, dispatch_uid=f'core.bump_version_delete.{model.__name__}')
+
+        # Client/Worker task counters (core/counters.py)
+        post_save.connect(task_saved, sender=Task, dispatch_uid='core.task_counters_saved')
+        post_delete.connect(task_deleted, sender=Task, dispatch_uid='core.task_counters_deleted')
@@ -0,0 +1,152 @@
+"""
+HTTP validators for read endpoints.
+
+Validators are built from cheap aggregates instead of hashing the rendered body:
+the per-owner ``OwnerVersion`` counter (bumped on every Client/Worker/Task
+write, so nested data in a task list is covered too), plus the row count and
+``max(updated_at)`` of the queryset being served. Conditional requests are
+answered with ``304`` before the serializer runs.
+"""
+
+import hashlib
+
+from django.db.models import Count, F, Max
+from django.db.models.signals import post_save
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+from .models import OwnerVersion
+
+# Suffixes added by JsonCompressionMiddleware so each content-coding keeps a
+# distinct strong ETag; stripped again when comparing If-None-Match.
+ENCODING_ETAG_SUFFIXES = ('-br', '-gzip')
+
+
+def bump_owner_version(sender, instance, using, **kwargs):
+    """post_save/post_delete on owner-scoped models"""
+    owner_id = instance.owner_id
+    updated = OwnerVersion.objects.using(using).filter(owner_id=owner_id).update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+    # Deletes never create the row: during a user cascade it is already gone
+    if not updated and kwargs.get('signal') is post_save:
+        OwnerVersion.objects.using(using).get_or_create(owner_id=owner_id, defaults={'version': 1})
+
+
+def bump_owner_versions(using, owner_ids):
+    """``bump_owner_version`` for rows written without signals, in two queries"""
+    owner_ids = list(owner_ids)
+    OwnerVersion.objects.using(using).bulk_create(
+        [OwnerVersion(owner_id=owner_id) for owner_id in owner_ids], ignore_conflicts=True
+    )
+    OwnerVersion.objects.using(using).filter(owner_id__in=owner_ids).update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+
+
+def owner_version(owner):
+    """(version, updated_at) for an owner, (0, None) before the first write"""
+    row = OwnerVersion.objects.filter(owner_id=owner.pk).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def compute_validators(request, owner, queryset=None):
+    """Return (etag, last_modified) for the response about to be built"""
+    version, last_modified = owner_version(owner)
+    count, max_updated = None, None
+    if queryset is not None:
+        stats = queryset.order_by().aggregate(count=Count('pk'), max_updated=Max('updated_at'))
+        count, max_updated = stats['count'], stats['max_updated']
+        if max_updated and (last_modified is None or max_updated > last_modified):
+            last_modified = max_updated
+
+    renderer = getattr(request, 'accepted_renderer', None)
+    key = '|'.join(str(part) for part in (
+        request.get_full_path(),
+        getattr(renderer, 'format', ''),
+        owner.pk,
+        version,
+        count,
+        max_updated.isoformat() if max_updated else '',
+    ))
+    return hashlib.sha1(key.encode()).hexdigest(), last_modified
+
+
+def parse_request_etags(header):
+    """Quoted ETags from an If-Match/If-None-Match header, encoding suffixes removed"""
+    tags = set()
+    for tag in parse_etags(header):
+        for suffix in ENCODING_ETAG_SUFFIXES:
+            if tag.endswith(suffix + '"'):
+                tag = tag[:-len(suffix) - 1] + '"'
+        tags.add(tag)
+    return tags
+
+
+def is_not_modified(request, etag, last_modified):
+    """RFC 9110 evaluation: If-None-Match wins over If-Modified-Since"""
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = parse_request_etags(if_none_match)
+        return '*' in tags or quote_etag(etag) in tags
+
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE'))
+    if if_modified_since is None or last_modified is None:
+        return False
+    return int(last_modified.timestamp()) <= if_modified_since
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Let the browser keep the body but revalidate on every use
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag/Last-Modified to ``list`` and ``retrieve`` of an owner-scoped
+    ModelViewSet. Custom read actions can use ``conditional_response``.
+    """
+
+    def conditional_response(self, request, build_response, queryset=None):
+        etag, last_modified = compute_validators(request, request.user, queryset)
+        if is_not_modified(request, etag, last_modified):
+            response = set_validators(HttpResponseNotModified(), etag, last_modified)
+            # JsonCompressionMiddleware restores the encoding suffix and Vary
+            response.json_not_modified = True
+            return response
+        response = build_response()
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(
+            request,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs),
+            queryset
+        )
+
+    def detail_queryset(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self.get_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+
+    def detail_etag(self, request):
+        """The ETag ``retrieve`` currently serves, for If-Match on writes"""
+        return compute_validators(request, request.user, self.detail_queryset())[0]
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.detail_queryset()
+        return self.conditional_response(
+            request,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+            queryset
+        )
@@ -0,0 +1,191 @@
+"""
+Denormalized task counters on Client and Worker.
+
+``open_tasks``, ``blocked_tasks``, ``done_tasks`` and ``last_activity_at``
+let the client and worker lists filter and sort by load from their own indexed
+columns instead of joining ``Task`` on every request.
+
+Task post_save/post_delete compare the task's state when it was loaded
+(``Task.from_db``) with its state now and apply the difference as ``F()``
+increments in the task's transaction. Increments don't lose each other, but
+the difference is only right if nobody changed the task after it was loaded.
+The API, the sync replay and admin lock the task row first
+(``select_for_update``, see ``lock_counter_state``); the shell, scripts and
+paths that skip signals (``QuerySet.update``, raw deletes and copies) don't.
+The counts are therefore eventually consistent: ``reconcile_counters``
+repairs drift in batches, and ``move_owner`` recounts the owner it moved.
+``bulk_create`` callers apply ``add_created_tasks`` themselves.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Max, PositiveIntegerField, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .caching import bump_owner_versions
+from .models import Client, Worker, Task, COUNTER_STATE_FIELDS
+
+COUNTER_FIELDS = ('open_tasks', 'blocked_tasks', 'done_tasks')
+# Which task foreign key feeds each model's counters
+COUNTED_BY = ((Client, 'client_id'), (Worker, 'assigned_worker_id'))
+
+
+def counter_field(status):
+    if status == 'DONE':
+        return 'done_tasks'
+    if status == 'BLOCKED':
+        return 'blocked_tasks'
+    return 'open_tasks'
+
+
+def task_state(task):
+    return tuple(getattr(task, name) for name in COUNTER_STATE_FIELDS)
+
+
+def apply_counter_changes(using, old, new):
+    """
+    ``old``/``new``: (client_id, assigned_worker_id, status) before and after,
+    None for a create/delete. One UPDATE per affected row; rows the task now
+    points at also get ``last_activity_at``.
+    """
+    deltas = defaultdict(Counter)
+    touched = set()
+    for index, (model, _) in enumerate(COUNTED_BY):
+        if old and old[index]:
+            deltas[model, old[index]][counter_field(old[2])] -= 1
+        if new and new[index]:
+            deltas[model, new[index]][counter_field(new[2])] += 1
+            touched.add((model, new[index]))
+
+    now = timezone.now()
+    for (model, pk), changes in deltas.items():
+        values = {
+            # Clamped so earlier drift can't push a count below zero
+            field: Greatest(F(field) + delta, 0, output_field=PositiveIntegerField()) if delta < 0
+            else F(field) + delta
+            for field, delta in changes.items() if delta
+        }
+        if (model, pk) in touched:
+            values['last_activity_at'] = now
+        if values:
+            model._base_manager.using(using).filter(pk=pk).update(**values)
+
+
+def lock_counter_state(task, using):
+    """
+    Lock ``task``'s row and take its counted fields from the stored row, so the
+    next save or delete applies its change against a state no other writer
+    can move until commit. Call inside a transaction.
+    """
+    stored = (
+        Task._base_manager.using(using).select_for_update()
+        .filter(pk=task.pk).values_list(*COUNTER_STATE_FIELDS).first()
+    )
+    if stored is not None:
+        task._counter_state = tuple(stored)
+
+
+def task_saved(sender, instance, created, using, raw=False, **kwargs):
+    """post_save on Task"""
+    if raw:
+        return
+    new = task_state(instance)
+    old = None if created else getattr(instance, '_counter_state', None)
+    if old is None and not created:
+        # Loaded without the counted fields: the change is unknown, so only
+        # record activity and leave counts to reconcile_counters
+        old = new
+    apply_counter_changes(using, old, new)
+    instance._counter_state = new
+
+
+def task_deleted(sender, instance, using, **kwargs):
+    """post_delete on Task"""
+    old = getattr(instance, '_counter_state', None) or task_state(instance)
+    apply_counter_changes(using, old, None)
+
+
+def add_created_tasks(using, tasks):
+    """
+    Counter increments for tasks inserted with ``bulk_create`` (no signals):
+    one UPDATE per model, counter and increment, however many rows it touches.
+    """
+    deltas = Counter()
+    for task in tasks:
+        field = counter_field(task.status)
+        for model, fk in COUNTED_BY:
+            if getattr(task, fk):
+                deltas[model, field, getattr(task, fk)] += 1
+
+    grouped = defaultdict(list)
+    for (model, field, pk), delta in deltas.items():
+        grouped[model, field, delta].append(pk)
+    now = timezone.now()
+    for (model, field, delta), pks in grouped.items():
+        model._base_manager.using(using).filter(pk__in=pks).update(
+            **{field: F(field) + delta}, last_activity_at=now
+        )
+
+
+# ==================== RECONCILE ====================
+
+def actual_counters(alias, model, fk, pks):
+    """{pk: (open, blocked, done, last task update)} from Task, one grouped query"""
+    rows = (
+        Task._base_manager.using(alias)
+        .filter(**{f'{fk}__in': pks})
+        .order_by()
+        .values(fk)
+        .annotate(
+            open=Count('pk', filter=~Q(status__in=('BLOCKED', 'DONE'))),
+            blocked=Count('pk', filter=Q(status='BLOCKED')),
+            done=Count('pk', filter=Q(status='DONE')),
+            last=Max('updated_at'),
+        )
+    )
+    return {row[fk]: (row['open'], row['blocked'], row['done'], row['last']) for row in rows}
+
+
+def reconcile(alias, model, fk, batch_size=500, dry_run=False, owner_id=None):
+    """
+    Recount ``model`` rows on ``alias`` (or only ``owner_id``'s) in
+    primary-key batches and repair the ones that drifted; returns
+    (scanned, repaired). A repair only applies if the stored counts are still
+    the ones that were read, so it never undoes a concurrent task write (such
+    rows are picked up by the next run). Owners with repaired rows get their
+    ``OwnerVersion`` bumped, so cached list responses revalidate.
+    """
+    manager = model._base_manager.using(alias)
+    rows = manager.filter(owner_id=owner_id) if owner_id is not None else manager.all()
+    scanned = repaired = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            rows.filter(pk__gt=last_pk).order_by('pk')
+            .values_list('pk', 'owner_id', *COUNTER_FIELDS, 'last_activity_at')[:batch_size]
+        )
+        if not batch:
+            return scanned, repaired
+        last_pk = batch[-1][0]
+        scanned += len(batch)
+        actual = actual_counters(alias, model, fk, [row[0] for row in batch])
+        changed_owners = set()
+
+        for pk, row_owner_id, *stored_counts, stored_last in batch:
+            *counts, last = actual.get(pk, (0, 0, 0, None))
+            # Activity only moves forward; deleted tasks leave no trace to recount
+            if counts == stored_counts and (last is None or last <= stored_last):
+                continue
+            if dry_run:
+                repaired += 1
+                continue
+            if manager.filter(pk=pk, **dict(zip(COUNTER_FIELDS, stored_counts))).update(
+                last_activity_at=max(stored_last, last) if last else stored_last,
+                **dict(zip(COUNTER_FIELDS, counts)),
+            ):
+                repaired += 1
+                changed_owners.add(row_owner_id)
+        if changed_owners:
+            # The updates skip signals, so the owners' ETags must move here
+            bump_owner_versions(alias, changed_owners)
@@ -0,0 +1,231 @@
+"""
+Daily digest of overdue, due-today and blocked tasks for every owner.
+
+One streaming pass per shard over the tasks that can appear in a digest:
+open tasks due by the digest date (``task_owner_due_status_idx``) and blocked
+tasks (the partial ``task_blocked_idx``), each read in ``(owner, due_date)``
+order from its index and merged by owner, so each owner's rows arrive
+together. One query with an OR across both could use neither index range.
+Finished digests are rendered and handed to ``DIGEST_BACKEND`` in batches:
+per batch one user lookup, one query for the listed tasks' details and one
+``send()``, never a query per owner.
+
+Incremental: a task is listed only if it was updated since the previous run
+or moved section because the date rolled over (due today -> overdue). Owners
+with nothing new get no message. The run's start time becomes the next
+watermark only once every batch was delivered, so a failed run is repeated
+rather than lost.
+"""
+
+import heapq
+from collections import namedtuple
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.text import Truncator
+
+from .models import Task, DigestRun
+from .sharding import shard_aliases
+
+SECTIONS = (
+    ('overdue', 'Overdue'),
+    ('due_today', 'Due today'),
+    ('blocked', 'Blocked'),
+)
+
+# Listed when due; blocked tasks are listed whatever their date
+OPEN_STATUSES = ('TODO', 'IN_PROGRESS')
+
+DigestMessage = namedtuple('DigestMessage', 'owner_id to subject body')
+
+
+def section_for(due_date, status, day):
+    """Which digest section a task belongs to on ``day``, or None"""
+    if status == 'BLOCKED':
+        return 'blocked'
+    if status == 'DONE' or due_date is None or due_date > day:
+        return None
+    return 'overdue' if due_date < day else 'due_today'
+
+
+class OwnerDigest:
+    """Section totals for one owner, plus the task ids that changed"""
+
+    def __init__(self, owner_id):
+        self.owner_id = owner_id
+        self.counts = {name: 0 for name, _ in SECTIONS}
+        self.changed = {name: [] for name, _ in SECTIONS}
+
+    def add(self, task_id, section, changed, max_items):
+        self.counts[section] += 1
+        if changed and len(self.changed[section]) < max_items:
+            self.changed[section].append(task_id)
+
+    def has_changes(self):
+        return any(self.changed.values())
+
+    def task_ids(self):
+        return [task_id for ids in self.changed.values() for task_id in ids]
+
+
+# ==================== DELIVERY ====================
+
+class EmailDigestBackend:
+    """
+    Sends through ``EMAIL_BACKEND`` (file or locmem locally, SMTP in
+    production), reusing one connection per batch
+    """
+
+    def send(self, messages):
+        emails = [EmailMessage(message.subject, message.body, to=[message.to]) for message in messages]
+        return get_connection().send_messages(emails) or 0
+
+
+def get_backend():
+    return import_string(settings.DIGEST_BACKEND)()
+
+
+def render_digest(user, digest, details, day):
+    """``details``: task id -> (text, due_date, client name)"""
+    totals = ', '.join(
+        f"{digest.counts[name]} {title.lower()}" for name, title in SECTIONS if digest.counts[name]
+    )
+    lines = [f"Hi {user.first_name or user.username},", '', f"Today ({day.isoformat()}): {totals}.", '']
+    for name, title in SECTIONS:
+        ids = [task_id for task_id in digest.changed[name] if task_id in details]
+        if not ids:
+            continue
+        lines.append(f"{title} - new or changed since your last digest")
+        for task_id in ids:
+            text, due_date, client_name = details[task_id]
+            line = f"- {Truncator(text or f'Task {task_id}').chars(80)}"
+            if client_name:
+                line += f" ({client_name})"
+            if due_date and name != 'due_today':
+                line += f", due {due_date.isoformat()}"
+            lines.append(line)
+        hidden = digest.counts[name] - len(ids)
+        if hidden:
+            lines.append(f"  ...and {hidden} more")
+        lines.append('')
+    lines.append(f"Open your dashboard: {settings.FRONTEND_URL}")
+    return f"Your tasks for {day.isoformat()}: {totals}", '\n'.join(lines)
+
+
+# ==================== GENERATION ====================
+
+class DigestGenerator:
+    """
+    Build and deliver every owner's digest for ``day``. ``since`` is the
+    watermark (None lists everything, as on the first run).
+    """
+
+    def __init__(self, day, since, backend, batch_size=None, max_items=None):
+        self.day = day
+        self.since = since
+        self.since_day = timezone.localdate(since) if since else None
+        self.backend = backend
+        self.batch_size = batch_size or settings.DIGEST_BATCH_SIZE
+        self.max_items = max_items or settings.DIGEST_MAX_ITEMS
+        self.tasks_scanned = 0
+        self.digests_sent = 0
+
+    def is_changed(self, due_date, status, updated_at, section):
+        if self.since is None or updated_at >= self.since:
+            return True
+        return section_for(due_date, status, self.since_day) != section
+
+    def rows(self, alias):
+        """Candidate tasks on ``alias`` in owner order: the two streams, merged"""
+        def stream(queryset):
+            return (
+                queryset.order_by('owner_id', 'due_date')
+                .values_list('owner_id', 'id', 'due_date', 'status', 'updated_at')
+                .iterator(chunk_size=2000)
+            )
+
+        tasks = Task._base_manager.using(alias)
+        due = stream(tasks.filter(status__in=OPEN_STATUSES, due_date__lte=self.day))
+        blocked = stream(tasks.filter(status='BLOCKED'))
+        return heapq.merge(due, blocked, key=itemgetter(0))
+
+    def sweep(self, alias):
+        """Yield each owner's digest on ``alias``"""
+        digest = None
+        for owner_id, task_id, due_date, status, updated_at in self.rows(alias):
+            self.tasks_scanned += 1
+            if digest is None or digest.owner_id != owner_id:
+                if digest is not None and digest.has_changes():
+                    yield digest
+                digest = OwnerDigest(owner_id)
+            section = section_for(due_date, status, self.day)
+            digest.add(task_id, section, self.is_changed(due_date, status, updated_at, section), self.max_items)
+        if digest is not None and digest.has_changes():
+            yield digest
+
+    def deliver(self, alias, batch):
+        users = {
+            user.pk: user for user in
+            User.objects.using('default')
+            .filter(pk__in=[digest.owner_id for digest in batch], is_active=True)
+            .exclude(email='')
+            .only('id', 'username', 'first_name', 'email')
+        }
+        batch = [digest for digest in batch if digest.owner_id in users]
+        task_ids = [task_id for digest in batch for task_id in digest.task_ids()]
+        details = {
+            task_id: (Task.extract_text(description), due_date, client_name)
+            for task_id, description, due_date, client_name in
+            Task._base_manager.using(alias).filter(pk__in=task_ids)
+            .values_list('id', 'description', 'due_date', 'client__name')
+        } if task_ids else {}
+
+        messages = []
+        for digest in batch:
+            user = users[digest.owner_id]
+            subject, body = render_digest(user, digest, details, self.day)
+            messages.append(DigestMessage(digest.owner_id, user.email, subject, body))
+        if messages:
+            self.digests_sent += self.backend.send(messages)
+
+    def run(self):
+        for alias in shard_aliases():
+            batch = []
+            for digest in self.sweep(alias):
+                batch.append(digest)
+                if len(batch) >= self.batch_size:
+                    self.deliver(alias, batch)
+                    batch = []
+            if batch:
+                self.deliver(alias, batch)
+        return self
+
+
+def send_digests(day=None, full=False, backend=None, record=True, batch_size=None):
+    """
+    Run one digest pass and (``record=True``) store it as the next watermark.
+    ``full`` ignores the watermark and lists every matching task.
+    """
+    last_run = (
+        DigestRun.objects.using('default')
+        .filter(finished_at__isnull=False)
+        .order_by('-finished_at')
+        .first()
+    )
+    since = None if full or last_run is None else last_run.started_at
+    run = DigestRun(digest_date=day or timezone.localdate(), started_at=timezone.now())
+    if record:
+        run.save(using='default')
+
+    generator = DigestGenerator(run.digest_date, since, backend or get_backend(), batch_size=batch_size).run()
+
+    run.tasks_scanned = generator.tasks_scanned
+    run.digests_sent = generator.digests_sent
+    run.finished_at = timezone.now()
+    if record:
+        run.save(using='default')
+    return run
@@ -0,0 +1,127 @@
+from datetime import date, datetime, time
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Task
+
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def parse_date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationError({name: 'Use YYYY-MM-DD.'})
+
+
+def parse_id_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: 'Must be an id.'})
+    return int(value)
+
+
+class TaskFilterBackend(BaseFilterBackend):
+    """
+    Declarative task filters for ``/api/tasks/``:
+
+    - ``status=TODO&status=BLOCKED`` or ``status=TODO,BLOCKED``
+    - ``due_from`` / ``due_to`` (inclusive, YYYY-MM-DD)
+    - ``overdue=true``: due before today and not done
+    - ``client=<id>``, ``worker=<id>``, ``unassigned=true``
+
+    Every filter is an owner-scoped equality or range that the Task indexes
+    serve: (owner, status, due_date), (owner, due_date), (owner, -updated_at),
+    the partial unassigned index and the client/worker foreign key indexes.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        statuses = [
+            status.strip().upper()
+            for value in params.getlist('status')
+            for status in value.split(',') if status.strip()
+        ]
+        if statuses:
+            valid = {choice for choice, _ in Task.STATUS_CHOICES}
+            unknown = sorted(set(statuses) - valid)
+            if unknown:
+                raise ValidationError({'status': f"Unknown status: {', '.join(unknown)}"})
+            queryset = queryset.filter(status__in=statuses)
+
+        due_from = parse_date_param(params, 'due_from')
+        due_to = parse_date_param(params, 'due_to')
+        if due_from:
+            queryset = queryset.filter(due_date__gte=due_from)
+        if due_to:
+            queryset = queryset.filter(due_date__lte=due_to)
+
+        if params.get('overdue', '').lower() in TRUE_VALUES:
+            queryset = queryset.filter(due_date__lt=timezone.localdate()).exclude(status='DONE')
+
+        client_id = parse_id_param(params, 'client')
+        if client_id is not None:
+            queryset = queryset.filter(client_id=client_id)
+
+        worker_id = parse_id_param(params, 'worker')
+        if worker_id is not None:
+            queryset = queryset.filter(assigned_worker_id=worker_id)
+        elif params.get('unassigned', '').lower() in TRUE_VALUES:
+            queryset = queryset.filter(assigned_worker__isnull=True)
+
+        return queryset
+
+
+def parse_count_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    if not value.isdigit():
+        raise ValidationError({name: 'Must be a whole number.'})
+    return int(value)
+
+
+class CounterFilterBackend(BaseFilterBackend):
+    """
+    Filters on the denormalized task counters of ``/api/clients/`` and
+    ``/api/workers/``:
+
+    - ``min_open=<n>`` / ``max_open=<n>``: open (TODO or IN_PROGRESS) tasks
+    - ``has_blocked=true|false``
+    - ``active_since=YYYY-MM-DD``: a task touched the row since that day
+
+    Together with ``?ordering=-open_tasks`` or ``-last_activity_at`` these are
+    served by the (owner, -open_tasks) and (owner, -last_activity_at) indexes.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        min_open = parse_count_param(params, 'min_open')
+        if min_open is not None:
+            queryset = queryset.filter(open_tasks__gte=min_open)
+        max_open = parse_count_param(params, 'max_open')
+        if max_open is not None:
+            queryset = queryset.filter(open_tasks__lte=max_open)
+
+        has_blocked = params.get('has_blocked', '').lower()
+        if has_blocked:
+            if has_blocked in TRUE_VALUES:
+                queryset = queryset.filter(blocked_tasks__gt=0)
+            else:
+                queryset = queryset.filter(blocked_tasks=0)
+
+        active_since = parse_date_param(params, 'active_since')
+        if active_since:
+            start = timezone.make_aware(datetime.combine(active_since, time.min))
+            queryset = queryset.filter(last_activity_at__gte=start)
+
+        return queryset
@@ -0,0 +1,325 @@
+"""
+Idempotent writes and offline replay.
+
+The PWA queues writes while offline and sends the whole log in one
+``POST /api/sync/`` when it reconnects::
+
+    {"mutations": [
+        {"key": "c1f0...", "type": "client", "op": "create", "ref": "c-1",
+         "data": {"name": "Acme"}},
+        {"key": "9ab2...", "type": "task", "op": "create", "ref": "t-1",
+         "data": {"description": [], "client_id": {"ref": "c-1"}}},
+        {"key": "51d7...", "type": "task", "op": "update", "id": 42,
+         "version": "1718000000000000", "data": {"status": "DONE"}},
+        {"key": "e03c...", "type": "task", "op": "delete", "id": {"ref": "t-1"}}
+    ]}
+
+Mutations run in order inside one transaction, each in its own savepoint, so
+a rejected mutation doesn't undo the others, including one that fails in the
+database (``409`` for an integrity error, ``500`` otherwise). ``{"ref": name}`` in ``id``,
+``client_id`` or ``assigned_worker_id`` stands for the id of an earlier create
+with that ``ref``; when that create failed, the dependent mutation gets ``424``.
+``version`` is the task's If-Match token.
+
+Each successful mutation stores its result under ``(owner, key)`` for
+``IDEMPOTENCY_KEY_TTL_HOURS``. A key that was already applied returns the
+stored result without running again, so a client that lost the response just
+resends the whole log. ``POST`` to the list endpoints honours the same keys in
+an ``Idempotency-Key`` header.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.response import Response
+
+from .concurrency import VersionConflict
+from .models import Client, Worker, Task, IdempotencyKey
+from .serializers import ClientSerializer, WorkerSerializer, TaskSerializer, preload_owned_rows
+
+MUTATION_TYPES = {
+    'client': (Client, ClientSerializer),
+    'worker': (Worker, WorkerSerializer),
+    'task': (Task, TaskSerializer),
+}
+OPERATIONS = ('create', 'update', 'delete')
+# Fields that may hold a ref, and the type the ref must point at
+REF_FIELDS = {
+    'task': {'client_id': 'client', 'assigned_worker_id': 'worker'},
+}
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+logger = logging.getLogger(__name__)
+
+
+class FailedDependency(APIException):
+    status_code = status.HTTP_424_FAILED_DEPENDENCY
+    default_detail = 'Depends on a mutation that failed or is not in this log.'
+    default_code = 'failed_dependency'
+
+
+class KeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This idempotency key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+class ReplayInProgress(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Another request is applying the same keys. Retry shortly.'
+    default_code = 'replay_in_progress'
+
+
+# ==================== KEY STORE ====================
+
+def fingerprint(payload):
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def load_keys(user, keys):
+    """Unexpired stored results by key (one query); expired rows are dropped so the key can be reused"""
+    now = timezone.now()
+    stored, expired = {}, []
+    for row in IdempotencyKey.objects.filter(owner=user, key__in=set(keys)):
+        if row.expires_at > now:
+            stored[row.key] = row
+        else:
+            expired.append(row.pk)
+    if expired:
+        IdempotencyKey.objects.filter(pk__in=expired).delete()
+    return stored
+
+
+def new_key(user, key, digest, status_code, response):
+    return IdempotencyKey(
+        owner=user, key=key, fingerprint=digest,
+        status_code=status_code, response=response,
+        expires_at=timezone.now() + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+    )
+
+
+def save_keys(rows):
+    """
+    Insert new keys in one statement, inside the caller's transaction. If a
+    concurrent request stored one of them first, the caller's writes are
+    rolled back with it, so each key is applied exactly once.
+    """
+    if not rows:
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(IdempotencyKey)):
+            IdempotencyKey.objects.bulk_create(rows)
+    except IntegrityError:
+        raise ReplayInProgress()
+
+
+class IdempotentCreateMixin:
+    """
+    ``POST`` with an ``Idempotency-Key`` header stores the first response and
+    returns it again (with ``Idempotent-Replayed: true``) for retries, so a
+    lost response can't turn into a duplicate row. Place before
+    ``VersionedWriteMixin`` so its ``create`` runs inside the transaction.
+    """
+
+    def create(self, request, *args, **kwargs):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if not key:
+            return super().create(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({'detail': f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters.'})
+
+        digest = fingerprint({'path': request.path, 'data': request.data})
+        with transaction.atomic(using=router.db_for_write(self.get_queryset().model)):
+            row = load_keys(request.user, [key]).get(key)
+            if row is not None:
+                if row.fingerprint != digest:
+                    raise KeyReused()
+                return Response(row.response, status=row.status_code, headers={'Idempotent-Replayed': 'true'})
+            response = super().create(request, *args, **kwargs)
+            save_keys([new_key(request.user, key, digest, response.status_code, response.data)])
+        return response
+
+
+# ==================== REPLAY ====================
+
+def is_ref(value):
+    return isinstance(value, dict) and list(value) == ['ref'] and isinstance(value['ref'], str)
+
+
+def validate_log(data):
+    """The request body's mutation list, or ValidationError naming each bad entry"""
+    mutations = data.get('mutations') if isinstance(data, dict) else None
+    if not isinstance(mutations, list):
+        raise ValidationError({'mutations': 'Expected a list of mutations.'})
+    if len(mutations) > settings.SYNC_MAX_MUTATIONS:
+        raise ValidationError({'mutations': f'At most {settings.SYNC_MAX_MUTATIONS} mutations per request.'})
+
+    errors = {}
+    for index, mutation in enumerate(mutations):
+        if not isinstance(mutation, dict):
+            errors[index] = 'Expected an object.'
+        elif not isinstance(mutation.get('key'), str) or not 0 < len(mutation['key']) <= MAX_KEY_LENGTH:
+            errors[index] = f'key must be a string of 1 to {MAX_KEY_LENGTH} characters.'
+        elif mutation.get('type') not in MUTATION_TYPES:
+            errors[index] = f"type must be one of {', '.join(MUTATION_TYPES)}."
+        elif mutation.get('op') not in OPERATIONS:
+            errors[index] = f"op must be one of {', '.join(OPERATIONS)}."
+        elif not isinstance(mutation.get('data', {}), dict):
+            errors[index] = 'data must be an object.'
+        elif 'ref' in mutation and not isinstance(mutation['ref'], str):
+            errors[index] = 'ref must be a string.'
+        elif mutation['op'] != 'create' and not (
+            is_ref(mutation.get('id')) or (isinstance(mutation.get('id'), int) and not isinstance(mutation['id'], bool))
+        ):
+            errors[index] = 'id must be an integer or {"ref": name}.'
+    if errors:
+        raise ValidationError({'mutations': errors})
+    return mutations
+
+
+def resolve_ref(value, kind, refs):
+    if not is_ref(value):
+        return value
+    target = refs.get(value['ref'])
+    if target is None:
+        raise FailedDependency({'detail': FailedDependency.default_detail, 'ref': value['ref']})
+    if target[0] != kind:
+        raise ValidationError({'detail': f"ref '{value['ref']}' is a {target[0]}, not a {kind}."})
+    return target[1]
+
+
+def preload_related(user, mutations):
+    """
+    Serializer context for a whole log, with the clients and workers that its
+    tasks point at by id loaded in one query per model
+    """
+    context = {'user': user}
+    for field, kind in REF_FIELDS['task'].items():
+        pks = {
+            mutation['data'][field] for mutation in mutations
+            if mutation['type'] == 'task' and isinstance((mutation.get('data') or {}).get(field), int)
+        }
+        preload_owned_rows(context, MUTATION_TYPES[kind][0], pks)
+    return context
+
+
+def apply_mutation(user, mutation, refs, context=None):
+    """
+    Run one mutation; returns (status_code, result). Raises APIException when
+    rejected. ``context`` is shared across a log, see ``preload_related``.
+    """
+    kind, op = mutation['type'], mutation['op']
+    model, serializer_class = MUTATION_TYPES[kind]
+    data = dict(mutation.get('data') or {})
+    for field, target_kind in REF_FIELDS.get(kind, {}).items():
+        if field in data:
+            data[field] = resolve_ref(data[field], target_kind, refs)
+    if context is None:
+        context = {'user': user}
+    owned_rows = context.get('owned_rows', {}).get(model)
+
+    if op == 'create':
+        serializer = serializer_class(data=data, context=context)
+        serializer.is_valid(raise_exception=True)
+        instance = serializer.save(owner=user)
+        if owned_rows is not None:
+            # Later tasks in the log may point at it by ref
+            owned_rows[instance.pk] = instance
+        return status.HTTP_201_CREATED, result_for(instance)
+
+    pk = resolve_ref(mutation['id'], kind, refs)
+    instance = model.objects.select_for_update(of=('self',)).filter(owner=user, pk=pk).first()
+    if instance is None:
+        raise NotFound()
+    version = mutation.get('version')
+    if version is not None and hasattr(instance, 'version') and str(version) != instance.version:
+        raise VersionConflict({'detail': VersionConflict.default_detail, 'version': instance.version})
+
+    if op == 'delete':
+        instance.delete()
+        if owned_rows is not None:
+            owned_rows.pop(pk, None)
+        return status.HTTP_204_NO_CONTENT, {'id': pk}
+    serializer = serializer_class(instance, data=data, partial=True, context=context)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    return status.HTTP_200_OK, result_for(instance)
+
+
+def result_for(instance):
+    """Minimal result, like ``Prefer: return=minimal``; clients refetch once after syncing"""
+    result = {'id': instance.pk}
+    if hasattr(instance, 'version'):
+        result['version'] = instance.version
+    return result
+
+
+def error_detail(exc):
+    """The body DRF would have sent for ``exc``"""
+    return exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+
+
+def replay(user, mutations):
+    """
+    Apply a validated mutation log in one transaction; returns one result per
+    mutation, in order: ``{"key", "status", "id", "version"?, "replayed"}`` or
+    ``{"key", "status", "errors"}``. Only successes are stored, so a rejected
+    mutation can be fixed and resent under the same key.
+    """
+    db = router.db_for_write(Task)
+    refs, results, new_rows = {}, [], []
+    with transaction.atomic(using=db):
+        stored = load_keys(user, [mutation['key'] for mutation in mutations])
+        context = preload_related(user, mutations)
+        for mutation in mutations:
+            key = mutation['key']
+            digest = fingerprint({name: value for name, value in mutation.items() if name != 'key'})
+            row = stored.get(key)
+            if row is not None:
+                if row.fingerprint == digest:
+                    outcome = {'status': row.status_code, **row.response, 'replayed': True}
+                else:
+                    outcome = {'status': KeyReused.status_code, 'errors': error_detail(KeyReused())}
+            else:
+                try:
+                    with transaction.atomic(using=db):
+                        status_code, result = apply_mutation(user, mutation, refs, context)
+                except APIException as exc:
+                    outcome = {'status': exc.status_code, 'errors': error_detail(exc)}
+                except IntegrityError:
+                    # e.g. a row it points at was deleted by a concurrent request
+                    outcome = {
+                        'status': status.HTTP_409_CONFLICT,
+                        'errors': {'detail': 'Conflicts with the current data.'},
+                    }
+                except DatabaseError:
+                    logger.exception('Replaying mutation %s failed', key)
+                    outcome = {
+                        'status': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        'errors': {'detail': 'Could not be applied.'},
+                    }
+                else:
+                    outcome = {'status': status_code, **result, 'replayed': False}
+                    # A repeated key later in the same log replays this result
+                    stored[key] = new_key(user, key, digest, status_code, result)
+                    new_rows.append(stored[key])
+
+            if mutation.get('ref') and outcome['status'] == status.HTTP_201_CREATED:
+                refs[mutation['ref']] = (mutation['type'], outcome['id'])
+            results.append({'key': key, **outcome})
+        save_keys(new_rows)
+    return results
+
+
+def purge_expired_keys(using):
+    """Delete expired keys on one database; returns the number removed"""
+    expired = IdempotencyKey._base_manager.using(using).filter(expires_at__lte=timezone.now())
+    return expired._raw_delete(using)
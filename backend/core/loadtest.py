@@ -0,0 +1,550 @@
+"""
+Concurrent multi-user load and soak harness.
+
+Synthetic founders log in through ``auth/csrf/`` and ``auth/login/`` like the
+React app does, then loop over a weighted mix of what the UI sends: dashboard
+loads (revalidated with ``If-None-Match``), task edits (``If-Match`` +
+``Prefer: return=minimal``), filtered lists, analytics, the calendar and
+exports. Exports are built client-side from the full lists, so an export is an
+unconditional fetch of those lists.
+
+Each virtual user is a thread with its own cookies, so every user holds a
+real session. Latency is recorded per endpoint. A sampler records server RSS,
+open DB connections and ``django_session`` rows over time, which is what
+shows leaks, connection churn and session-table growth on long soak runs.
+"""
+
+import gzip
+import http.client
+import json
+import importlib.util
+import math
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import date, timedelta
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import connections
+
+from .models import Task
+from .query_plans import generate_data
+from .sharding import shard_aliases
+
+try:
+    import brotli
+except ImportError:  # optional, see JsonCompressionMiddleware
+    brotli = None
+
+USER_PREFIX = '__load_user_'
+
+DEFAULT_MIX = {
+    'dashboard': 6,
+    'task_edit': 3,
+    'filter': 2,
+    'analytics': 1,
+    'calendar': 1,
+    'export': 1,
+}
+
+# Statuses that are part of normal operation rather than failures
+EXPECTED_STATUSES = {200, 201, 204, 304}
+
+Response = namedtuple('Response', 'status headers body')
+
+
+# ==================== USERS ====================
+
+def seed_users(count, clients=20, workers=10, tasks=300):
+    """
+    Make sure ``count`` synthetic owners with data exist and give them a fresh
+    random password. Existing users are reused when the count matches, so
+    repeated soak runs don't pay for data generation each time.
+    """
+    users = User.objects.filter(username__startswith=USER_PREFIX)
+    if users.count() != count:
+        delete_users()
+        generate_data(count, clients, workers, tasks, prefix=USER_PREFIX)
+
+    # One hash for everyone: per-user hashing would dominate seeding time
+    password = secrets.token_urlsafe(16)
+    User.objects.filter(username__startswith=USER_PREFIX).update(password=make_password(password))
+    usernames = [f'{USER_PREFIX}{index}' for index in range(count)]
+    return usernames, password
+
+
+def delete_users():
+    User.objects.filter(username__startswith=USER_PREFIX).delete()
+
+
+# ==================== HTTP ====================
+
+class Recorder:
+    """Thread-safe per-endpoint latency, status and byte counts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.total = 0
+        self.errors = 0
+
+    def record(self, endpoint, seconds, status, size, expected=()):
+        failed = status is None or (status not in EXPECTED_STATUSES and status not in expected)
+        with self.lock:
+            entry = self.endpoints.setdefault(endpoint, {
+                'latencies': [], 'statuses': Counter(), 'errors': 0, 'bytes': 0,
+            })
+            entry['latencies'].append(seconds)
+            entry['statuses'][status or 'connection error'] += 1
+            entry['bytes'] += size
+            self.total += 1
+            if failed:
+                entry['errors'] += 1
+                self.errors += 1
+
+    def counts(self):
+        with self.lock:
+            return self.total, self.errors
+
+
+class HttpSession:
+    """
+    One browser: its own cookies, CSRF token and ETag cache. A new connection
+    is opened per request, as gunicorn's sync workers close them anyway.
+    """
+
+    def __init__(self, base_url, recorder, timeout=30, client_ip=None):
+        parts = urlsplit(base_url)
+        self.client_ip = client_ip
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.netloc = parts.netloc
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = {}
+        self.etags = {}
+
+    def reset(self):
+        """Drop cookies without logging out, like a closed browser"""
+        self.cookies.clear()
+        self.etags.clear()
+
+    def request(self, endpoint, method, path, data=None, conditional=False, expected=(), headers=None):
+        headers = {
+            **(headers or {}),
+            'Accept': 'application/json',
+            'Accept-Encoding': 'br, gzip' if brotli else 'gzip',
+            # Production sits behind Render's TLS proxy and redirects plain HTTP
+            'X-Forwarded-Proto': 'https',
+            'Referer': f'https://{self.netloc}/',
+        }
+        if self.client_ip:
+            # Distinct clients for the per-IP login/CSRF budgets (NUM_PROXIES=1)
+            headers['X-Forwarded-For'] = self.client_ip
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in self.cookies.items())
+        if method not in ('GET', 'HEAD') and 'csrftoken' in self.cookies:
+            headers['X-CSRFToken'] = self.cookies['csrftoken']
+        if conditional and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+
+        started = time.perf_counter()
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            self.recorder.record(endpoint, time.perf_counter() - started, None, 0)
+            return None
+        finally:
+            connection.close()
+        elapsed = time.perf_counter() - started
+
+        self.recorder.record(endpoint, elapsed, response.status, len(payload), expected)
+        self._store_cookies(response.headers.get_all('Set-Cookie') or [])
+        if response.status == 200 and response.headers.get('ETag'):
+            self.etags[path] = response.headers['ETag']
+
+        encoding = response.headers.get('Content-Encoding')
+        if encoding == 'gzip':
+            payload = gzip.decompress(payload)
+        elif encoding == 'br':
+            payload = brotli.decompress(payload)
+        return Response(response.status, response.headers, payload)
+
+    def _store_cookies(self, headers):
+        for header in headers:
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+
+
+def json_body(response):
+    if response is None or response.status != 200:
+        return None
+    try:
+        return json.loads(response.body)
+    except ValueError:
+        return None
+
+
+# ==================== WORKLOAD ====================
+
+class VirtualUser(threading.Thread):
+    """Logs in once, then runs weighted actions with exponential think time"""
+
+    def __init__(self, base_url, username, password, recorder, stop, *,
+                 start_delay=0.0, think=1.0, mix=None, session_churn=0.0, seed=None, client_ip=None):
+        super().__init__(daemon=True, name=username)
+        self.session = HttpSession(base_url, recorder, client_ip=client_ip)
+        self.username = username
+        self.password = password
+        self.stop = stop
+        self.start_delay = start_delay
+        self.think = think
+        self.mix = mix or DEFAULT_MIX
+        self.session_churn = session_churn
+        self.rng = random.Random(seed)
+        self.tasks = {}
+        self.active = False
+
+    def run(self):
+        if self.stop.wait(self.start_delay):
+            return
+        self.active = True
+        try:
+            while not self.stop.is_set():
+                if not self.login():
+                    self.pause()
+                    continue
+                self.dashboard()
+                while not self.stop.is_set():
+                    self.pause()
+                    if self.stop.is_set():
+                        break
+                    if self.rng.random() < self.session_churn:
+                        # Abandon the session without logging out: its row stays behind
+                        self.session.reset()
+                        break
+                    action = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+                    getattr(self, action)()
+        finally:
+            self.active = False
+
+    def pause(self):
+        if self.think > 0:
+            self.stop.wait(self.rng.expovariate(1 / self.think))
+
+    def login(self):
+        self.session.request('GET auth/csrf/', 'GET', '/api/auth/csrf/')
+        response = self.session.request(
+            'POST auth/login/', 'POST', '/api/auth/login/',
+            {'username': self.username, 'password': self.password}
+        )
+        return response is not None and response.status == 200
+
+    def remember_tasks(self, response):
+        tasks = json_body(response)
+        if tasks is not None:
+            self.tasks = {task['id']: task['version'] for task in tasks}
+
+    # ---- actions, named as in DEFAULT_MIX ----
+
+    def dashboard(self):
+        """Dashboard.jsx: clients, workers and tasks, revalidated when cached"""
+        self.session.request('GET clients/', 'GET', '/api/clients/', conditional=True)
+        self.session.request('GET workers/', 'GET', '/api/workers/', conditional=True)
+        self.remember_tasks(self.session.request('GET tasks/', 'GET', '/api/tasks/', conditional=True))
+
+    def task_edit(self):
+        """EditTaskModal: versioned PATCH that only needs the new version back"""
+        if not self.tasks:
+            return self.dashboard()
+        task_id = self.rng.choice(list(self.tasks))
+        response = self.session.request(
+            'PATCH tasks/<id>/', 'PATCH', f'/api/tasks/{task_id}/',
+            {'status': self.rng.choice([choice for choice, _ in Task.STATUS_CHOICES])},
+            expected=(409,),
+            headers={'If-Match': f'"{self.tasks[task_id]}"', 'Prefer': 'return=minimal'},
+        )
+        # Both a success and a conflict return the current version
+        if response is not None and response.status in (200, 409):
+            try:
+                self.tasks[task_id] = json.loads(response.body)['version']
+            except (ValueError, KeyError):
+                pass
+        elif response is not None and response.status == 404:
+            self.tasks.pop(task_id, None)
+
+    def filter(self):
+        """Status tabs and the overdue / unassigned views"""
+        query = self.rng.choice([
+            {'status': 'TODO,BLOCKED', 'ordering': 'due_date'},
+            {'status': 'IN_PROGRESS'},
+            {'overdue': 'true'},
+            {'unassigned': 'true'},
+        ])
+        self.session.request('GET tasks/?filter', 'GET', f'/api/tasks/?{urlencode(query)}', conditional=True)
+
+    def analytics(self):
+        self.session.request('GET tasks/analytics/', 'GET', '/api/tasks/analytics/', conditional=True)
+
+    def calendar(self):
+        start = date.today().replace(day=1)
+        end = (start + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        query = urlencode({'from': start.isoformat(), 'to': end.isoformat()})
+        self.session.request('GET tasks/calendar/', 'GET', f'/api/tasks/calendar/?{query}', conditional=True)
+
+    def export(self):
+        """ExportButton builds CSV in the browser from freshly fetched lists"""
+        self.remember_tasks(self.session.request('GET tasks/ (export)', 'GET', '/api/tasks/'))
+        self.session.request('GET clients/ (export)', 'GET', '/api/clients/')
+
+
+def parse_mix(value):
+    """``dashboard=6,task_edit=3`` -> weights; unknown actions are rejected"""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown action '{name}', choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError('At least one action needs a positive weight')
+    return mix
+
+
+# ==================== SERVER ====================
+
+def start_server(port, workers):
+    """
+    Start gunicorn the way ``render.yaml`` does (same config file, so the
+    preload and warm-up hooks run), on localhost. Falls back to
+    ``runserver`` (threaded, single process) when gunicorn isn't installed,
+    which is only useful for smoke runs. Output goes to a log file.
+    """
+    if importlib.util.find_spec('gunicorn'):
+        command = [
+            sys.executable, '-m', 'gunicorn', 'backend.wsgi:application', '-c', 'gunicorn.conf.py',
+            '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+        ]
+    else:
+        command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+    log = tempfile.NamedTemporaryFile('w', prefix='loadtest-server-', suffix='.log', delete=False)
+    process = subprocess.Popen(command, cwd=settings.BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+    process.log_path = log.name
+    process.command = command
+    return process
+
+
+def wait_for_server(base_url, process=None, timeout=30, interval=0.25):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'Server exited with {process.returncode}, see {process.log_path}')
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=2)
+        try:
+            connection.request('GET', '/api/auth/csrf/', headers={'X-Forwarded-Proto': 'https'})
+            if connection.getresponse().status == 200:
+                return
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            connection.close()
+        time.sleep(interval)
+    raise RuntimeError(f'Server at {base_url} did not answer within {timeout}s')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+# ==================== SAMPLING ====================
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and its descendants (Linux /proc)"""
+    proc = Path('/proc')
+    if pid is None or not proc.exists():
+        return None
+    children = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / 'stat').read_text()
+        except OSError:
+            continue
+        # Fields after the parenthesised command name: state, ppid, ...
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            status = (proc / str(current) / 'status').read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1]) * 1024
+        pending.extend(children.get(current, []))
+    return total
+
+
+def db_connection_count():
+    """Client connections to the app's databases, excluding this sampler"""
+    total = 0
+    for alias in shard_aliases():
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT count(*) FROM pg_stat_activity '
+                'WHERE datname = current_database() AND pid <> pg_backend_pid()'
+            )
+            total += cursor.fetchone()[0]
+    return total
+
+
+class Sampler(threading.Thread):
+    """Samples server and database state every ``interval`` seconds"""
+
+    def __init__(self, recorder, users, stop, pid=None, interval=5.0, on_sample=None):
+        super().__init__(daemon=True, name='loadtest-sampler')
+        self.recorder = recorder
+        self.users = users
+        self.stop = stop
+        self.pid = pid
+        self.interval = interval
+        self.on_sample = on_sample
+        self.samples = []
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            while True:
+                self.sample(time.monotonic() - started)
+                if self.stop.wait(self.interval):
+                    break
+            self.sample(time.monotonic() - started)
+        finally:
+            connections.close_all()
+
+    def sample(self, elapsed):
+        requests, errors = self.recorder.counts()
+        sample = {
+            'elapsed': round(elapsed, 1),
+            'active_users': sum(user.active for user in self.users),
+            'requests': requests,
+            'errors': errors,
+            'rss': process_tree_rss(self.pid),
+            'db_connections': db_connection_count(),
+            'sessions': Session.objects.count(),
+        }
+        self.samples.append(sample)
+        if self.on_sample:
+            self.on_sample(sample)
+
+
+# ==================== RUN ====================
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(recorder, duration):
+    summary = {}
+    for endpoint, entry in sorted(recorder.endpoints.items()):
+        latencies = sorted(entry['latencies'])
+        count = len(latencies)
+        summary[endpoint] = {
+            'requests': count,
+            'throughput': round(count / duration, 2) if duration else None,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1),
+            'errors': entry['errors'],
+            'error_rate': round(entry['errors'] / count, 4),
+            'statuses': {str(status): total for status, total in entry['statuses'].items()},
+            'bytes': entry['bytes'],
+        }
+    return summary
+
+
+def run(base_url, usernames, password, *, duration=60.0, ramp=10.0, think=1.0, mix=None,
+        session_churn=0.0, server_pid=None, sample_interval=5.0, on_sample=None, seed=0):
+    """
+    Start one thread per user, spread evenly over ``ramp`` seconds, and run
+    for ``duration`` seconds in total. Returns the per-endpoint summary and
+    the sampler timeline.
+    """
+    recorder = Recorder()
+    stop = threading.Event()
+    users = [
+        VirtualUser(
+            base_url, username, password, recorder, stop,
+            start_delay=ramp * index / len(usernames),
+            think=think, mix=mix, session_churn=session_churn, seed=seed + index,
+            client_ip=f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}',
+        )
+        for index, username in enumerate(usernames)
+    ]
+    sampler = Sampler(recorder, users, stop, pid=server_pid, interval=sample_interval, on_sample=on_sample)
+
+    started = time.monotonic()
+    sampler.start()
+    for user in users:
+        user.start()
+    try:
+        stop.wait(duration)
+    finally:
+        stop.set()
+        for user in users:
+            user.join()
+        sampler.join()
+    elapsed = time.monotonic() - started
+
+    return {
+        'config': {
+            'url': base_url,
+            'users': len(usernames),
+            'duration': round(elapsed, 1),
+            'ramp': ramp,
+            'think': think,
+            'mix': mix or DEFAULT_MIX,
+            'session_churn': session_churn,
+        },
+        'endpoints': summarize(recorder, elapsed),
+        'samples': sampler.samples,
+    }
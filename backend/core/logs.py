@@ -0,0 +1,246 @@
+"""
+Non-blocking structured logging.
+
+Request threads only filter a record, merge its arguments and put it on a
+bounded queue. A background writer thread formats it as one JSON line and
+writes it, so slow stderr never delays a response. When the queue is
+full, records are dropped and counted instead of blocking the request. Each
+record carries the current request's id, owner id and route; the per-request
+access line adds method, status and duration.
+
+Configured from ``settings.LOGGING``. Levels and sample rates come from
+``LOG_LEVEL``, ``LOG_LEVELS`` and ``LOG_SAMPLE``.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.utils.functional import SimpleLazyObject, empty
+
+request_logger = logging.getLogger('core.request')
+
+_current_request = contextvars.ContextVar('current_request', default=None)
+
+# X-Request-ID values reused from the proxy; anything else gets a fresh id
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+# LogRecord attributes that are not user-supplied ``extra`` fields
+RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+# ==================== FILTERS ====================
+
+def _resolved_user(request):
+    """The request's user if authentication already ran, without triggering it"""
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp request id, owner id and route on records (runs on the request thread)"""
+
+    def filter(self, record):
+        request = _current_request.get()
+        if request is not None:
+            record.request_id = getattr(request, 'request_id', None)
+            match = getattr(request, 'resolver_match', None)
+            record.route = match.route if match else None
+            user = _resolved_user(request)
+            record.owner_id = user.pk if user is not None and user.is_authenticated else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of below-WARNING records from high-volume loggers, e.g.
+    ``{'django.db.backends': 0.01}`` keeps one SQL statement in a hundred.
+    Rates apply to a logger and its children; warnings always pass.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if not self.rates or record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+# ==================== HANDLERS ====================
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra`` fields are included as keys"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and value is not None:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class BackgroundJsonHandler(logging.StreamHandler):
+    """
+    ``emit`` only puts the record on a bounded queue; a writer thread wakes
+    every ``flush_interval`` seconds and writes everything queued since then
+    as JSON lines in one call (waking per record would take the GIL from a
+    request thread for every line).
+
+    The thread starts with the first record in each process, so importing
+    settings starts nothing and gunicorn workers forked from a preloaded
+    master start their own. ``logging.shutdown`` closes the handler at exit,
+    which drains the queue.
+    """
+
+    def __init__(self, stream=None, queue_size=10000, flush_interval=0.2):
+        super().__init__(stream)
+        self.setFormatter(JsonFormatter())
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self.dropped = 0
+        self.writer = None
+        self.closed = False
+        self._pid = None
+        self._stop = None
+
+    def emit(self, record):
+        # Handler.handle holds self.lock here
+        if self.closed:
+            self.write([self.prepare(record)])
+            return
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        # After a fork, the parent's queue and (dead) thread are left behind:
+        # records queued before the fork belong to the parent
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self.writer = threading.Thread(
+            target=self.run, args=(self.queue, self._stop), name='log-writer', daemon=True
+        )
+        self.writer.start()
+        self._pid = os.getpid()
+
+    def run(self, q, stop):
+        while True:
+            stopping = stop.wait(self.flush_interval)
+            batch = []
+            while True:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+                for _ in batch:
+                    q.task_done()
+            if stopping:
+                return
+
+    def write(self, records):
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+
+    def join(self):
+        """Block until every record queued so far is written"""
+        if self.queue is not None and self._pid == os.getpid():
+            self.queue.join()
+
+    def close(self):
+        if not self.closed and self._pid == os.getpid():
+            self._stop.set()
+            self.writer.join()
+        self.closed = True
+        super().close()
+
+    def prepare(self, record):
+        """Merge args and render tracebacks now; the JSON is built by the writer"""
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ==================== MIDDLEWARE ====================
+
+class RequestLogMiddleware:
+    """
+    Give each request an id (``X-Request-ID``, reused from the proxy when
+    present and made of at most 64 letters, digits, ``.``, ``_`` or ``-``), expose it to log records and write one access line on
+    ``core.request`` with route, owner, status and duration.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        request.request_id = request_id if REQUEST_ID_PATTERN.fullmatch(request_id) else uuid.uuid4().hex
+        token = _current_request.set(request)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            duration_ms = round((time.perf_counter() - started) * 1000, 2)
+            if request_logger.isEnabledFor(logging.INFO):
+                request_logger.info(
+                    '%s %s %s', request.method, request.path, response.status_code,
+                    extra={
+                        'method': request.method,
+                        'status': response.status_code,
+                        'duration_ms': duration_ms,
+                    }
+                )
+        finally:
+            _current_request.reset(token)
+        response['X-Request-ID'] = request.request_id
+        return response
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.query_plans import build_report, compare, load_baseline, save_baseline, vendor
+from core.sharding import is_sharded
+
+
+class Command(BaseCommand):
+    help = (
+        'Explain every query the API views and admin issue against generated data, '
+        'flag full scans and sorts, suggest indexes and compare with the baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owners', type=int, default=3)
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=10)
+        parser.add_argument('--tasks', type=int, default=300, help='Tasks per owner')
+        parser.add_argument('--plans', action='store_true', help='Print the full plan of every query')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Record query counts, and plans for the current database vendor '
+                                 '(single database only)')
+        parser.add_argument('--check', action='store_true', help='Exit with an error on regressions')
+
+    def handle(self, *args, **options):
+        report = build_report(
+            owners=options['owners'],
+            clients=options['clients'],
+            workers=options['workers'],
+            tasks=options['tasks'],
+        )
+
+        for name, entry in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name}: {entry['query_count']} queries"))
+            for query in entry['queries']:
+                if not (query['flags'] or options['plans']):
+                    continue
+                self.stdout.write(f"  {query['fingerprint'][:160]}")
+                if query['flags']:
+                    self.stdout.write(self.style.WARNING(f"    flags: {', '.join(query['flags'])}"))
+                if query['cost'] is not None:
+                    self.stdout.write(f"    cost: {query['cost']}  buffers: {query['buffers']}")
+                if query['suggestion']:
+                    self.stdout.write(f"    suggest: {query['suggestion']}")
+                if options['plans']:
+                    for line in query['plan']:
+                        self.stdout.write(f"      {line}")
+
+        # Plans of a sharded run mix databases; only its query counts are kept
+        plans = not is_sharded()
+        if options['update_baseline']:
+            save_baseline(report, plans=plans)
+            self.stdout.write(self.style.SUCCESS(
+                f"Baseline updated: query counts{f', {vendor()} plans' if plans else ''}"
+            ))
+            return
+
+        baseline = load_baseline()
+        if not baseline['plans']:
+            self.stdout.write(self.style.WARNING(
+                f'No {vendor()} plans in the baseline; checking query counts only'
+            ))
+        problems = compare(report, baseline, plans=plans)
+        for problem in problems:
+            self.stdout.write(self.style.ERROR(problem))
+        if problems and options['check']:
+            raise CommandError(f'{len(problems)} query plan regression(s)')
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,121 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import (
+    delete_users, parse_mix, run, seed_users, start_server, stop_server, wait_for_server,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Log in many synthetic users against a local server and replay a mix of '
+        'dashboard loads, task edits, analytics and exports; reports per-endpoint '
+        'latency percentiles and error rates, plus server RSS and DB connections over time'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Concurrent synthetic users')
+        parser.add_argument('--duration', type=float, default=60, help='Total run time in seconds')
+        parser.add_argument('--ramp', type=float, default=10, help='Seconds over which users start')
+        parser.add_argument('--think', type=float, default=1.0,
+                            help='Mean pause between a user\'s actions in seconds (0 for none)')
+        parser.add_argument('--mix', help='Action weights, e.g. dashboard=6,task_edit=3,analytics=1')
+        parser.add_argument('--session-churn', type=float, default=0.0,
+                            help='Chance per action that a user abandons its session and logs in again')
+        parser.add_argument('--url', help='Use an already running server instead of starting one')
+        parser.add_argument('--server-pid', type=int, help='PID to sample RSS for when using --url')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--server-workers', type=int,
+                            default=int(os.environ.get('WEB_CONCURRENCY', 4)),
+                            help='gunicorn workers for the started server')
+        parser.add_argument('--sample-every', type=float, default=5, help='Sampling interval in seconds')
+        parser.add_argument('--clients', type=int, default=20, help='Clients per user')
+        parser.add_argument('--workers', type=int, default=10, help='Workers per user')
+        parser.add_argument('--tasks', type=int, default=300, help='Tasks per user')
+        parser.add_argument('--json', help='Write the full report to this file')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the synthetic users afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix']) if options['mix'] else None
+        except ValueError as exc:
+            raise CommandError(exc)
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1')
+
+        self.stdout.write(f"Seeding {options['users']} synthetic users...")
+        usernames, password = seed_users(
+            options['users'], options['clients'], options['workers'], options['tasks']
+        )
+
+        process = None
+        base_url = options['url']
+        server_pid = options['server_pid']
+        if not base_url:
+            base_url = f"http://127.0.0.1:{options['port']}"
+            process = start_server(options['port'], options['server_workers'])
+            server_pid = process.pid
+            self.stdout.write(f"Started {' '.join(process.command[1:])} (log: {process.log_path})")
+        try:
+            wait_for_server(base_url, process)
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{'elapsed':>8} {'users':>6} {'requests':>9} {'errors':>7} "
+                f"{'rss MB':>8} {'db conns':>9} {'sessions':>9}"
+            ))
+            report = run(
+                base_url, usernames, password,
+                duration=options['duration'],
+                ramp=options['ramp'],
+                think=options['think'],
+                mix=mix,
+                session_churn=options['session_churn'],
+                server_pid=server_pid,
+                sample_interval=options['sample_every'],
+                on_sample=self.write_sample,
+            )
+        except RuntimeError as exc:
+            raise CommandError(exc)
+        finally:
+            if process is not None:
+                stop_server(process)
+            if options['cleanup']:
+                delete_users()
+
+        self.write_summary(report)
+        if options['json']:
+            with open(options['json'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Report written to {options['json']}")
+
+    def write_sample(self, sample):
+        rss = f"{sample['rss'] / 2 ** 20:.1f}" if sample['rss'] is not None else '-'
+        connections = sample['db_connections'] if sample['db_connections'] is not None else '-'
+        self.stdout.write(
+            f"{sample['elapsed']:>7}s {sample['active_users']:>6} {sample['requests']:>9} "
+            f"{sample['errors']:>7} {rss:>8} {connections:>9} {sample['sessions']:>9}"
+        )
+
+    def write_summary(self, report):
+        duration = report['config']['duration']
+        endpoints = report['endpoints']
+        total = sum(entry['requests'] for entry in endpoints.values())
+        errors = sum(entry['errors'] for entry in endpoints.values())
+
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{'endpoint':<24} {'reqs':>7} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'max ms':>8} {'err %':>6}  statuses"
+        ))
+        for endpoint, entry in endpoints.items():
+            statuses = ' '.join(f'{status}:{count}' for status, count in sorted(entry['statuses'].items()))
+            line = (
+                f"{endpoint:<24} {entry['requests']:>7} {entry['throughput']:>7} {entry['p50_ms']:>8} "
+                f"{entry['p95_ms']:>8} {entry['p99_ms']:>8} {entry['max_ms']:>8} "
+                f"{entry['error_rate'] * 100:>6.2f}  {statuses}"
+            )
+            self.stdout.write(self.style.ERROR(line) if entry['errors'] else line)
+
+        summary = f'{total} requests in {duration}s ({total / duration:.1f} req/s), {errors} errors'
+        self.stdout.write(self.style.ERROR(summary) if errors else self.style.SUCCESS(summary))
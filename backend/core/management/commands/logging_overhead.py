@@ -0,0 +1,77 @@
+import logging
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+
+from core.logs import BackgroundJsonHandler
+from core.query_plans import request_host
+
+MODES = ('disabled', 'configured', 'verbose')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure per-request logging cost through the full middleware stack: '
+        'logging disabled vs. the configured levels vs. verbose (DEBUG + SQL)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per mode and round')
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--path', default='/api/auth/csrf/',
+                            help='Cheap endpoint, so logging is a visible share of the time')
+
+    def handle(self, *args, **options):
+        root = logging.getLogger()
+        handlers = [h for h in root.handlers if isinstance(h, BackgroundJsonHandler)]
+        client = Client(HTTP_HOST=request_host(), HTTP_X_FORWARDED_PROTO='https')
+        path, count = options['path'], options['requests']
+        original_level = root.level
+
+        def set_mode(mode):
+            logging.disable(logging.CRITICAL if mode == 'disabled' else logging.NOTSET)
+            root.setLevel(logging.DEBUG if mode == 'verbose' else original_level)
+            for connection in connections.all():
+                connection.force_debug_cursor = mode == 'verbose'
+
+        def measure():
+            started = time.perf_counter()
+            for _ in range(count):
+                client.get(path)
+            return (time.perf_counter() - started) / count * 1e6
+
+        # Keep the benchmark's own output off the terminal
+        devnull = open(os.devnull, 'w')
+        streams = [handler.setStream(devnull) for handler in handlers]
+        timings = {mode: [] for mode in MODES}
+        try:
+            for _ in range(50):
+                client.get(path)
+            # Interleave modes so drift in the machine affects all of them alike
+            for _ in range(options['rounds']):
+                for mode in MODES:
+                    set_mode(mode)
+                    timings[mode].append(measure())
+        finally:
+            set_mode('configured')
+            for handler, stream in zip(handlers, streams):
+                handler.join()
+                handler.setStream(stream)
+            devnull.close()
+
+        medians = {mode: statistics.median(values) for mode, values in timings.items()}
+        self.stdout.write(f"{path}: median of {options['rounds']} rounds x {count} requests")
+        for mode in MODES:
+            delta = medians[mode] - medians['disabled']
+            extra = f'  ({delta:+.1f})' if mode != 'disabled' else ''
+            self.stdout.write(f'  {mode:<11} {medians[mode]:8.1f} us/request{extra}')
+
+        dropped = sum(handler.dropped for handler in handlers)
+        if not handlers:
+            self.stdout.write(self.style.WARNING('No BackgroundJsonHandler on the root logger'))
+        elif dropped:
+            self.stdout.write(self.style.WARNING(f'{dropped} records dropped on a full queue'))
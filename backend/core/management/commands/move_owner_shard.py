@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sharding import move_owner, shard_aliases
+
+
+class Command(BaseCommand):
+    help = "Move one owner's clients, workers and tasks to another shard while the app keeps serving"
+
+    def add_arguments(self, parser):
+        parser.add_argument('owner_id', type=int)
+        parser.add_argument('target', choices=shard_aliases())
+        parser.add_argument('--grace', type=float, default=2.0,
+                            help='Seconds to wait for in-flight writes after freezing the owner')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            move_owner(
+                options['owner_id'],
+                options['target'],
+                grace_seconds=options['grace'],
+                batch_size=options['batch_size'],
+                log=self.stdout.write,
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
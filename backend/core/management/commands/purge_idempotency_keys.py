@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import purge_expired_keys
+from core.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys on every shard (run daily, e.g. from a cron job)'
+
+    def handle(self, *args, **options):
+        for alias in shard_aliases():
+            self.stdout.write(f"{alias}: deleted {purge_expired_keys(alias)} expired keys")
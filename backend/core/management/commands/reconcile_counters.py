@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import COUNTED_BY, reconcile
+from core.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Recount client and worker task counters on every shard and repair drift in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many rows drifted')
+
+    def handle(self, *args, **options):
+        verb = 'drifted' if options['dry_run'] else 'repaired'
+        for alias in shard_aliases():
+            for model, fk in COUNTED_BY:
+                scanned, repaired = reconcile(
+                    alias, model, fk, batch_size=options['batch_size'], dry_run=options['dry_run']
+                )
+                self.stdout.write(
+                    f"{alias}: {model._meta.verbose_name_plural}: scanned {scanned}, {verb} {repaired}"
+                )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.models import Client, Worker, Task, OwnerShard
+from core.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = 'Fan out across every shard and report owners and row counts per database'
+
+    def handle(self, *args, **options):
+        owners_per_shard = dict(
+            OwnerShard.objects.using('default')
+            .values_list('alias')
+            .annotate(owners=Count('id'))
+        )
+        for alias in shard_aliases():
+            counts = {
+                model._meta.verbose_name_plural: model._base_manager.using(alias).count()
+                for model in (Client, Worker, Task)
+            }
+            summary = ', '.join(f"{name}={count}" for name, count in counts.items())
+            self.stdout.write(f"{alias}: owners={owners_per_shard.get(alias, 0)}, {summary}")
@@ -0,0 +1,84 @@
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import stop_server, wait_for_server
+
+PHASES = ('settings_ms', 'setup_ms', 'handler_ms', 'warm_up_ms', 'first_request_ms', 'second_request_ms')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cold start in fresh processes: settings import, django.setup(), '
+        'warm-up and time to first response, with and without the warm-up pass. '
+        'With --server, also time gunicorn from spawn to first response.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--server', action='store_true',
+                            help='Also start gunicorn with and without preload_app')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--server-workers', type=int, default=int(os.environ.get('WEB_CONCURRENCY', 4)))
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'))
+        for warm in (False, True):
+            runs = [self.measure_process(warm, env) for _ in range(options['runs'])]
+            label = 'with warm-up' if warm else 'cold'
+            self.stdout.write(self.style.MIGRATE_HEADING(f"In-process start, {label} (median of {options['runs']})"))
+            for phase in PHASES:
+                values = [run[phase] for run in runs if phase in run]
+                if values:
+                    self.stdout.write(f'  {phase:<18} {statistics.median(values):8.1f}')
+            total = statistics.median(sum(run.values()) for run in runs)
+            self.stdout.write(f"  {'total_ms':<18} {total:8.1f}")
+
+        if options['server']:
+            if not importlib.util.find_spec('gunicorn'):
+                raise CommandError('gunicorn is not installed')
+            for preload in (False, True):
+                times = [
+                    self.measure_server(preload, options['port'], options['server_workers'], env)
+                    for _ in range(options['runs'])
+                ]
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f"gunicorn ({options['server_workers']} workers, preload={preload}) spawn to first response"
+                ))
+                self.stdout.write(f'  median {statistics.median(times):8.1f} ms  max {max(times):8.1f} ms')
+
+    def measure_process(self, warm, env):
+        code = f'from core.warmup import measure_startup; measure_startup(warm={warm})'
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def measure_server(self, preload, port, workers, env):
+        command = [
+            sys.executable, '-m', 'gunicorn', 'backend.wsgi:application', '-c', 'gunicorn.conf.py',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        ]
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            command, cwd=settings.BASE_DIR, env=dict(env, GUNICORN_PRELOAD=str(preload)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        process.log_path = 'its stderr (discarded)'
+        try:
+            wait_for_server(f'http://127.0.0.1:{port}', process, interval=0.01)
+            return (time.perf_counter() - started) * 1000
+        except RuntimeError as exc:
+            raise CommandError(exc)
+        finally:
+            stop_server(process)
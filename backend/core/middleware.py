@@ -0,0 +1,87 @@
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:  # Optional: fall back to gzip only
+    brotli = None
+
+re_accepts_gzip = re.compile(r"\bgzip\b")
+re_accepts_br = re.compile(r"\bbr\b")
+
+
+class JsonCompressionMiddleware:
+    """
+    Compress JSON API responses above ``JSON_COMPRESSION_MIN_BYTES`` with
+    brotli (when installed and accepted) or gzip.
+
+    Small bodies such as the CSRF and login responses stay uncompressed, which
+    keeps their tokens out of reach of BREACH-style length attacks. Strong
+    ETags get a per-encoding suffix (``"abc-gzip"``) as RFC 9110 requires a
+    different validator per content-coding. A ``304`` carries the validators
+    and ``Vary`` the ``200`` would have had.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'JSON_COMPRESSION_MIN_BYTES', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if getattr(response, 'json_not_modified', False):
+            return self.not_modified(request, response)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith('application/json'):
+            return response
+        if len(response.content) < self.min_bytes:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = self.negotiate(request)
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=5)
+        elif encoding == 'gzip':
+            compressed = compress_string(response.content, max_random_bytes=100)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.endswith('"') and not etag.startswith('W/'):
+            response['ETag'] = f'{etag[:-1]}-{encoding}"'
+        return response
+
+    @staticmethod
+    def negotiate(request):
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and re_accepts_br.search(accept):
+            return 'br'
+        if re_accepts_gzip.search(accept):
+            return 'gzip'
+        return None
+
+    def not_modified(self, request, response):
+        """
+        The body size (and so whether the 200 was compressed) is unknown here;
+        the client's If-None-Match tells which representation it holds. Its
+        tag for the encoding negotiated now is the one the 200 would carry.
+        """
+        patch_vary_headers(response, ('Accept-Encoding',))
+        etag = response.get('ETag')
+        encoding = self.negotiate(request)
+        if etag and encoding and etag.endswith('"') and not etag.startswith('W/'):
+            encoded = f'{etag[:-1]}-{encoding}"'
+            if encoded in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+                response['ETag'] = encoded
+        return response
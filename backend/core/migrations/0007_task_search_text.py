@@ -0,0 +1,72 @@
+# Generated by Django 5.1 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+def extract_search_text(description):
+    """Task.extract_search_text as of this migration, frozen here"""
+    parts = []
+
+    def walk(node):
+        if isinstance(node, str):
+            parts.append(node)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+        elif isinstance(node, dict):
+            if isinstance(node.get('text'), str):
+                parts.append(node['text'])
+            walk(node.get('content', []))
+            walk(node.get('children', []))
+
+    walk(description)
+    return ' '.join(' '.join(parts).split()).lower()
+
+
+def backfill_search_text(apps, schema_editor):
+    """Fill search_text for existing tasks in batches"""
+    Task = apps.get_model('core', 'Task')
+    db_alias = schema_editor.connection.alias
+    batch = []
+    for task in Task.objects.using(db_alias).only('id', 'description').iterator(chunk_size=1000):
+        task.search_text = extract_search_text(task.description)
+        batch.append(task)
+        if len(batch) >= 1000:
+            Task.objects.using(db_alias).bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        Task.objects.using(db_alias).bulk_update(batch, ['search_text'])
+
+
+def create_trigram_index(apps, schema_editor):
+    """PostgreSQL only: trigram GIN index so admin substring search can use an index"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS core_task_search_text_trgm '
+        'ON core_task USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS core_task_search_text_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_ownerversion_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop, hints={'model_name': 'task'}),
+        migrations.RunPython(create_trigram_index, drop_trigram_index, hints={'model_name': 'task'}),
+    ]
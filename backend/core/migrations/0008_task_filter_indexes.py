@@ -0,0 +1,49 @@
+# Generated by Django 5.1 on 2026-10-19 18:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_task_search_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'status', 'due_date'], name='task_owner_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'due_date', 'status'], name='task_owner_due_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', '-updated_at'], name='task_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['client', '-updated_at'], name='task_client_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_worker', '-updated_at'], name='task_worker_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('assigned_worker__isnull', True)), fields=['owner', '-updated_at'], name='task_unassigned_idx'),
+        ),
+        # Replaced by the wider (owner, status, due_date) and (owner, due_date,
+        # status) indexes above; dropped last so queries stay indexed
+        migrations.RemoveIndex(
+            model_name='task',
+            name='core_task_owner_i_ca7b32_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='core_task_owner_i_7ac9b3_idx',
+        ),
+    ]
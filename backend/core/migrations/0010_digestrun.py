@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-19 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest_date', models.DateField()),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('tasks_scanned', models.PositiveIntegerField(default=0)),
+                ('digests_sent', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
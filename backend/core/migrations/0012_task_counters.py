@@ -0,0 +1,107 @@
+# Generated by Django 5.1 on 2026-10-19 19:21
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+
+def backfill_counters(apps, schema_editor):
+    """Count each client's and worker's tasks in batches; activity starts at the latest task update"""
+    Task = apps.get_model('core', 'Task')
+    db_alias = schema_editor.connection.alias
+    for model_name, fk in (('Client', 'client_id'), ('Worker', 'assigned_worker_id')):
+        model = apps.get_model('core', model_name)
+        last_pk = 0
+        while True:
+            batch = list(model.objects.using(db_alias).filter(pk__gt=last_pk).order_by('pk')[:1000])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            counts = {
+                row[fk]: row for row in
+                Task.objects.using(db_alias).filter(**{f'{fk}__in': [obj.pk for obj in batch]})
+                .order_by().values(fk).annotate(
+                    open=Count('pk', filter=~Q(status__in=('BLOCKED', 'DONE'))),
+                    blocked=Count('pk', filter=Q(status='BLOCKED')),
+                    done=Count('pk', filter=Q(status='DONE')),
+                    last=Max('updated_at'),
+                )
+            }
+            for obj in batch:
+                row = counts.get(obj.pk)
+                obj.open_tasks = row['open'] if row else 0
+                obj.blocked_tasks = row['blocked'] if row else 0
+                obj.done_tasks = row['done'] if row else 0
+                obj.last_activity_at = row['last'] if row else obj.created_at
+            model.objects.using(db_alias).bulk_update(
+                batch, ['open_tasks', 'blocked_tasks', 'done_tasks', 'last_activity_at']
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_requestprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='blocked_tasks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='done_tasks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='open_tasks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='blocked_tasks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='done_tasks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='worker',
+            name='open_tasks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop, hints={'model_name': 'task'}),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', '-open_tasks'], name='client_owner_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['owner', '-last_activity_at'], name='client_owner_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['owner', '-open_tasks'], name='worker_owner_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['owner', '-last_activity_at'], name='worker_owner_activity_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1 on 2026-10-19 19:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_task_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.JSONField(blank=True, default=list)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('rule', models.CharField(max_length=255)),
+                ('starts_on', models.DateField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('materialized_through', models.DateField(blank=True, editable=False, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('assigned_worker', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recurring_tasks', to='core.worker')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recurring_tasks', to='core.client')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_tasks', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='occurrences', to='core.recurringtask'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('recurrence__isnull', False)), fields=('recurrence', 'due_date'), name='task_recurrence_day_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringtask',
+            index=models.Index(fields=['owner', '-created_at'], name='recurring_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringtask',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['materialized_through'], name='recurring_pending_idx'),
+        ),
+    ]
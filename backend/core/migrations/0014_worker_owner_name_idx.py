@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-19 19:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recurring_tasks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='worker',
+            index=models.Index(fields=['owner', 'name'], name='worker_owner_name_idx'),
+        ),
+    ]
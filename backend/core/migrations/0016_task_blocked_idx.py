@@ -0,0 +1,19 @@
+# Generated by Django 5.1 on 2026-10-19 19:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_task_owner_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('status', 'BLOCKED')), fields=['owner', 'due_date'], name='task_blocked_idx'),
+        ),
+    ]
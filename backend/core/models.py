@@ -1,7 +1,44 @@
-from django.db import models
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 
-class Client(models.Model):
+from .sharding import OwnerShardedManager
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Task attributes that decide which counters a task contributes to
+COUNTER_STATE_FIELDS = ('client_id', 'assigned_worker_id', 'status')
+
+
+class TaskCounters(models.Model):
+    """
+    Denormalized counts of the tasks pointing at a row, maintained by
+    core/counters.py. Open means TODO or IN_PROGRESS.
+    """
+    open_tasks = models.PositiveIntegerField(default=0)
+    blocked_tasks = models.PositiveIntegerField(default=0)
+    done_tasks = models.PositiveIntegerField(default=0)
+    # Last task write that involved this row (creation time until then)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    counter_fields = ('open_tasks', 'blocked_tasks', 'done_tasks', 'last_activity_at')
+
+    def save(self, *args, **kwargs):
+        # Counters only change through F() updates; saving an edited row must
+        # not write back the values that were loaded with it
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+    class Meta:
+        abstract = True
+
+
+class Client(TaskCounters):
     owner = models.ForeignKey(
         User, 
         on_delete=models.CASCADE, 
@@ -12,6 +49,9 @@ class Client(models.Model):
     phone = models.CharField(max_length=50, blank=True, null=True)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OwnerShardedManager()
 
     def __str__(self):
         return f"{self.name} ({self.owner.username})"
@@ -19,9 +59,12 @@ class Client(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['owner', 'created_at']),
+            # Sorting the client list by load or recent activity
+            models.Index(fields=['owner', '-open_tasks'], name='client_owner_open_idx'),
+            models.Index(fields=['owner', '-last_activity_at'], name='client_owner_activity_idx'),
         ]
 
-class Worker(models.Model):
+class Worker(TaskCounters):
     owner = models.ForeignKey(
         User, 
         on_delete=models.CASCADE, 
@@ -32,10 +75,61 @@ class Worker(models.Model):
     availability = models.CharField(max_length=100, blank=True, null=True)
     contact_email = models.EmailField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OwnerShardedManager()
 
     def __str__(self):
         return f"{self.name} ({self.owner.username})"
 
+    class Meta:
+        indexes = [
+            # Default list ordering
+            models.Index(fields=['owner', 'name'], name='worker_owner_name_idx'),
+            models.Index(fields=['owner', '-open_tasks'], name='worker_owner_open_idx'),
+            models.Index(fields=['owner', '-last_activity_at'], name='worker_owner_activity_idx'),
+        ]
+
+class RecurringTask(models.Model):
+    """
+    A task template repeated on an RRULE-style schedule (core/recurrence.py).
+    ``materialize_recurring_tasks`` creates the occurrences that fall inside
+    the look-ahead window; ``materialized_through`` is the last date covered.
+    """
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recurring_tasks'
+    )
+    description = models.JSONField(default=list, blank=True)
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, null=True, blank=True, related_name='recurring_tasks')
+    assigned_worker = models.ForeignKey(Worker, on_delete=models.SET_NULL, null=True, blank=True, related_name='recurring_tasks')
+    notes = models.TextField(blank=True, null=True)
+    # e.g. FREQ=WEEKLY;BYDAY=MO,TH or FREQ=MONTHLY;BYDAY=1MO
+    rule = models.CharField(max_length=255)
+    starts_on = models.DateField()
+    is_active = models.BooleanField(default=True)
+    materialized_through = models.DateField(blank=True, null=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OwnerShardedManager()
+
+    def __str__(self):
+        return f"{self.rule} from {self.starts_on}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', '-created_at'], name='recurring_owner_created_idx'),
+            # The materializer's sweep: active rules not yet covered to the horizon
+            models.Index(
+                fields=['materialized_through'],
+                condition=models.Q(is_active=True),
+                name='recurring_pending_idx'
+            ),
+        ]
+
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('TODO', 'To Do'),
@@ -55,14 +149,204 @@ class Task(models.Model):
     assigned_worker = models.ForeignKey(Worker, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_tasks')
     client = models.ForeignKey(Client, on_delete=models.CASCADE, null=True, blank=True, related_name='tasks')
     notes = models.TextField(blank=True, null=True)
+    # Set on occurrences created from a RecurringTask
+    recurrence = models.ForeignKey(RecurringTask, on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences')
+    # Lower-cased plain text of description, kept in sync by save() for search
+    search_text = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OwnerShardedManager()
+
     def __str__(self):
         return f"Task {self.id} ({self.owner.username})"
+
+    @staticmethod
+    def extract_text(description):
+        """Flatten BlockNote JSON (or legacy plain text) into plain text"""
+        parts = []
+
+        def walk(node):
+            if isinstance(node, str):
+                parts.append(node)
+            elif isinstance(node, list):
+                for item in node:
+                    walk(item)
+            elif isinstance(node, dict):
+                if isinstance(node.get('text'), str):
+                    parts.append(node['text'])
+                walk(node.get('content', []))
+                walk(node.get('children', []))
+
+        walk(description)
+        return ' '.join(' '.join(parts).split())
+
+    @classmethod
+    def extract_search_text(cls, description):
+        return cls.extract_text(description).lower()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Baseline for the Client/Worker counter deltas (core/counters.py)
+        if all(name in field_names for name in COUNTER_STATE_FIELDS):
+            instance._counter_state = tuple(getattr(instance, name) for name in COUNTER_STATE_FIELDS)
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.search_text = self.extract_search_text(self.description)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'description' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        # The counter updates run in post_save; commit them with the row
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+    @property
+    def version(self):
+        """Write-version token for If-Match: updated_at in whole microseconds"""
+        if self.updated_at is None:
+            return None
+        return str((self.updated_at - EPOCH) // timedelta(microseconds=1))
     
     class Meta:
         indexes = [
-            models.Index(fields=['owner', 'status']),
-            models.Index(fields=['owner', 'due_date']),
-        ]
\ No newline at end of file
+            # Status tabs, optionally with a due-date range or overdue cut-off
+            models.Index(fields=['owner', 'status', 'due_date'], name='task_owner_status_due_idx'),
+            # Due-date ranges, overdue and the calendar's per-day status counts
+            models.Index(fields=['owner', 'due_date', 'status'], name='task_owner_due_status_idx'),
+            # Default list ordering, and per-client / per-worker views
+            models.Index(fields=['owner', '-updated_at'], name='task_owner_updated_idx'),
+            # ?ordering=created_at / -created_at
+            models.Index(fields=['owner', '-created_at'], name='task_owner_created_idx'),
+            models.Index(fields=['client', '-updated_at'], name='task_client_updated_idx'),
+            models.Index(fields=['assigned_worker', '-updated_at'], name='task_worker_updated_idx'),
+            models.Index(
+                fields=['owner', '-updated_at'],
+                condition=models.Q(assigned_worker__isnull=True),
+                name='task_unassigned_idx'
+            ),
+            # The digest's blocked-task sweep (core/digest.py), in owner order
+            models.Index(
+                fields=['owner', 'due_date'],
+                condition=models.Q(status='BLOCKED'),
+                name='task_blocked_idx'
+            ),
+        ]
+        constraints = [
+            # One occurrence per rule and day, so materializing twice is harmless
+            models.UniqueConstraint(
+                fields=['recurrence', 'due_date'],
+                condition=models.Q(recurrence__isnull=False),
+                name='task_recurrence_day_uniq'
+            ),
+        ]
+
+class OwnerShard(models.Model):
+    """Stable owner -> database alias lookup (always stored on ``default``)"""
+    owner = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shard_assignment'
+    )
+    alias = models.CharField(max_length=64)
+    is_frozen = models.BooleanField(default=False)
+    assigned_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.owner_id} -> {self.alias}"
+
+
+class OwnerVersion(models.Model):
+    """
+    Per-owner change counter, bumped on every Client/Worker/Task write.
+    Lives on the owner's shard and feeds the ETag/Last-Modified validators.
+    """
+    owner = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='data_version'
+    )
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OwnerShardedManager()
+
+    def __str__(self):
+        return f"{self.owner_id} v{self.version}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    Outcome of a write sent with an idempotency key. Retries with the same key
+    get this result back instead of running the write again, until ``expires_at``.
+    Lives on the owner's shard, next to the rows the write touched.
+    """
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys'
+    )
+    key = models.CharField(max_length=255)
+    # sha256 of the request, so a key reused for a different write is refused
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = OwnerShardedManager()
+
+    def __str__(self):
+        return f"{self.owner_id}:{self.key}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'key'], name='idempotency_owner_key_uniq'),
+        ]
+
+
+class DigestRun(models.Model):
+    """
+    One ``send_digests`` run (stored on ``default``). The last finished run's
+    ``started_at`` is the watermark for what counts as changed next time.
+    """
+    digest_date = models.DateField()
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(blank=True, null=True)
+    tasks_scanned = models.PositiveIntegerField(default=0)
+    digests_sent = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Digest {self.digest_date} ({self.digests_sent} sent)"
+
+
+class RequestProfile(models.Model):
+    """
+    Artifacts of one staff-triggered request profile (``X-Profile: 1``, see
+    core/profiling.py). Stored on ``default``; listed and downloaded in admin.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='request_profiles'
+    )
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2048)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField()
+    sql_ms = models.FloatField()
+    response_bytes = models.PositiveIntegerField(blank=True, null=True)
+    samples = models.PositiveIntegerField()
+    # Collapsed stacks ("a;b;c 12" per line) for flamegraph.pl or speedscope
+    flamegraph = models.TextField()
+    sql_report = models.TextField()
+    serializer_fields = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,300 @@
+"""
+On-demand profiling of single real requests, for staff.
+
+A staff user adds ``X-Profile: 1`` (or ``?_profile=1``) to any request.
+``ProfilingMiddleware`` then records, for that request only:
+
+- a sampling call profile of the request thread, as collapsed stacks that
+  ``flamegraph.pl`` and speedscope read directly,
+- every SQL statement with its duration and the project call site that ran
+  it (statements only; parameter values are never stored),
+- time spent per serializer field (inclusive of nested serializers),
+- the response size before compression.
+
+The artifacts are saved as a ``RequestProfile`` and listed in admin, and the
+response carries ``X-Profile-ID``. The middleware is only installed with
+``REQUEST_PROFILING=True``; requests without the switch then pay one header
+lookup.
+
+Every collector is scoped to the profiled request: SQL through the request
+thread's connections, serializer timing by wrapping the fields of the
+serializers that request's views build (``ProfiledSerializerMixin``). The one
+process-wide knob is the GIL switch interval, which is only changed when
+``PROFILE_SWITCH_INTERVAL_MS`` is set.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import ListSerializer, Serializer
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_QUERY_PARAM = '_profile'
+
+_active_profile = ContextVar('active_profile', default=None)
+_switch_lock = threading.Lock()
+_switch_users = 0
+_switch_interval = None
+_this_file = os.path.abspath(__file__)
+
+
+def short_path(filename):
+    """Path relative to the project or to site-packages"""
+    if filename.startswith(str(settings.BASE_DIR)):
+        return os.path.relpath(filename, settings.BASE_DIR)
+    marker = 'site-packages' + os.sep
+    if marker in filename:
+        return filename.split(marker, 1)[1]
+    return filename
+
+
+def wants_profile(request):
+    if request.META.get(PROFILE_HEADER) == '1':
+        return True
+    return (PROFILE_QUERY_PARAM in request.META.get('QUERY_STRING', '')
+            and request.GET.get(PROFILE_QUERY_PARAM) == '1')
+
+
+# ==================== COLLECTORS ====================
+
+class StackSampler(threading.Thread):
+    """Sample one thread's Python stack every ``interval`` seconds"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+class SqlRecorder:
+    """``connection.execute_wrapper`` that times statements and keeps their call sites"""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'ms': (time.perf_counter() - started) * 1000,
+                'many': many,
+                'stack': self.call_site(),
+            })
+
+    @staticmethod
+    def call_site(depth=8):
+        """Innermost project frames (outside this module), else the innermost frames"""
+        frames = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            frames.append((frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name))
+            frame = frame.f_back
+        base = str(settings.BASE_DIR)
+        project = [f for f in frames if f[0].startswith(base) and f[0] != _this_file]
+        return [
+            f'{short_path(filename)}:{lineno} in {name}'
+            for filename, lineno, name in reversed((project or frames)[:depth])
+        ]
+
+    def report(self):
+        total_ms = sum(statement['ms'] for statement in self.statements)
+        lines = [f'{len(self.statements)} statements, {total_ms:.2f} ms', '']
+
+        grouped = defaultdict(list)
+        for statement in self.statements:
+            grouped[statement['sql']].append(statement['ms'])
+        repeated = sorted(
+            ((sql, times) for sql, times in grouped.items() if len(times) > 1),
+            key=lambda item: -sum(item[1])
+        )
+        if repeated:
+            lines.append('Repeated statements (possible N+1):')
+            for sql, times in repeated:
+                lines.append(f'  {len(times)}x, {sum(times):.2f} ms: {sql[:200]}')
+            lines.append('')
+
+        for index, statement in enumerate(self.statements, 1):
+            many = ' (executemany)' if statement['many'] else ''
+            lines.append(f"#{index} [{statement['alias']}] {statement['ms']:.2f} ms{many}")
+            lines.append(f"  {statement['sql']}")
+            lines.extend(f'    at {frame}' for frame in statement['stack'])
+            lines.append('')
+        return '\n'.join(lines)
+
+
+def time_serializer_fields(serializer, profiler):
+    """
+    Time every field of ``serializer`` (and of nested serializers) for
+    ``profiler``, by wrapping the bound field instances; fields of other
+    requests and the serializer classes are untouched
+    """
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    for field in serializer.fields.values():
+        timing = profiler.field_times[f'{type(serializer).__name__}.{field.field_name}']
+        _time_method(field, 'get_attribute', timing, counts=True)
+        _time_method(field, 'to_representation', timing)
+        if isinstance(field, (Serializer, ListSerializer)):
+            time_serializer_fields(field, profiler)
+
+
+def _time_method(field, name, timing, counts=False):
+    original = getattr(field, name)
+
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            if counts:
+                timing[0] += 1
+            timing[1] += time.perf_counter() - started
+
+    setattr(field, name, timed)
+
+
+class ProfiledSerializerMixin:
+    """View mixin: in a profiled request, time the fields of the serializers the view builds"""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        profiler = _active_profile.get()
+        if profiler is not None:
+            time_serializer_fields(serializer, profiler)
+        return serializer
+
+
+def _shorten_switch_interval(enable):
+    """
+    With ``PROFILE_SWITCH_INTERVAL_MS`` set, lower the GIL switch interval
+    while at least one profile runs so the sampler thread gets to run every
+    sampling interval (the default 5 ms caps the sample rate). This applies to
+    every thread in the process, so it is opt-in; the previous value comes
+    back when the last profile ends.
+    """
+    global _switch_users, _switch_interval
+    if not settings.PROFILE_SWITCH_INTERVAL_MS:
+        return
+    with _switch_lock:
+        _switch_users += 1 if enable else -1
+        if enable and _switch_users == 1:
+            _switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(_switch_interval, settings.PROFILE_SWITCH_INTERVAL_MS / 1000))
+        elif not enable and _switch_users == 0:
+            sys.setswitchinterval(_switch_interval)
+
+
+# ==================== MIDDLEWARE ====================
+
+class RequestProfiler:
+    """Everything recorded for one request"""
+
+    def __init__(self):
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        self.sql = SqlRecorder()
+        # 'Serializer.field' -> [calls, seconds]
+        self.field_times = defaultdict(lambda: [0, 0.0])
+
+    def serializer_report(self):
+        rows = [
+            {'field': name, 'calls': calls, 'ms': round(seconds * 1000, 3)}
+            for name, (calls, seconds) in self.field_times.items()
+        ]
+        return sorted(rows, key=lambda row: -row['ms'])
+
+
+class ProfilingMiddleware:
+    """
+    Place after ``AuthenticationMiddleware`` (the switch is staff-only) and
+    ``ShardRoutingMiddleware`` so queries route as they normally would.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wants_profile(request) or not request.user.is_staff:
+            return self.get_response(request)
+
+        profiler = RequestProfiler()
+        token = _active_profile.set(profiler)
+        _shorten_switch_interval(True)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profiler.sql))
+                profiler.sampler.start()
+                try:
+                    response = self.get_response(request)
+                    # Render lazily rendered responses inside the profile
+                    if hasattr(response, 'render') and not response.is_rendered:
+                        response.render()
+                finally:
+                    profiler.sampler.stop()
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            _shorten_switch_interval(False)
+            _active_profile.reset(token)
+
+        profile = self.save(request, response, profiler, duration_ms)
+        response['X-Profile-ID'] = str(profile.pk)
+        return response
+
+    def save(self, request, response, profiler, duration_ms):
+        from .models import RequestProfile
+
+        profile = RequestProfile.objects.using('default').create(
+            user=request.user,
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            sql_count=len(profiler.sql.statements),
+            sql_ms=sum(statement['ms'] for statement in profiler.sql.statements),
+            response_bytes=None if response.streaming else len(response.content),
+            samples=sum(profiler.sampler.stacks.values()),
+            flamegraph=profiler.sampler.collapsed(),
+            sql_report=profiler.sql.report(),
+            serializer_fields=profiler.serializer_report(),
+        )
+        # Keep only the newest PROFILE_KEEP artifacts
+        stale = RequestProfile.objects.using('default').order_by('-created_at')[settings.PROFILE_KEEP:]
+        stale_ids = list(stale.values_list('pk', flat=True))
+        if stale_ids:
+            RequestProfile.objects.using('default').filter(pk__in=stale_ids).delete()
+        return profile
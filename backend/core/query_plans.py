@@ -0,0 +1,394 @@
+"""
+Query-plan regression suite and index advisor.
+
+The suite generates owner-scoped data, drives the real API and admin endpoints
+through the Django test client and captures every SQL statement they issue.
+Each SELECT is explained (``EXPLAIN (ANALYZE, BUFFERS)`` on PostgreSQL,
+``EXPLAIN QUERY PLAN`` on SQLite) and reduced to a set of flags: full table
+scans and sorts that an index could have served.
+
+The baseline has two parts. Query counts per scenario do not depend on the
+database, so they are checked on every vendor and shard layout (routing
+lookups in ``core_ownershard`` are left out of the count). Plans are recorded
+per vendor. The test suite only holds PostgreSQL plans to them, since those
+are the plans production runs: new flags, or cost or buffer growth past the
+tolerance. SQLite's flags stay advisory for ``explain_hot_queries``.
+"""
+
+import json
+import logging
+import random
+import re
+from contextlib import ExitStack
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.test import Client as TestClient
+from django.test.utils import CaptureQueriesContext
+
+from .logs import request_logger
+from .models import Client, Worker, Task, RecurringTask
+from .sharding import owner_context, shard_aliases, shard_for_owner
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'query_plan_baseline.json'
+
+# Postgres plans only: relative cost and buffer growth tolerated before flagging
+COST_TOLERANCE = 1.5
+BUFFER_TOLERANCE = 1.5
+
+# Shard lookups depend on the deployment, not on the view
+ROUTING_TABLES = ('core_ownershard',)
+
+
+class Rollback(Exception):
+    """Raised to undo generated data once a report is built"""
+
+
+# ==================== DATA ====================
+
+def generate_data(owners=3, clients=20, workers=10, tasks=300, seed=0, prefix='__plan_owner_'):
+    """Bulk-create owners with clients, workers and tasks; returns the users"""
+    rng = random.Random(seed)
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    users = []
+    for index in range(owners):
+        user = User.objects.create_user(f'{prefix}{index}', password=None)
+        users.append(user)
+        with owner_context(user):
+            client_rows = Client.objects.bulk_create([
+                Client(owner=user, name=f'Client {n}', contact_email=f'c{n}@example.com')
+                for n in range(clients)
+            ])
+            worker_rows = Worker.objects.bulk_create([
+                Worker(owner=user, name=f'Worker {n}', skills='Ops')
+                for n in range(workers)
+            ])
+            Task.objects.bulk_create([
+                Task(
+                    owner=user,
+                    description=[{'type': 'paragraph', 'content': f'Task {n}'}],
+                    search_text=f'task {n}',
+                    status=rng.choice(statuses),
+                    due_date=date.today() + timedelta(days=rng.randint(-30, 60)),
+                    client=rng.choice(client_rows + [None]),
+                    assigned_worker=rng.choice(worker_rows + [None]),
+                )
+                for n in range(tasks)
+            ], batch_size=500)
+            RecurringTask.objects.bulk_create([
+                RecurringTask(
+                    owner=user,
+                    description=[{'type': 'paragraph', 'content': f'Weekly review {n}'}],
+                    rule='FREQ=WEEKLY;BYDAY=MO',
+                    starts_on=date.today(),
+                    client=rng.choice(client_rows + [None]),
+                    assigned_worker=rng.choice(worker_rows + [None]),
+                )
+                for n in range(clients // 4)
+            ])
+    return users
+
+
+def analyze_tables():
+    """Refresh planner statistics so plans match a populated database"""
+    for alias in shard_aliases():
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                for model in (Client, Worker, RecurringTask, Task):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+            elif connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+
+
+# ==================== SCENARIOS ====================
+
+def scenarios(owner):
+    """(name, method, path) for every hot view and admin page"""
+    with owner_context(owner):
+        task = Task.objects.filter(owner=owner).order_by('pk').first()
+        client = Client.objects.filter(owner=owner).order_by('pk').first()
+    month_start = date.today().replace(day=1)
+    return [
+        ('api.tasks.list', 'get', '/api/tasks/'),
+        ('api.tasks.detail', 'get', f'/api/tasks/{task.pk}/'),
+        ('api.tasks.update', 'patch', f'/api/tasks/{task.pk}/'),
+        ('api.tasks.analytics', 'get', '/api/tasks/analytics/'),
+        ('api.tasks.by_created', 'get', '/api/tasks/?ordering=-created_at'),
+        ('api.tasks.filter_status', 'get', '/api/tasks/?status=TODO,BLOCKED&ordering=due_date'),
+        ('api.tasks.filter_overdue', 'get', '/api/tasks/?overdue=true'),
+        ('api.tasks.filter_unassigned', 'get', '/api/tasks/?unassigned=true'),
+        ('api.tasks.filter_client', 'get', f'/api/tasks/?client={client.pk}'),
+        ('api.tasks.calendar', 'get', f'/api/tasks/calendar/?from={month_start}&to={month_start + timedelta(days=30)}'),
+        ('api.clients.list', 'get', '/api/clients/'),
+        ('api.clients.detail', 'get', f'/api/clients/{client.pk}/'),
+        ('api.clients.by_open', 'get', '/api/clients/?ordering=-open_tasks'),
+        ('api.clients.by_activity', 'get', '/api/clients/?ordering=-last_activity_at&has_blocked=true'),
+        ('api.workers.list', 'get', '/api/workers/'),
+        ('api.workers.by_load', 'get', '/api/workers/?ordering=-open_tasks&min_open=1'),
+        ('api.recurring_tasks.list', 'get', '/api/recurring-tasks/'),
+        ('admin.task.changelist', 'get', '/admin/core/task/'),
+        ('admin.task.search', 'get', '/admin/core/task/?q=Task+1'),
+        ('admin.task.worker_filter', 'get', '/admin/core/task/?worker=Worker+1'),
+        ('admin.task.change', 'get', f'/admin/core/task/{task.pk}/change/'),
+        ('admin.client.changelist', 'get', '/admin/core/client/'),
+        ('admin.worker.changelist', 'get', '/admin/core/worker/'),
+    ]
+
+
+def request_host():
+    host = settings.ALLOWED_HOSTS[0].lstrip('.') if settings.ALLOWED_HOSTS else 'localhost'
+    return 'localhost' if host == '*' else host
+
+
+def capture(http, method, path):
+    """Run one request and return the SQL statements it issued, per alias"""
+    with ExitStack() as stack:
+        contexts = {
+            alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in shard_aliases()
+        }
+        if method == 'patch':
+            response = http.patch(path, data='{"notes": "plan"}', content_type='application/json', secure=True)
+        else:
+            response = getattr(http, method)(path, secure=True)
+    assert response.status_code < 400, f'{path} returned {response.status_code}'
+    return [
+        (alias, query['sql'])
+        for alias, context in contexts.items()
+        for query in context.captured_queries
+    ]
+
+
+# ==================== PLANS ====================
+
+def fingerprint(sql):
+    """SQL with literals removed, so generated ids do not change the key"""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    sql = re.sub(r'IN \((\?, )*\?\)', 'IN (...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def explain(alias, sql):
+    """Return {'flags', 'plan', 'cost', 'buffers'} for one SELECT"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return _summarize_postgres(plan[0]['Plan'])
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return _summarize_sqlite([row[3] for row in cursor.fetchall()])
+    return {'flags': [], 'plan': [], 'cost': None, 'buffers': None}
+
+
+def _summarize_postgres(root):
+    flags, lines = [], []
+
+    def walk(node, depth=0):
+        node_type = node['Node Type']
+        relation = node.get('Relation Name', '')
+        lines.append('  ' * depth + f"{node_type} {relation}".strip())
+        if node_type == 'Seq Scan':
+            flags.append(f'seq_scan:{relation}')
+        elif node_type in ('Sort', 'Incremental Sort'):
+            flags.append('sort:' + ','.join(node.get('Sort Key', [])))
+        for child in node.get('Plans', []):
+            walk(child, depth + 1)
+
+    walk(root)
+    return {
+        'flags': sorted(set(flags)),
+        'plan': lines,
+        'cost': root.get('Total Cost'),
+        'buffers': root.get('Shared Hit Blocks', 0) + root.get('Shared Read Blocks', 0),
+    }
+
+
+def _summarize_sqlite(details):
+    flags = []
+    for detail in details:
+        scan = re.match(r'SCAN (\w+)( USING (COVERING )?INDEX \w+)?', detail)
+        # Skip constant rows, derived tables and SQLite's own statistics tables
+        if scan and scan.group(1) not in ('CONSTANT', 'subquery') and not scan.group(1).startswith('sqlite_'):
+            flags.append(f'seq_scan:{scan.group(1)}')
+        elif 'USE TEMP B-TREE FOR' in detail:
+            flags.append('sort:' + detail.split('FOR ', 1)[1].lower())
+    return {'flags': sorted(set(flags)), 'plan': details, 'cost': None, 'buffers': None}
+
+
+# ==================== ADVISOR ====================
+
+def suggest_index(sql, flags):
+    """Heuristic composite/covering index for a flagged query, or None"""
+    tables = {flag.split(':', 1)[1] for flag in flags if flag.startswith('seq_scan:')}
+    table_match = re.search(r'FROM "(\w+)"', sql)
+    if not tables and table_match and any(flag.startswith('sort:') for flag in flags):
+        tables = {table_match.group(1)}
+    suggestions = []
+    for table in sorted(tables):
+        if not table.startswith('core_'):
+            continue
+        where = sql.split(' WHERE ', 1)[1] if ' WHERE ' in sql else ''
+        where = re.split(r' (GROUP BY|ORDER BY|LIMIT) ', where)[0]
+        equality = re.findall(rf'"{table}"\."(\w+)" = ', where)
+        ranges = re.findall(rf'"{table}"\."(\w+)" (?:<|>|<=|>=|IN|IS) ', where)
+        ordering = []
+        order_match = re.search(r' ORDER BY (.+?)(?: LIMIT | OFFSET |$)', sql)
+        if order_match:
+            for term in order_match.group(1).split(','):
+                column = re.search(rf'"{table}"\."(\w+)"', term)
+                if column:
+                    ordering.append(('-' if 'DESC' in term else '') + column.group(1))
+        grouping = re.findall(rf'GROUP BY .*?"{table}"\."(\w+)"', sql)
+
+        fields = []
+        for column in equality + grouping + ordering + ranges:
+            name = column[:-3] if column.lstrip('-').endswith('_id') else column
+            if name.lstrip('-') not in [f.lstrip('-') for f in fields]:
+                fields.append(name)
+        if not fields or [f.lstrip('-') for f in fields] == ['id']:
+            continue
+        selected = re.findall(rf'"{table}"\."(\w+)"', sql.split(' FROM ', 1)[0])
+        include = [c for c in dict.fromkeys(selected) if c not in {f.lstrip('-') for f in fields} and c != 'id']
+        suggestion = f"{table}: models.Index(fields={fields!r})"
+        if include and len(include) <= 3:
+            suggestion += f" (PostgreSQL covering: include={include!r})"
+        suggestions.append(suggestion)
+    return '; '.join(suggestions) or None
+
+
+# ==================== REPORTS ====================
+
+def build_report(owners=3, clients=20, workers=10, tasks=300):
+    """
+    Generate data, run every scenario and explain its SELECTs.
+    Everything runs in rolled-back transactions on every shard.
+    """
+    report = {}
+    # Access lines for every scenario request are only noise here
+    request_level = request_logger.level
+    request_logger.setLevel(logging.WARNING)
+    try:
+        with ExitStack() as stack:
+            for alias in shard_aliases():
+                stack.enter_context(transaction.atomic(using=alias))
+            users = generate_data(owners, clients, workers, tasks)
+            analyze_tables()
+
+            owner = users[0]
+            staff = User.objects.create_superuser('__plan_staff', 'staff@example.com', None)
+            # Place the staff user now so its one-off shard assignment isn't counted
+            shard_for_owner(staff.pk)
+            api = TestClient(HTTP_HOST=request_host())
+            api.force_login(owner)
+            admin = TestClient(HTTP_HOST=request_host())
+            admin.force_login(staff)
+
+            for name, method, path in scenarios(owner):
+                http = admin if name.startswith('admin.') else api
+                statements = capture(http, method, path)
+                queries = []
+                for alias, sql in statements:
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    summary = explain(alias, sql)
+                    queries.append({
+                        'fingerprint': fingerprint(sql),
+                        'flags': summary['flags'],
+                        'cost': summary['cost'],
+                        'buffers': summary['buffers'],
+                        'plan': summary['plan'],
+                        'suggestion': suggest_index(sql, summary['flags']),
+                    })
+                counted = [sql for _, sql in statements if not any(f'"{table}"' in sql for table in ROUTING_TABLES)]
+                report[name] = {'query_count': len(counted), 'queries': queries}
+            raise Rollback
+    except Rollback:
+        pass
+    finally:
+        request_logger.setLevel(request_level)
+    return report
+
+
+def vendor():
+    return connections['default'].vendor
+
+
+def load_baseline():
+    """{'query_counts': {scenario: n}, 'plans': this vendor's plans or {}}"""
+    data = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    return {'query_counts': data.get('query_counts', {}), 'plans': data.get(vendor(), {})}
+
+
+def save_baseline(report, plans=True):
+    """Record query counts, and (``plans=True``) this vendor's plans"""
+    data = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    data['query_counts'] = {name: entry['query_count'] for name, entry in report.items()}
+    if not plans:
+        BASELINE_PATH.write_text(json.dumps(data, indent=2, sort_keys=True) + '\n')
+        return
+    data[vendor()] = {}
+    for name, entry in report.items():
+        # N+1 patterns repeat one fingerprint; keep each once with its worst plan
+        unique = {}
+        for query in entry['queries']:
+            seen = unique.setdefault(query['fingerprint'], {
+                'fingerprint': query['fingerprint'], 'flags': [], 'cost': None,
+            })
+            seen['flags'] = sorted(set(seen['flags']) | set(query['flags']))
+            if query['cost'] is not None:
+                seen['cost'] = max(seen['cost'] or 0, query['cost'])
+            if query['buffers'] is not None:
+                seen['buffers'] = max(seen.get('buffers') or 0, query['buffers'])
+        data[vendor()][name] = {
+            'queries': sorted(unique.values(), key=lambda query: query['fingerprint']),
+        }
+    BASELINE_PATH.write_text(json.dumps(data, indent=2, sort_keys=True) + '\n')
+
+
+def compare(report, baseline, plans=True):
+    """
+    List of human-readable regressions of ``report`` against ``baseline``.
+    Plans are only compared with ``plans=True`` and a baseline for this vendor.
+    """
+    problems = []
+    for name, entry in report.items():
+        count = baseline['query_counts'].get(name)
+        if count is None:
+            problems.append(f'{name}: no baseline entry')
+            continue
+        if entry['query_count'] > count:
+            problems.append(f"{name}: {entry['query_count']} queries (baseline {count})")
+
+        base = baseline['plans'].get(name)
+        if not plans or base is None:
+            continue
+        known = {query['fingerprint']: query for query in base['queries']}
+        for query in entry['queries']:
+            previous = known.get(query['fingerprint'])
+            allowed = set(previous['flags']) if previous else set()
+            new_flags = sorted(set(query['flags']) - allowed)
+            if new_flags:
+                hint = f" -> {query['suggestion']}" if query['suggestion'] else ''
+                problems.append(f"{name}: {', '.join(new_flags)} in {query['fingerprint'][:120]}{hint}")
+            elif previous and previous.get('cost') and query['cost'] \
+                    and query['cost'] > previous['cost'] * COST_TOLERANCE:
+                problems.append(
+                    f"{name}: plan cost {query['cost']:.0f} vs {previous['cost']:.0f} "
+                    f"in {query['fingerprint'][:120]}"
+                )
+            elif previous and previous.get('buffers') and query['buffers'] \
+                    and query['buffers'] > previous['buffers'] * BUFFER_TOLERANCE:
+                problems.append(
+                    f"{name}: {query['buffers']} buffers vs {previous['buffers']} "
+                    f"in {query['fingerprint'][:120]}"
+                )
+    return problems
@@ -0,0 +1,322 @@
+"""
+Recurring tasks.
+
+A ``RecurringTask`` holds a task template and an RRULE-style schedule (RFC 5545
+subset, whole days only)::
+
+    FREQ=DAILY|WEEKLY|MONTHLY|YEARLY
+    INTERVAL=n            every n-th period (default 1)
+    BYDAY=MO,TH | 1MO,-1FR  weekdays; MONTHLY/YEARLY also take an ordinal
+    BYMONTHDAY=1,15,-1    days of the month, negative from the end
+    BYMONTH=1,4,7,10
+    COUNT=n | UNTIL=YYYYMMDD
+
+``materialize_recurring_tasks`` turns rules into ordinary ``Task`` rows, only
+for dates up to ``RECURRENCE_WINDOW_DAYS`` ahead, so the table grows with the
+window instead of with the schedule. One pass covers every owner: rules are
+read per shard in primary-key batches, and each batch is written with one
+``bulk_create`` plus a handful of bookkeeping updates (counters, ETag
+versions, watermarks), never a query per rule or per task.
+
+Reruns are idempotent: each rule remembers the last date it was materialized
+through, and a run locks the rules it works on (``select_for_update``), so an
+overlapping or concurrent run inserts nothing twice; ``(recurrence, due_date)``
+is unique as well.
+"""
+
+import calendar
+from collections import namedtuple
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .caching import bump_owner_versions
+from .counters import add_created_tasks
+from .models import RecurringTask, Task
+from .sharding import shard_aliases
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# byday: ((ordinal, weekday), ...) with ordinal 0 for "every"; weekday 0 is Monday
+Rule = namedtuple('Rule', 'freq interval byday bymonthday bymonth count until')
+
+
+# ==================== RULES ====================
+
+def _int_list(name, value, low, high):
+    try:
+        numbers = [int(part) for part in value.split(',')]
+    except ValueError:
+        raise ValueError(f'{name} must be a comma-separated list of integers.')
+    for number in numbers:
+        if number == 0 or not low <= number <= high:
+            raise ValueError(f'{name} values must be between {low} and {high}, not 0.')
+    return tuple(numbers)
+
+
+def _weekday_list(value):
+    byday = []
+    for part in value.upper().split(','):
+        code, ordinal = part[-2:], part[:-2]
+        if code not in WEEKDAYS or (ordinal and not ordinal.lstrip('+-').isdigit()):
+            raise ValueError(f"Invalid BYDAY entry '{part}'; expected e.g. MO, 1MO or -1FR.")
+        ordinal = int(ordinal) if ordinal else 0
+        if part[:-2] and not (1 <= abs(ordinal) <= 5):
+            raise ValueError('BYDAY ordinals must be between -5 and 5, not 0.')
+        byday.append((ordinal, WEEKDAYS.index(code)))
+    return tuple(byday)
+
+
+def _until(value):
+    # Date or date-time form; only the date counts
+    try:
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    except ValueError:
+        raise ValueError('UNTIL must be a date, YYYYMMDD.')
+
+
+def parse_rule(text):
+    """Parse an RRULE string into a ``Rule``; raises ValueError with a user-facing message"""
+    text = (text or '').strip()
+    if text.upper().startswith('RRULE:'):
+        text = text[6:]
+    parts = {}
+    for part in filter(None, text.split(';')):
+        name, sep, value = part.partition('=')
+        if not sep or not value:
+            raise ValueError(f"Expected NAME=VALUE, got '{part}'.")
+        parts[name.strip().upper()] = value.strip()
+
+    freq = parts.pop('FREQ', '').upper()
+    if freq not in FREQUENCIES:
+        raise ValueError(f"FREQ must be one of {', '.join(FREQUENCIES)}.")
+    interval = _int_list('INTERVAL', parts.pop('INTERVAL', '1'), 1, 1000)[0]
+    byday = _weekday_list(parts.pop('BYDAY')) if 'BYDAY' in parts else ()
+    bymonthday = _int_list('BYMONTHDAY', parts.pop('BYMONTHDAY'), -31, 31) if 'BYMONTHDAY' in parts else ()
+    bymonth = _int_list('BYMONTH', parts.pop('BYMONTH'), 1, 12) if 'BYMONTH' in parts else ()
+    count = _int_list('COUNT', parts.pop('COUNT'), 1, 10000)[0] if 'COUNT' in parts else None
+    until = _until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+    parts.pop('WKST', None)
+    if parts:
+        raise ValueError(f"Unsupported rule part(s): {', '.join(sorted(parts))}.")
+
+    if count is not None and until is not None:
+        raise ValueError('Use either COUNT or UNTIL, not both.')
+    if freq in ('DAILY', 'WEEKLY') and any(ordinal for ordinal, _ in byday):
+        raise ValueError('BYDAY ordinals need FREQ=MONTHLY or YEARLY.')
+    if freq == 'WEEKLY' and bymonthday:
+        raise ValueError('BYMONTHDAY cannot be used with FREQ=WEEKLY.')
+    if freq == 'YEARLY' and byday and not bymonth:
+        raise ValueError('FREQ=YEARLY with BYDAY needs BYMONTH.')
+    return Rule(freq, interval, byday, bymonthday, bymonth, count, until)
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def _month_days(rule, year, month, default_day):
+    """Dates in one month selected by BYMONTHDAY/BYDAY (or the start date's day)"""
+    last = calendar.monthrange(year, month)[1]
+    days = None
+    if rule.bymonthday:
+        days = {day if day > 0 else last + day + 1 for day in rule.bymonthday}
+        days = {day for day in days if 1 <= day <= last}
+    elif not rule.byday:
+        # Like RFC 5545, months without that day (the 31st, Feb 30th) are skipped
+        days = {default_day} if default_day <= last else set()
+    if rule.byday:
+        first_weekday = calendar.monthrange(year, month)[0]
+        matches = set()
+        for ordinal, weekday in rule.byday:
+            hits = list(range(1 + (weekday - first_weekday) % 7, last + 1, 7))
+            if not ordinal:
+                matches.update(hits)
+            elif ordinal <= len(hits) and -ordinal <= len(hits):
+                matches.add(hits[ordinal - 1 if ordinal > 0 else ordinal])
+        days = matches if days is None else days & matches
+    return [date(year, month, day) for day in sorted(days)]
+
+
+def _period(rule, start, index):
+    """(first day of period ``index`` counted from ``start``'s period, its candidate dates)"""
+    if rule.freq == 'DAILY':
+        day = start + timedelta(days=index)
+        keep = (
+            (not rule.byday or day.weekday() in {weekday for _, weekday in rule.byday})
+            and (not rule.bymonthday or day.day in rule.bymonthday
+                 or day.day - calendar.monthrange(day.year, day.month)[1] - 1 in rule.bymonthday)
+        )
+        return day, [day] if keep else []
+    if rule.freq == 'WEEKLY':
+        monday = start - timedelta(days=start.weekday()) + timedelta(weeks=index)
+        weekdays = sorted({weekday for _, weekday in rule.byday}) or [start.weekday()]
+        return monday, [monday + timedelta(days=weekday) for weekday in weekdays]
+    if rule.freq == 'MONTHLY':
+        year, month = divmod(_month_index(start) + index, 12)
+        return date(year, month + 1, 1), _month_days(rule, year, month + 1, start.day)
+    year = start.year + index
+    # BYMONTHDAY alone repeats in every month, as in RFC 5545
+    months = rule.bymonth or (range(1, 13) if rule.bymonthday else (start.month,))
+    days = [day for month in sorted(months) for day in _month_days(rule, year, month, start.day)]
+    return date(year, 1, 1), days
+
+
+def _period_index(rule, start, day):
+    """Index of the period containing ``day``"""
+    if rule.freq == 'DAILY':
+        return (day - start).days
+    if rule.freq == 'WEEKLY':
+        return ((day - timedelta(days=day.weekday())) - (start - timedelta(days=start.weekday()))).days // 7
+    if rule.freq == 'MONTHLY':
+        return _month_index(day) - _month_index(start)
+    return day.year - start.year
+
+
+def occurrences(rule, start, first, last):
+    """
+    Dates of ``rule`` beginning on ``start`` that fall in [first, last].
+    Without COUNT the walk jumps straight to ``first``; with COUNT it has to
+    count from ``start``.
+    """
+    index = 0
+    if rule.count is None and first > start:
+        index = _period_index(rule, start, first) // rule.interval * rule.interval
+    if rule.until is not None:
+        last = min(last, rule.until)
+    seen = 0
+    while True:
+        period_start, days = _period(rule, start, index)
+        if period_start > last:
+            return
+        for day in days:
+            if day < start or (rule.bymonth and day.month not in rule.bymonth):
+                continue
+            seen += 1
+            if rule.count is not None and seen > rule.count:
+                return
+            if day > last:
+                return
+            if day >= first:
+                yield day
+        index += rule.interval
+
+
+# ==================== MATERIALIZER ====================
+
+class Materializer:
+    """
+    Create every active rule's occurrences up to ``today + window_days``.
+    Past dates are never filled in: a new or long-paused rule starts today.
+    """
+
+    def __init__(self, today=None, window_days=None, batch_size=None):
+        self.today = today or timezone.localdate()
+        self.horizon = self.today + timedelta(days=settings.RECURRENCE_WINDOW_DAYS if window_days is None else window_days)
+        self.batch_size = batch_size or settings.RECURRENCE_BATCH_SIZE
+        self.rules_scanned = 0
+        self.rules_skipped = 0
+        self.tasks_created = 0
+
+    def pending(self, alias):
+        """Batches of active rules on ``alias`` not yet covered to the horizon"""
+        queryset = (
+            RecurringTask._base_manager.using(alias)
+            .filter(is_active=True)
+            .filter(Q(materialized_through__isnull=True) | Q(materialized_through__lt=self.horizon))
+            .order_by('pk')
+        )
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:self.batch_size])
+            if not batch:
+                return
+            last_pk = batch[-1].pk
+            yield batch
+
+    def materialize(self, alias, rules):
+        """Write the occurrences of ``rules`` (all on ``alias``); returns how many were created"""
+        self.rules_scanned += len(rules)
+        with transaction.atomic(using=alias):
+            # Lock the batch and plan from the rows as stored: while a run
+            # holds a rule nobody else inserts its occurrences or moves its
+            # watermark, so every planned task is really created (and
+            # counted). Rules another run holds are left to it.
+            locked = (
+                RecurringTask._base_manager.using(alias)
+                .select_for_update(skip_locked=True)
+                .filter(pk__in=[recurring.pk for recurring in rules], is_active=True)
+                .order_by('pk')
+            )
+            planned, covered = [], set()
+            for recurring in locked:
+                try:
+                    rule = parse_rule(recurring.rule)
+                except ValueError:
+                    # Rules are validated on save; one edited by hand is left alone
+                    self.rules_skipped += 1
+                    continue
+                first = max(recurring.starts_on, self.today)
+                if recurring.materialized_through is not None:
+                    first = max(first, recurring.materialized_through + timedelta(days=1))
+                planned.extend((recurring, day) for day in occurrences(rule, recurring.starts_on, first, self.horizon))
+                covered.add(recurring.pk)
+            if not covered:
+                return 0
+
+            existing = set(
+                Task._base_manager.using(alias)
+                .filter(recurrence__in=covered, due_date__gte=self.today)
+                .values_list('recurrence_id', 'due_date')
+            ) if planned else set()
+            search_text = {}
+            tasks = []
+            for recurring, day in planned:
+                if (recurring.pk, day) in existing:
+                    continue
+                if recurring.pk not in search_text:
+                    search_text[recurring.pk] = Task.extract_search_text(recurring.description)
+                tasks.append(Task(
+                    owner_id=recurring.owner_id,
+                    recurrence_id=recurring.pk,
+                    description=recurring.description,
+                    search_text=search_text[recurring.pk],
+                    due_date=day,
+                    client_id=recurring.client_id,
+                    assigned_worker_id=recurring.assigned_worker_id,
+                    notes=recurring.notes,
+                ))
+
+            if tasks:
+                Task._base_manager.using(alias).bulk_create(tasks, batch_size=1000)
+                add_created_tasks(alias, tasks)
+                bump_owner_versions(alias, {task.owner_id for task in tasks})
+            RecurringTask._base_manager.using(alias).filter(pk__in=covered).update(materialized_through=self.horizon)
+        for recurring in rules:
+            if recurring.pk in covered:
+                recurring.materialized_through = self.horizon
+
+        self.tasks_created += len(tasks)
+        return len(tasks)
+
+    def run(self):
+        for alias in shard_aliases():
+            for batch in self.pending(alias):
+                self.materialize(alias, batch)
+        return self
+
+
+def clear_upcoming(recurring, today=None):
+    """
+    Delete the rule's occurrences from today on that are still To Do (after a
+    schedule change or when the rule is deleted) and reset its watermark.
+    Bounded by the window, and deleted with signals so counters stay right.
+    """
+    today = today or timezone.localdate()
+    recurring.occurrences.filter(status='TODO', due_date__gte=today).delete()
+    RecurringTask._base_manager.using(recurring._state.db).filter(pk=recurring.pk).update(materialized_through=None)
+    recurring.materialized_through = None
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Client, Worker, Task
+from .models import Client, Worker, Task, RecurringTask
+from .recurrence import parse_rule
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,12 +20,66 @@ class WorkerSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'skills', 'availability', 'contact_email', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+class ClientWithCountersSerializer(ClientSerializer):
+    """Client list and detail; the counters are left out where clients are nested in tasks"""
+    class Meta(ClientSerializer.Meta):
+        fields = ClientSerializer.Meta.fields + list(Client.counter_fields)
+        read_only_fields = ClientSerializer.Meta.read_only_fields + list(Client.counter_fields)
+
+class WorkerWithCountersSerializer(WorkerSerializer):
+    """Worker list and detail, with the worker's current load"""
+    class Meta(WorkerSerializer.Meta):
+        fields = WorkerSerializer.Meta.fields + list(Worker.counter_fields)
+        read_only_fields = WorkerSerializer.Meta.read_only_fields + list(Worker.counter_fields)
+
+def preload_owned_rows(context, model, pks):
+    """
+    Load the requesting user's ``model`` rows among ``pks`` in one query, for
+    every ``OwnerScopedPrimaryKeyRelatedField`` validated with ``context``
+    """
+    rows = context.setdefault('owned_rows', {}).setdefault(model, {})
+    missing = {pk for pk in pks if pk not in rows}
+    if missing and context.get('user') is not None:
+        rows.update(model.objects.filter(owner=context['user'], pk__in=missing).in_bulk())
+    return rows
+
+
+class OwnerScopedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Only accepts ids of rows owned by the requesting user. Ids preloaded with
+    ``preload_owned_rows`` need no query, anything else costs one.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.context.get('user')
+        if user is None:
+            return queryset.none()
+        return queryset.filter(owner=user)
+
+    def to_internal_value(self, data):
+        rows = self.context.get('owned_rows', {}).get(self.queryset.model, {})
+        if isinstance(data, int) and not isinstance(data, bool) and data in rows:
+            return rows[data]
+        return super().to_internal_value(data)
+
+
+class CurrentOwnerField(serializers.PrimaryKeyRelatedField):
+    """``owner_id`` may only name the requesting user; resolved without a query"""
+
+    def to_internal_value(self, data):
+        user = self.context.get('user')
+        if user is not None and str(data) == str(user.pk):
+            return user
+        self.fail('does_not_exist', pk_value=data)
+
+
 class TaskSerializer(serializers.ModelSerializer):
     client = ClientSerializer(read_only=True)
     assigned_worker = WorkerSerializer(read_only=True)
     
     # For writing/updating
-    client_id = serializers.PrimaryKeyRelatedField(
+    client_id = OwnerScopedPrimaryKeyRelatedField(
         queryset=Client.objects.all(),
         source='client',
         write_only=True,
@@ -32,7 +87,7 @@ class TaskSerializer(serializers.ModelSerializer):
         required=False
     )
     
-    assigned_worker_id = serializers.PrimaryKeyRelatedField(
+    assigned_worker_id = OwnerScopedPrimaryKeyRelatedField(
         queryset=Worker.objects.all(),
         source='assigned_worker',
         write_only=True,
@@ -40,21 +95,72 @@ class TaskSerializer(serializers.ModelSerializer):
         required=False
     )
     
-    owner = UserSerializer(read_only=True)
-    owner_id = serializers.PrimaryKeyRelatedField(
+    owner = serializers.SerializerMethodField()
+    owner_id = CurrentOwnerField(
         queryset=User.objects.all(),
         source='owner',
         write_only=True,
         required=False
     )
 
+    version = serializers.CharField(read_only=True)
+    recurrence_id = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Task
         fields = [
             'id', 'description', 'due_date', 'status', 'notes',
-            'created_at', 'updated_at',
+            'created_at', 'updated_at', 'version', 'recurrence_id',
             'client', 'client_id',
             'assigned_worker', 'assigned_worker_id',
             'owner', 'owner_id'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+    def get_owner(self, task):
+        # Tasks are owner-scoped, so this is the requesting user for every row;
+        # serialize it once per response instead of loading task.owner per row
+        user = self.context.get('user')
+        if user is None or task.owner_id != user.pk:
+            return UserSerializer(task.owner).data
+        if '_owner_data' not in self.context:
+            self.context['_owner_data'] = UserSerializer(user).data
+        return self.context['_owner_data']
+
+
+class RecurringTaskSerializer(serializers.ModelSerializer):
+    client = ClientSerializer(read_only=True)
+    assigned_worker = WorkerSerializer(read_only=True)
+
+    client_id = OwnerScopedPrimaryKeyRelatedField(
+        queryset=Client.objects.all(),
+        source='client',
+        write_only=True,
+        allow_null=True,
+        required=False
+    )
+
+    assigned_worker_id = OwnerScopedPrimaryKeyRelatedField(
+        queryset=Worker.objects.all(),
+        source='assigned_worker',
+        write_only=True,
+        allow_null=True,
+        required=False
+    )
+
+    class Meta:
+        model = RecurringTask
+        fields = [
+            'id', 'description', 'rule', 'starts_on', 'is_active', 'notes',
+            'materialized_through', 'created_at', 'updated_at',
+            'client', 'client_id',
+            'assigned_worker', 'assigned_worker_id',
+        ]
+        read_only_fields = ['id', 'materialized_through', 'created_at', 'updated_at']
+
+    def validate_rule(self, value):
+        try:
+            parse_rule(value)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
+        return value.strip()
@@ -0,0 +1,419 @@
+"""
+Owner-based sharding.
+
+Every Client, Worker and Task row belongs to exactly one owner, so each owner's
+rows live together on one database alias. The owner -> alias mapping is kept in
+the ``OwnerShard`` lookup table on the ``default`` database, which also holds
+users, sessions and the admin log. ``default`` doubles as the first shard, so a
+single-database deployment behaves exactly as before.
+"""
+
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import models, router, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.fields import AutoFieldMixin
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+SHARDED_MODELS = ('client', 'worker', 'recurringtask', 'task', 'ownerversion', 'idempotencykey')
+
+# Each shard allocates primary keys from its own range so rows can move between
+# shards without colliding. Stays below 2**53 so ids survive JSON in browsers.
+SHARD_ID_SPAN = 10 ** 12
+
+# auth_user columns copied to the owner's stub row on each shard
+STUB_FIELDS = ('username', 'first_name', 'last_name', 'email', 'is_active')
+
+# Owner id of the request/job currently running, and the alias it resolved to
+_current_owner = contextvars.ContextVar('current_owner', default=None)
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+class OwnerShardFrozen(APIException):
+    """Raised for writes while an owner's rows are being moved between shards"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved. Please retry in a few seconds.'
+    default_code = 'shard_frozen'
+
+
+def shard_aliases():
+    """All database aliases that hold owner data, ``default`` first"""
+    return list(getattr(settings, 'SHARD_DATABASES', ['default']))
+
+
+def is_sharded():
+    return len(shard_aliases()) > 1
+
+
+def is_sharded_model(model):
+    return model._meta.app_label == 'core' and model._meta.model_name in SHARDED_MODELS
+
+
+def assign_shard(owner_id):
+    """
+    Return the ``OwnerShard`` row for an owner, creating it on first use.
+    New owners are placed by id so the spread is even and reproducible.
+    """
+    from .models import OwnerShard
+
+    aliases = shard_aliases()
+    mapping = OwnerShard.objects.using('default').filter(owner_id=owner_id).first()
+    if mapping is None:
+        mapping, created = OwnerShard.objects.using('default').get_or_create(
+            owner_id=owner_id,
+            defaults={'alias': aliases[owner_id % len(aliases)]}
+        )
+        if created:
+            ensure_owner_stub(owner_id, mapping.alias)
+    return mapping
+
+
+def shard_for_owner(owner_id):
+    """Alias holding this owner's rows (no frozen check)"""
+    if not is_sharded():
+        return 'default'
+    return assign_shard(owner_id).alias
+
+
+def ensure_owner_stub(owner_id, alias):
+    """
+    Shards keep a copy of the owner's ``auth_user`` row so the ``owner`` foreign
+    keys stay enforceable. The copy carries no usable password; authentication
+    always goes through ``default``.
+    """
+    if alias == 'default' or User.objects.using(alias).filter(pk=owner_id).exists():
+        return
+    user = User.objects.using('default').get(pk=owner_id)
+    User.objects.using(alias).create(
+        pk=user.pk,
+        password='!',
+        **{name: getattr(user, name) for name in STUB_FIELDS}
+    )
+
+
+def sync_owner_stub(sender, instance, using, update_fields=None, **kwargs):
+    """post_save on User: keep the stub on the owner's shard up to date"""
+    if using != 'default' or not is_sharded():
+        return
+    if update_fields is not None and not set(update_fields) & set(STUB_FIELDS):
+        return  # e.g. last_login on every sign-in
+    from .models import OwnerShard
+
+    alias = OwnerShard.objects.using('default').filter(owner_id=instance.pk).values_list('alias', flat=True).first()
+    if alias and alias != 'default':
+        User.objects.using(alias).filter(pk=instance.pk).update(
+            **{name: getattr(instance, name) for name in STUB_FIELDS}
+        )
+
+
+def current_shard(for_write=False):
+    """Alias for the owner bound to the current context, or None if unbound"""
+    owner_id = _current_owner.get()
+    if owner_id is None:
+        return None
+
+    resolved = _current_shard.get()
+    if resolved is None or resolved[0] != owner_id:
+        if is_sharded():
+            mapping = assign_shard(owner_id)
+            resolved = (owner_id, mapping.alias, mapping.is_frozen)
+        else:
+            resolved = (owner_id, 'default', False)
+        _current_shard.set(resolved)
+
+    if for_write and resolved[2]:
+        raise OwnerShardFrozen()
+    return resolved[1]
+
+
+@contextmanager
+def owner_context(owner):
+    """Route ORM access for ``owner`` (a User or user id) to its shard"""
+    owner_id = getattr(owner, 'pk', owner)
+    owner_token = _current_owner.set(owner_id)
+    shard_token = _current_shard.set(None)
+    try:
+        yield
+    finally:
+        _current_shard.reset(shard_token)
+        _current_owner.reset(owner_token)
+
+
+def _owner_id_from_hints(hints):
+    if hints.get('owner_id') is not None:
+        return hints['owner_id']
+    instance = hints.get('instance')
+    if instance is None:
+        return None
+    if isinstance(instance, User):
+        return instance.pk
+    return getattr(instance, 'owner_id', None)
+
+
+class OwnerShardRouter:
+    """
+    Database router for ``DATABASE_ROUTERS``.
+
+    Sharded models go to the shard of the instance's owner when Django passes an
+    instance hint (or an ``owner_id`` hint, see ``OwnerShardedQuerySet``),
+    otherwise to the shard of the owner bound by ``owner_context`` (the request
+    middleware binds the logged-in user). Everything else lives on ``default``.
+    """
+
+    def _route(self, model, for_write, **hints):
+        if not is_sharded_model(model):
+            return 'default'
+        if not is_sharded():
+            return 'default'
+
+        owner_id = _owner_id_from_hints(hints)
+        if owner_id is not None and owner_id != _current_owner.get():
+            return shard_for_owner(owner_id)
+
+        alias = current_shard(for_write=for_write)
+        if alias is None:
+            instance = hints.get('instance')
+            if instance is not None and instance._state.db:
+                return instance._state.db
+        return alias or 'default'
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, for_write=False, **hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, for_write=True, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Owner foreign keys point at the stub copy of the user on each shard
+        if isinstance(obj1, User) and is_sharded_model(type(obj2)):
+            return True
+        if isinstance(obj2, User) and is_sharded_model(type(obj1)):
+            return True
+        # A task and its client or worker must live on the same owner's shard
+        if is_sharded_model(obj1._meta.model) and is_sharded_model(obj2._meta.model) and is_sharded():
+            owners = (getattr(obj1, 'owner_id', None), getattr(obj2, 'owner_id', None))
+            if None not in owners:
+                return shard_for_owner(owners[0]) == shard_for_owner(owners[1])
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == 'default':
+            return True
+        if db not in shard_aliases():
+            return None
+        if app_label in ('auth', 'contenttypes'):
+            return True
+        # Data migrations (no model_name) only run against default
+        return app_label == 'core' and model_name in SHARDED_MODELS
+
+
+class OwnerShardedQuerySet(models.QuerySet):
+    """
+    ``create`` and ``bulk_create`` without ``using()`` write to the owner's
+    shard. Django picks their database before any instance exists, so the
+    router would otherwise only see the owner bound by ``owner_context`` and
+    put other owners' rows (or all rows, outside a request) on ``default``.
+    """
+
+    def create(self, **kwargs):
+        if self._db is None and is_sharded():
+            owner_id = kwargs.get('owner_id', getattr(kwargs.get('owner'), 'pk', None))
+            if owner_id is not None:
+                return self.using(router.db_for_write(self.model, owner_id=owner_id)).create(**kwargs)
+        return super().create(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        if self._db is not None or not is_sharded():
+            return super().bulk_create(objs, *args, **kwargs)
+        objs = list(objs)
+        by_alias = defaultdict(list)
+        for obj in objs:
+            by_alias[router.db_for_write(self.model, instance=obj)].append(obj)
+        for alias, group in by_alias.items():
+            self.using(alias).bulk_create(group, *args, **kwargs)
+        return objs
+
+
+OwnerShardedManager = models.Manager.from_queryset(OwnerShardedQuerySet)
+
+
+class ShardRoutingMiddleware:
+    """Bind the authenticated user to the router for the rest of the request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_sharded():
+            return self.get_response(request)
+
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.get_response(request)
+
+        with owner_context(user.pk):
+            return self.get_response(request)
+
+
+def reserve_id_ranges(sender, using, **kwargs):
+    """post_migrate: start each shard's id sequences at ``index * SHARD_ID_SPAN``"""
+    from django.apps import apps
+    from django.db import connections
+
+    aliases = shard_aliases()
+    if using not in aliases or aliases.index(using) == 0:
+        return
+    floor = aliases.index(using) * SHARD_ID_SPAN
+    connection = connections[using]
+
+    with connection.cursor() as cursor:
+        for model_name in SHARDED_MODELS:
+            model = apps.get_model('core', model_name)
+            if not isinstance(model._meta.pk, AutoFieldMixin):
+                continue
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST((SELECT COALESCE(MAX(id), 0) FROM {table}), %s))",
+                    [table, floor]
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, floor])
+                elif row[0] < floor:
+                    cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [floor, table])
+
+
+# ==================== ONLINE MOVES ====================
+
+def _copy_rows(model, owner_id, source, target, since=None, batch_size=500):
+    """
+    Upsert the owner's rows from source into target, preserving primary keys.
+    Inserts are raw so auto_now/auto_now_add timestamps keep their values.
+    """
+    queryset = model._base_manager.using(source).filter(owner_id=owner_id).order_by('pk')
+    if since is not None:
+        # Idempotency keys are never modified after insert
+        stamp = 'updated_at' if hasattr(model, 'updated_at') else 'created_at'
+        queryset = queryset.filter(**{f'{stamp}__gte': since})
+
+    fields = model._meta.concrete_fields
+    update_fields = [f for f in fields if not f.primary_key]
+    target_manager = model._base_manager.using(target)
+
+    def flush(batch):
+        target_manager._insert(
+            batch, fields=fields, raw=True, using=target,
+            on_conflict=OnConflict.UPDATE,
+            update_fields=update_fields,
+            unique_fields=[model._meta.pk],
+        )
+
+    copied = 0
+    batch = []
+    for obj in queryset.iterator(chunk_size=batch_size):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            flush(batch)
+            copied += len(batch)
+            batch = []
+    if batch:
+        flush(batch)
+        copied += len(batch)
+    return copied
+
+
+def _drop_missing(model, owner_id, source, target):
+    """Delete target rows that were deleted on the source since the first pass"""
+    source_ids = set(
+        model._base_manager.using(source).filter(owner_id=owner_id).values_list('pk', flat=True)
+    )
+    stale = model._base_manager.using(target).filter(owner_id=owner_id).exclude(pk__in=source_ids)
+    return stale._raw_delete(target)
+
+
+def move_owner(owner_id, target, grace_seconds=2.0, batch_size=500, log=None):
+    """
+    Move one owner's rows to ``target`` while the app keeps serving.
+
+    1. Bulk copy everything (reads and writes continue on the source).
+    2. Freeze the owner: writes get a 503 while reads still hit the source.
+    3. Wait ``grace_seconds`` for in-flight writes, then copy what changed
+       and recount the owner's client and worker counters (their ``F()``
+       updates don't touch ``updated_at``, so step 3's copy can miss them).
+    4. Flip the lookup row and unfreeze, then delete the source rows.
+    """
+    from .counters import COUNTED_BY, reconcile
+    from .models import Client, Worker, RecurringTask, Task, OwnerShard, OwnerVersion, IdempotencyKey
+
+    log = log or (lambda message: None)
+    if not is_sharded():
+        raise ValueError('Sharding is not configured (only one database)')
+    if target not in shard_aliases():
+        raise ValueError(f"Unknown shard '{target}'")
+
+    mapping = assign_shard(owner_id)
+    source = mapping.alias
+    if source == target:
+        log(f"Owner {owner_id} already on {target}")
+        return {}
+
+    ensure_owner_stub(owner_id, target)
+    models_in_order = (OwnerVersion, Client, Worker, RecurringTask, Task, IdempotencyKey)
+
+    started = time.monotonic()
+    copy_started_at = timezone.now()
+
+    counts = {}
+    for model in models_in_order:
+        counts[model._meta.model_name] = _copy_rows(model, owner_id, source, target, batch_size=batch_size)
+        log(f"Copied {counts[model._meta.model_name]} {model._meta.verbose_name_plural}")
+
+    OwnerShard.objects.using('default').filter(pk=mapping.pk).update(is_frozen=True)
+    try:
+        time.sleep(grace_seconds)
+        with transaction.atomic(using=target):
+            for model in models_in_order:
+                _copy_rows(model, owner_id, source, target, since=copy_started_at, batch_size=batch_size)
+            for model in reversed(models_in_order):
+                _drop_missing(model, owner_id, source, target)
+            for model, fk in COUNTED_BY:
+                reconcile(target, model, fk, batch_size=batch_size, owner_id=owner_id)
+        OwnerShard.objects.using('default').filter(pk=mapping.pk).update(alias=target, is_frozen=False)
+    except Exception:
+        OwnerShard.objects.using('default').filter(pk=mapping.pk).update(is_frozen=False)
+        raise
+
+    with transaction.atomic(using=source):
+        for model in reversed(models_in_order):
+            model._base_manager.using(source).filter(owner_id=owner_id)._raw_delete(source)
+        if source != 'default':
+            User.objects.using(source).filter(pk=owner_id)._raw_delete(source)
+
+    log(f"Moved owner {owner_id} from {source} to {target} in {time.monotonic() - started:.2f}s")
+    return counts
+
+
+def delete_owner_rows(sender, instance, using, **kwargs):
+    """pre_delete on User: the cascade on default cannot reach other shards"""
+    from .models import Client, Worker, RecurringTask, Task, OwnerShard, OwnerVersion, IdempotencyKey
+
+    if using != 'default' or not is_sharded():
+        return
+    mapping = OwnerShard.objects.using('default').filter(owner_id=instance.pk).first()
+    if mapping is None or mapping.alias == 'default':
+        return
+    with transaction.atomic(using=mapping.alias):
+        for model in (IdempotencyKey, Task, RecurringTask, Worker, Client, OwnerVersion):
+            model._base_manager.using(mapping.alias).filter(owner_id=instance.pk)._raw_delete(mapping.alias)
+        User.objects.using(mapping.alias).filter(pk=instance.pk)._raw_delete(mapping.alias)
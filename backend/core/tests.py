@@ -1,3 +1,1264 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import logging
+import runpy
+import sys
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connections
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.serializers import Serializer
+
+try:
+    import fakeredis
+except ImportError:  # optional, only for the Redis admission test
+    fakeredis = None
+
+from . import idempotency, loadtest
+from .admin import EstimatedCountPaginator, TaskAdmin
+from .digest import send_digests
+from .logs import BackgroundJsonHandler, RequestContextFilter, SamplingFilter, request_logger
+from .models import Client, Worker, Task, RecurringTask, OwnerShard, DigestRun, RequestProfile
+from .query_plans import _summarize_postgres, build_report, compare, load_baseline, vendor
+from .recurrence import Materializer, occurrences, parse_rule
+from .sharding import (
+    SHARD_ID_SPAN, OwnerShardFrozen, OwnerShardRouter, _copy_rows as copy_rows, assign_shard, ensure_owner_stub,
+    is_sharded, move_owner, owner_context, reserve_id_ranges, shard_aliases, shard_for_owner,
+)
+from .throttling import TokenBucketThrottle, acquire_slot, release_slot
+from .views import TaskViewSet
+from .warmup import warm_up
+
+# First configured shard after default; the sharding tests need
+# SHARD_DATABASE_URLS (see README)
+SECOND_SHARD = shard_aliases()[1] if is_sharded() else None
+
+
+class QueryPlanRegressionTests(TestCase):
+    """
+    Fails when a hot view or admin query issues more queries than the baseline
+    (any database), or, on PostgreSQL, scans, sorts or reads more buffers than
+    its recorded ``EXPLAIN (ANALYZE, BUFFERS)`` plan
+    """
+    databases = '__all__'
+
+    def test_query_counts_do_not_regress(self):
+        problems = compare(build_report(), load_baseline(), plans=False)
+        self.assertEqual(problems, [], '\n'.join(problems))
+
+    @skipUnless(vendor() == 'postgresql' and not is_sharded(), 'plans are checked on a single PostgreSQL database')
+    def test_postgres_plans_do_not_regress(self):
+        baseline = load_baseline()
+        self.assertTrue(baseline['plans'], 'No postgresql plans in the baseline, record them with '
+                                           'explain_hot_queries --update-baseline')
+        problems = compare(build_report(), baseline)
+        self.assertEqual(problems, [], '\n'.join(problems))
+
+
+class PostgresPlanComparisonTests(SimpleTestCase):
+    """The PostgreSQL summary and comparison, on a canned EXPLAIN (ANALYZE, BUFFERS) plan"""
+
+    def plan(self, cost=10.0, hits=4, reads=0, node='Index Scan'):
+        return {
+            'Node Type': 'Limit', 'Total Cost': cost, 'Shared Hit Blocks': hits, 'Shared Read Blocks': reads,
+            'Plans': [{'Node Type': node, 'Relation Name': 'core_task'}],
+        }
+
+    def report(self, summary):
+        return {'api.tasks.list': {'query_count': 1, 'queries': [
+            {'fingerprint': 'SELECT ?', 'suggestion': None, **summary},
+        ]}}
+
+    def baseline(self, summary):
+        return {'query_counts': {'api.tasks.list': 1}, 'plans': {'api.tasks.list': {'queries': [
+            {'fingerprint': 'SELECT ?', 'flags': summary['flags'], 'cost': summary['cost'],
+             'buffers': summary['buffers']},
+        ]}}}
+
+    def test_summary_counts_shared_buffers(self):
+        summary = _summarize_postgres(self.plan(hits=4, reads=2))
+        self.assertEqual((summary['cost'], summary['buffers'], summary['flags']), (10.0, 6, []))
+        self.assertEqual(summary['plan'], ['Limit', '  Index Scan core_task'])
+
+    def test_scans_cost_and_buffer_growth_are_regressions(self):
+        baseline = self.baseline(_summarize_postgres(self.plan()))
+        self.assertEqual(compare(self.report(_summarize_postgres(self.plan(hits=5))), baseline), [])
+        for plan, problem in (
+            (self.plan(node='Seq Scan'), 'seq_scan:core_task'),
+            (self.plan(cost=20.0), 'plan cost 20 vs 10'),
+            (self.plan(hits=4, reads=4), '8 buffers vs 4'),
+        ):
+            with self.subTest(problem=problem):
+                problems = compare(self.report(_summarize_postgres(plan)), baseline)
+                self.assertEqual(len(problems), 1)
+                self.assertIn(problem, problems[0])
+        self.assertEqual(compare(self.report(_summarize_postgres(self.plan(cost=20.0))), baseline, plans=False), [])
+
+
+def place_owner(user, alias):
+    """Pin ``user``'s rows to ``alias`` instead of the id-based placement"""
+    OwnerShard.objects.using('default').create(owner=user, alias=alias)
+    ensure_owner_stub(user.pk, alias)
+
+
+class ApiTestCase(TestCase):
+    """
+    Logged-in owner and a JSON helper; access logs are silenced. When sharded,
+    the owner lives on the last shard, so requests and the test's own ORM calls
+    (bound with ``owner_context``) both have to route there.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        logging.disable(logging.WARNING)
+        cls.addClassCleanup(logging.disable, logging.NOTSET)
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        if is_sharded():
+            place_owner(self.user, shard_aliases()[-1])
+        self.enterContext(owner_context(self.user))
+        self.client.force_login(self.user)
+
+    def api(self, method, path, data=None, **headers):
+        kwargs = {'secure': True, 'headers': headers}
+        if data is not None:
+            kwargs.update(data=json.dumps(data), content_type='application/json')
+        return getattr(self.client, method)(path, **kwargs)
+
+
+# ==================== SHARDING ====================
+
+class ShardedTestCase(TestCase):
+    """Runs against the configured shards; owners are pinned with ``place``"""
+    databases = '__all__'
+
+    def setUp(self):
+        if SECOND_SHARD is None:
+            self.skipTest('Set SHARD_DATABASE_URLS to run the sharding tests')
+
+    def place(self, username, alias):
+        user = User.objects.create_user(username, f'{username}@example.com', 'pw')
+        place_owner(user, alias)
+        return user
+
+
+class ShardingTests(ShardedTestCase):
+
+    def test_owner_context_routes_reads_and_writes(self):
+        user = self.place('sharded', SECOND_SHARD)
+        with owner_context(user):
+            client = Client.objects.create(owner=user, name='Acme')
+            self.assertEqual(list(Client.objects.values_list('pk', flat=True)), [client.pk])
+        self.assertTrue(Client.objects.using(SECOND_SHARD).filter(pk=client.pk).exists())
+        self.assertFalse(Client.objects.using('default').filter(pk=client.pk).exists())
+
+    def test_instance_hint_routes_without_context(self):
+        user = self.place('hinted', SECOND_SHARD)
+        router = OwnerShardRouter()
+        self.assertEqual(router.db_for_write(Task, instance=Task(owner_id=user.pk)), SECOND_SHARD)
+        self.assertEqual(router.db_for_read(OwnerShard), 'default')
+
+    def test_creates_outside_a_request_go_to_the_owners_shard(self):
+        user = self.place('creator', SECOND_SHARD)
+        other = self.place('neighbour', 'default')
+        client = Client.objects.create(owner=user, name='Acme')
+        task = Task.objects.create(owner=user, client=client)
+        self.assertEqual((client._state.db, task._state.db), (SECOND_SHARD, SECOND_SHARD))
+        with owner_context(user):
+            self.assertEqual(list(Client.objects.values_list('pk', flat=True)), [client.pk])
+
+        Worker.objects.bulk_create([Worker(owner=user, name='Sam'), Worker(owner=other, name='Kim')])
+        self.assertEqual(list(Worker.objects.using(SECOND_SHARD).values_list('name', flat=True)), ['Sam'])
+        self.assertEqual(list(Worker.objects.using('default').values_list('name', flat=True)), ['Kim'])
+
+    def test_relations_stay_on_one_shard(self):
+        user = self.place('related', SECOND_SHARD)
+        other = self.place('elsewhere', 'default')
+        client = Client.objects.create(owner=user, name='Acme')
+        # Loaded without an instance hint, but the owner's shard matches
+        self.assertEqual(Task(owner=user, client=Client.objects.using(SECOND_SHARD).get()).client_id, client.pk)
+        with self.assertRaises(ValueError):
+            Task(owner=user, client=Client.objects.create(owner=other, name='Globex'))
+
+    def test_frozen_owner_rejects_writes(self):
+        user = self.place('frozen', SECOND_SHARD)
+        OwnerShard.objects.filter(owner=user).update(is_frozen=True)
+        with owner_context(user):
+            Client.objects.count()  # reads keep working
+            with self.assertRaises(OwnerShardFrozen):
+                Client.objects.create(owner=user, name='Acme')
+
+        self.client.force_login(user)
+        response = self.client.post('/api/clients/', {'name': 'Acme'}, content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 503)
+
+    def test_reserved_id_range(self):
+        reserve_id_ranges(sender=None, using=SECOND_SHARD)
+        user = self.place('ranged', SECOND_SHARD)
+        with owner_context(user):
+            client = Client.objects.create(owner=user, name='Acme')
+        self.assertGreaterEqual(client.pk, shard_aliases().index(SECOND_SHARD) * SHARD_ID_SPAN)
+
+    def test_move_keeps_ids_and_drops_rows_deleted_on_source(self):
+        user = self.place('mover', 'default')
+        with owner_context(user):
+            client = Client.objects.create(owner=user, name='Acme')
+            worker = Worker.objects.create(owner=user, name='Sam')
+            kept = Task.objects.create(owner=user, client=client, assigned_worker=worker)
+            gone = Task.objects.create(owner=user, client=client)
+
+        def copy_then_delete(model, owner_id, source, target, since=None, **kwargs):
+            # A delete on the source after the bulk copy, caught by the final pass
+            if since is not None and model is Task:
+                Task.objects.using('default').filter(pk=gone.pk).delete()
+            return copy_rows(model, owner_id, source, target, since=since, **kwargs)
+
+        with mock.patch('core.sharding._copy_rows', side_effect=copy_then_delete):
+            move_owner(user.pk, SECOND_SHARD, grace_seconds=0)
+
+        self.assertEqual(assign_shard(user.pk).alias, SECOND_SHARD)
+        self.assertFalse(OwnerShard.objects.get(owner=user).is_frozen)
+        moved = Task.objects.using(SECOND_SHARD).get(pk=kept.pk)
+        self.assertEqual((moved.client_id, moved.assigned_worker_id), (client.pk, worker.pk))
+        self.assertFalse(Task.objects.using(SECOND_SHARD).filter(pk=gone.pk).exists())
+        self.assertFalse(Task.objects.using('default').filter(owner=user).exists())
+
+    def test_move_recounts_counters_changed_during_the_copy(self):
+        user = self.place('recount', 'default')
+        with owner_context(user):
+            client = Client.objects.create(owner=user, name='Acme')
+            task = Task.objects.create(owner=user, client=client)
+
+        def copy_then_finish(model, owner_id, source, target, since=None, **kwargs):
+            # Clients are copied before tasks, so the final pass misses the
+            # counter change (it doesn't touch the client's updated_at)
+            if since is not None and model is Task:
+                done = Task.objects.using('default').get(pk=task.pk)
+                done.status = 'DONE'
+                done.save()
+            return copy_rows(model, owner_id, source, target, since=since, **kwargs)
+
+        with mock.patch('core.sharding._copy_rows', side_effect=copy_then_finish):
+            move_owner(user.pk, SECOND_SHARD, grace_seconds=0)
+
+        moved = Client.objects.using(SECOND_SHARD).get(pk=client.pk)
+        self.assertEqual((moved.open_tasks, moved.done_tasks), (0, 1))
+
+    def test_deleting_user_removes_shard_rows(self):
+        user = self.place('leaver', SECOND_SHARD)
+        with owner_context(user):
+            Task.objects.create(owner=user, client=Client.objects.create(owner=user, name='Acme'))
+        user.delete()
+        self.assertFalse(Task.objects.using(SECOND_SHARD).filter(owner_id=user.pk).exists())
+        self.assertFalse(User.objects.using(SECOND_SHARD).filter(pk=user.pk).exists())
+
+    def test_admin_adds_to_the_owners_shard(self):
+        user = self.place('added', SECOND_SHARD)
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        response = self.client.post('/admin/core/client/add/?shard=default', {
+            'owner': user.pk, 'name': 'Acme', 'open_tasks': 0, 'blocked_tasks': 0, 'done_tasks': 0,
+            'last_activity_at_0': '2026-01-01', 'last_activity_at_1': '00:00:00',
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Client.objects.using('default').exists())
+        self.assertEqual(Client.objects.using(SECOND_SHARD).get().name, 'Acme')
+
+    def test_admin_refuses_to_move_rows_between_shards(self):
+        user = self.place('stays', SECOND_SHARD)
+        other = self.place('other', 'default')
+        client = Client.objects.create(owner=user, name='Acme')
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+        response = self.client.post(f'/admin/core/client/{client.pk}/change/?shard={SECOND_SHARD}', {
+            'owner': other.pk, 'name': 'Acme', 'open_tasks': 0, 'blocked_tasks': 0, 'done_tasks': 0,
+            'last_activity_at_0': '2026-01-01', 'last_activity_at_1': '00:00:00',
+        }, secure=True)
+        self.assertContains(response, "data is on default, not")
+        self.assertEqual(Client.objects.using(SECOND_SHARD).get().owner_id, user.pk)
+
+    def test_stub_follows_rename_and_deactivation(self):
+        user = self.place('before', SECOND_SHARD)
+        user.username, user.is_active = 'after', False
+        user.save()
+        stub = User.objects.using(SECOND_SHARD).get(pk=user.pk)
+        self.assertEqual((stub.username, stub.is_active), ('after', False))
+
+
+# ==================== CONDITIONAL GET ====================
+
+@override_settings(JSON_COMPRESSION_MIN_BYTES=200)
+class ConditionalGetTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.acme = Client.objects.create(owner=self.user, name='Acme')
+        for index in range(10):
+            Task.objects.create(owner=self.user, client=self.acme, description=f'Task {index}')
+
+    def test_validators_and_not_modified(self):
+        first = self.api('get', '/api/tasks/')
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('Last-Modified'))
+        etag = first['ETag']
+
+        again = self.api('get', '/api/tasks/', If_None_Match=etag)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], etag)
+        self.assertEqual(again['Last-Modified'], first['Last-Modified'])
+
+    def test_not_modified_keeps_encoding_validator_and_vary(self):
+        first = self.api('get', '/api/tasks/', Accept_Encoding='gzip')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertTrue(first['ETag'].endswith('-gzip"'))
+        self.assertIn('Accept-Encoding', first['Vary'])
+
+        again = self.api('get', '/api/tasks/', Accept_Encoding='gzip', If_None_Match=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], first['ETag'])
+        self.assertIn('Accept-Encoding', again['Vary'])
+
+    def test_related_change_invalidates_analytics(self):
+        etag = self.api('get', '/api/tasks/analytics/')['ETag']
+        self.assertEqual(self.api('get', '/api/tasks/analytics/', If_None_Match=etag).status_code, 304)
+
+        self.api('patch', f'/api/clients/{self.acme.pk}/', {'name': 'Acme Ltd'})
+        renamed = self.api('get', '/api/tasks/analytics/', If_None_Match=etag)
+        self.assertEqual(renamed.status_code, 200)
+        self.assertNotEqual(renamed['ETag'], etag)
+
+    def test_compression_threshold(self):
+        small = self.api('get', '/api/auth/check/', Accept_Encoding='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+        large = self.api('get', '/api/tasks/', Accept_Encoding='gzip')
+        self.assertEqual(large['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(large.content))), 10)
+
+
+# ==================== VERSIONED WRITES ====================
+
+class VersionedWriteTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.task = Task.objects.create(owner=self.user, description='Draft')
+
+    def patch(self, **headers):
+        return self.api('patch', f'/api/tasks/{self.task.pk}/', {'notes': 'edited'}, **headers)
+
+    def test_detail_etag_round_trips_as_if_match(self):
+        etag = self.api('get', f'/api/tasks/{self.task.pk}/')['ETag']
+        self.assertEqual(self.patch(If_Match=etag).status_code, 200)
+
+    def test_version_token_matches(self):
+        response = self.patch(If_Match=f'"{self.task.version}"')
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.assertEqual(response['ETag'], f'"{self.task.version}"')
+
+    def test_stale_token_conflicts_with_current_version(self):
+        stale = f'"{self.task.version}"'
+        self.patch()
+        self.task.refresh_from_db()
+        response = self.patch(If_Match=stale)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], self.task.version)
+
+    def test_missing_header_and_wildcard(self):
+        self.assertEqual(self.patch().status_code, 200)
+        self.assertEqual(self.patch(If_Match='*').status_code, 200)
+
+    def test_prefer_minimal(self):
+        response = self.patch(Prefer='return=minimal')
+        self.task.refresh_from_db()
+        self.assertEqual(response.json(), {'id': self.task.pk, 'version': self.task.version})
+        self.assertEqual(response['Preference-Applied'], 'return=minimal')
+
+
+# ==================== TASK FILTERS ====================
+
+class TaskFilterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        today = timezone.localdate()
+        self.client_row = Client.objects.create(owner=self.user, name='Acme')
+        self.worker = Worker.objects.create(owner=self.user, name='Ada')
+        self.overdue = Task.objects.create(owner=self.user, status='TODO', due_date=today - timedelta(days=3),
+                                           client=self.client_row)
+        self.blocked = Task.objects.create(owner=self.user, status='BLOCKED', due_date=today + timedelta(days=2),
+                                           assigned_worker=self.worker)
+        self.done = Task.objects.create(owner=self.user, status='DONE', due_date=today - timedelta(days=5),
+                                        client=self.client_row, assigned_worker=self.worker)
+        other = User.objects.create_user('other')
+        Task.objects.create(owner=other, status='TODO', due_date=today - timedelta(days=3))
+
+    def ids(self, query):
+        response = self.api('get', f'/api/tasks/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {task['id'] for task in response.json()}
+
+    def test_status_list_and_comma_forms(self):
+        expected = {self.overdue.pk, self.blocked.pk}
+        self.assertEqual(self.ids('status=todo&status=BLOCKED'), expected)
+        self.assertEqual(self.ids('status=TODO,BLOCKED'), expected)
+
+    def test_invalid_values_are_400(self):
+        for query in ('status=TODO,LATER', 'due_from=tomorrow', 'client=abc', 'worker=1.5'):
+            with self.subTest(query=query):
+                response = self.api('get', f'/api/tasks/?{query}')
+                self.assertEqual(response.status_code, 400)
+        self.assertIn('LATER', self.api('get', '/api/tasks/?status=LATER').json()['status'])
+
+    def test_overdue_skips_done(self):
+        self.assertEqual(self.ids('overdue=true'), {self.overdue.pk})
+
+    def test_combinations(self):
+        today = timezone.localdate()
+        self.assertEqual(self.ids(f'client={self.client_row.pk}&overdue=1'), {self.overdue.pk})
+        self.assertEqual(self.ids(f'worker={self.worker.pk}&status=DONE'), {self.done.pk})
+        self.assertEqual(self.ids(f'due_from={today - timedelta(days=4)}&due_to={today + timedelta(days=2)}'),
+                         {self.overdue.pk, self.blocked.pk})
+        self.assertEqual(self.ids(f'client={self.client_row.pk}&due_to={today - timedelta(days=4)}'), {self.done.pk})
+        self.assertEqual(self.ids('unassigned=true'), {self.overdue.pk})
+        # An explicit worker wins over unassigned
+        self.assertEqual(self.ids(f'worker={self.worker.pk}&unassigned=true'), {self.blocked.pk, self.done.pk})
+
+    def test_ordering_by_created_at(self):
+        response = self.api('get', '/api/tasks/?ordering=created_at')
+        self.assertEqual([task['id'] for task in response.json()], [self.overdue.pk, self.blocked.pk, self.done.pk])
+
+    def test_calendar_counts_per_day_and_status(self):
+        today = timezone.localdate()
+        start, end = today - timedelta(days=5), today + timedelta(days=5)
+        Task.objects.create(owner=self.user, status='TODO', due_date=today - timedelta(days=3))
+        body = self.api('get', f'/api/tasks/calendar/?from={start}&to={end}').json()
+        self.assertEqual(body['from'], start.isoformat())
+        self.assertEqual(body['days'], [
+            {'date': (today - timedelta(days=5)).isoformat(), 'total': 1, 'by_status': {'DONE': 1}},
+            {'date': (today - timedelta(days=3)).isoformat(), 'total': 2, 'by_status': {'TODO': 2}},
+            {'date': (today + timedelta(days=2)).isoformat(), 'total': 1, 'by_status': {'BLOCKED': 1}},
+        ])
+        filtered = self.api('get', f'/api/tasks/calendar/?from={start}&to={end}&status=BLOCKED').json()
+        self.assertEqual([day['total'] for day in filtered['days']], [1])
+
+    def test_calendar_range_is_validated(self):
+        today = timezone.localdate()
+        for query in ('', f'from={today}', f'from={today}&to={today - timedelta(days=1)}',
+                      f'from={today}&to={today + timedelta(days=62)}'):
+            with self.subTest(query=query):
+                self.assertEqual(self.api('get', f'/api/tasks/calendar/?{query}').status_code, 400)
+
+
+# ==================== OFFLINE SYNC ====================
+
+class OfflineSyncTests(ApiTestCase):
+    def sync(self, mutations):
+        response = self.api('post', '/api/sync/', {'mutations': mutations})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_resending_a_log_replays_without_duplicates(self):
+        log = [
+            {'key': 'k1', 'type': 'client', 'op': 'create', 'data': {'name': 'Acme'}},
+            {'key': 'k2', 'type': 'worker', 'op': 'create', 'data': {'name': 'Ada'}},
+        ]
+        first = self.sync(log)
+        self.assertEqual([result['status'] for result in first], [201, 201])
+        self.assertEqual([result['replayed'] for result in first], [False, False])
+
+        again = self.sync(log)
+        self.assertEqual([result['replayed'] for result in again], [True, True])
+        self.assertEqual([result['id'] for result in again], [result['id'] for result in first])
+        self.assertEqual(Client.objects.count(), 1)
+        self.assertEqual(Worker.objects.count(), 1)
+
+    def test_refs_resolve_to_earlier_creates(self):
+        results = self.sync([
+            {'key': 'c', 'type': 'client', 'op': 'create', 'ref': 'client-1', 'data': {'name': 'Acme'}},
+            {'key': 't', 'type': 'task', 'op': 'create', 'ref': 'task-1',
+             'data': {'description': [], 'client_id': {'ref': 'client-1'}}},
+            {'key': 'u', 'type': 'task', 'op': 'update', 'id': {'ref': 'task-1'}, 'data': {'status': 'DONE'}},
+            {'key': 'm', 'type': 'task', 'op': 'create', 'data': {'client_id': {'ref': 'missing'}}},
+        ])
+        self.assertEqual([result['status'] for result in results], [201, 201, 200, 424])
+        task = Task.objects.get(pk=results[1]['id'])
+        self.assertEqual(task.client_id, results[0]['id'])
+        self.assertEqual(task.status, 'DONE')
+
+    def test_stale_version_conflicts(self):
+        task = Task.objects.create(owner=self.user)
+        stale = task.version
+        Task.objects.get(pk=task.pk).save()
+        task.refresh_from_db()
+        results = self.sync([
+            {'key': 'v', 'type': 'task', 'op': 'update', 'id': task.pk, 'version': stale, 'data': {'status': 'DONE'}},
+        ])
+        self.assertEqual(results[0]['status'], 409)
+        self.assertEqual(results[0]['errors']['version'], task.version)
+        self.assertEqual(Task.objects.get(pk=task.pk).status, 'TODO')
+
+    def test_database_error_rejects_only_that_mutation(self):
+        apply_mutation = idempotency.apply_mutation
+
+        def fail_workers(user, mutation, refs, context):
+            if mutation['type'] == 'worker':
+                raise IntegrityError('duplicate')
+            return apply_mutation(user, mutation, refs, context)
+
+        with mock.patch('core.idempotency.apply_mutation', side_effect=fail_workers):
+            results = self.sync([
+                {'key': 'w', 'type': 'worker', 'op': 'create', 'data': {'name': 'Ada'}},
+                {'key': 'c', 'type': 'client', 'op': 'create', 'data': {'name': 'Acme'}},
+            ])
+        self.assertEqual([result['status'] for result in results], [409, 201])
+        self.assertTrue(Client.objects.exists())
+        # Failures aren't stored, so the same key can be sent again
+        self.assertEqual(self.sync([
+            {'key': 'w', 'type': 'worker', 'op': 'create', 'data': {'name': 'Ada'}},
+        ])[0]['status'], 201)
+
+    def test_related_ids_are_checked_once_per_model(self):
+        clients = [Client.objects.create(owner=self.user, name=f'c{i}') for i in range(3)]
+        worker = Worker.objects.create(owner=self.user, name='Ada')
+        foreign = Client.objects.create(owner=User.objects.create_user('eve'), name='Theirs')
+        log = [
+            {'key': f't{i}', 'type': 'task', 'op': 'create',
+             'data': {'client_id': clients[i % 3].pk, 'assigned_worker_id': worker.pk}}
+            for i in range(6)
+        ] + [
+            {'key': 'c', 'type': 'client', 'op': 'create', 'ref': 'new', 'data': {'name': 'New'}},
+            {'key': 'r', 'type': 'task', 'op': 'create', 'data': {'client_id': {'ref': 'new'}}},
+            {'key': 'x', 'type': 'task', 'op': 'create', 'data': {'client_id': foreign.pk}},
+        ]
+        with CaptureQueriesContext(connections[shard_for_owner(self.user.pk)]) as queries:
+            results = self.sync(log)
+        self.assertEqual([result['status'] for result in results], [201] * 8 + [400])
+        lookups = [q['sql'] for q in queries if q['sql'].startswith('SELECT') and
+                   ('FROM "core_client"' in q['sql'] or 'FROM "core_worker"' in q['sql'])]
+        # One preload per model, plus the fallback for the id nobody owns
+        self.assertEqual(len(lookups), 3)
+        self.assertEqual(Task.objects.filter(client=clients[0]).count(), 2)
+
+    def test_idempotency_key_header(self):
+        first = self.api('post', '/api/clients/', {'name': 'Acme'}, Idempotency_Key='h1')
+        retry = self.api('post', '/api/clients/', {'name': 'Acme'}, Idempotency_Key='h1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Client.objects.count(), 1)
+
+        reused = self.api('post', '/api/clients/', {'name': 'Other'}, Idempotency_Key='h1')
+        self.assertEqual(reused.status_code, 422)
+        self.assertEqual(Client.objects.count(), 1)
+
+
+# ==================== ADMIN ====================
+
+@override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+class AdminPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        Task.objects.bulk_create([Task(owner=self.user, status='TODO') for _ in range(12)])
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+
+    def test_filtered_count_past_limit_is_truncated(self):
+        paginator = EstimatedCountPaginator(Task.objects.filter(status='TODO').order_by('pk'), 2)
+        self.assertEqual(paginator.count, 5)
+        self.assertTrue(paginator.truncated)
+
+    def test_pages_past_limit_stay_reachable(self):
+        queryset = Task.objects.filter(status='TODO').order_by('pk')
+        paginator = EstimatedCountPaginator(queryset, 2, page_number=4)
+        self.assertEqual(paginator.num_pages, 5)
+        self.assertEqual(len(paginator.page(5).object_list), 2)
+        last = EstimatedCountPaginator(queryset, 2, page_number=6)
+        self.assertEqual(last.count, 12)
+        self.assertFalse(last.truncated)
+
+    @mock.patch.object(TaskAdmin, 'list_per_page', 2)
+    def test_changelist_shows_open_ended_count(self):
+        shard = f'&shard={shard_aliases()[-1]}' if is_sharded() else ''
+        response = self.api('get', f'/admin/core/task/?status__exact=TODO&p=4{shard}')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '10+ tasks')
+
+
+class SearchTextMigrationTests(TestCase):
+    def test_frozen_extraction_matches_model(self):
+        backfill = importlib.import_module('core.migrations.0007_task_search_text')
+        description = [
+            {'type': 'paragraph', 'content': [{'type': 'text', 'text': 'Call  BACK'}]},
+            {'type': 'bulletListItem', 'content': 'Invoice', 'children': [{'content': [{'text': 'Q3'}]}]},
+        ]
+        for value in (description, 'Legacy Text', []):
+            self.assertEqual(backfill.extract_search_text(value), Task.extract_search_text(value))
+
+
+# ==================== THROTTLING ====================
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+        'NUM_PROXIES': 1,
+    })
+
+
+class ThrottlingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def login(self, forwarded_for):
+        return self.client.post(
+            '/api/auth/login/', data={'username': 'owner', 'password': 'wrong'},
+            content_type='application/json', secure=True, HTTP_X_FORWARDED_FOR=forwarded_for,
+        )
+
+    @throttle_rates(login='2/min')
+    def test_login_is_limited_per_client_ip_behind_the_proxy(self):
+        # The proxy appends the real address; earlier entries are client-supplied
+        self.assertNotEqual(self.login('1.1.1.1, 10.0.0.1').status_code, 429)
+        self.assertNotEqual(self.login('2.2.2.2, 10.0.0.1').status_code, 429)
+        response = self.login('3.3.3.3, 10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertNotEqual(self.login('10.0.0.2').status_code, 429)
+
+    @throttle_rates(expensive='2/min')
+    def test_expensive_bucket_is_per_owner(self):
+        for _ in range(2):
+            self.assertEqual(self.api('get', '/api/tasks/analytics/').status_code, 200)
+        response = self.api('get', '/api/tasks/analytics/')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        self.client.force_login(User.objects.create_user('second'))
+        self.assertEqual(self.api('get', '/api/tasks/analytics/').status_code, 200)
+
+    def test_abstract_bucket_needs_an_identity(self):
+        with self.assertRaises(TypeError):
+            TokenBucketThrottle()
+
+
+@override_settings(ADMISSION_CONCURRENCY={'analytics': 1})
+class ConcurrencyLimitTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_full_scope_is_429(self):
+        lease = acquire_slot('analytics')
+        response = self.api('get', '/api/tasks/analytics/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        release_slot(lease)
+        self.assertEqual(self.api('get', '/api/tasks/analytics/').status_code, 200)
+
+    def test_slot_is_released_when_the_handler_raises(self):
+        with mock.patch.object(TaskViewSet, '_analytics', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError), self.assertLogs('django.request', 'ERROR'):
+                self.api('get', '/api/tasks/analytics/')
+        with mock.patch.object(TaskViewSet, '_analytics', side_effect=ValidationError('bad')):
+            self.assertEqual(self.api('get', '/api/tasks/analytics/').status_code, 400)
+        self.assertIsNotNone(acquire_slot('analytics'))
+
+    def test_release_keeps_a_slot_leased_again(self):
+        slot_key, _ = acquire_slot('analytics')
+        release_slot((slot_key, 'expired-lease'))
+        self.assertIsNone(acquire_slot('analytics'))
+
+    @skipUnless(fakeredis, 'needs fakeredis')
+    def test_redis_slots_hold_plain_tokens(self):
+        client = fakeredis.FakeRedis()
+        with mock.patch('core.throttling._redis_client', return_value=client):
+            slot_key, token = acquire_slot('analytics')
+            cache_key = cache.make_and_validate_key(slot_key)
+            self.assertEqual(client.get(cache_key), token.encode())
+            self.assertIsNone(acquire_slot('analytics'))
+            release_slot((slot_key, 'expired-lease'))
+            self.assertEqual(client.get(cache_key), token.encode())
+            release_slot((slot_key, token))
+            self.assertIsNone(client.get(cache_key))
+
+
+# ==================== DIGESTS ====================
+
+class DigestTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.ada = User.objects.create_user('ada', 'ada@example.com')
+        self.bob = User.objects.create_user('bob', 'bob@example.com')
+        if is_sharded():
+            # One sweep per shard
+            place_owner(self.ada, shard_aliases()[-1])
+            place_owner(self.bob, 'default')
+
+    def task(self, owner, text, status='TODO', days=0):
+        return Task.objects.create(
+            owner=owner, status=status,
+            description=[{'type': 'paragraph', 'content': text}],
+            due_date=None if days is None else self.today + timedelta(days=days),
+        )
+
+    def bodies(self):
+        return {message.to[0]: message.body for message in mail.outbox}
+
+    def test_sections_per_owner(self):
+        self.task(self.ada, 'Late invoice', days=-2)
+        self.task(self.ada, 'Call back', status='IN_PROGRESS')
+        self.task(self.ada, 'Waiting on parts', status='BLOCKED', days=5)
+        self.task(self.ada, 'No date yet', status='BLOCKED', days=None)
+        self.task(self.ada, 'Shipped', status='DONE', days=-1)
+        self.task(self.ada, 'Next week', days=7)
+        self.task(self.bob, 'Bob blocked', status='BLOCKED', days=-1)
+
+        run = send_digests()
+        self.assertEqual(run.tasks_scanned, 5)
+        body = self.bodies()['ada@example.com']
+        self.assertIn('1 overdue, 1 due today, 2 blocked', body)
+        overdue, due_today, blocked = (body.index(title) for title in ('Overdue -', 'Due today -', 'Blocked -'))
+        self.assertLess(overdue, body.index('Late invoice'))
+        self.assertLess(body.index('Late invoice'), due_today)
+        self.assertLess(due_today, body.index('Call back'))
+        self.assertLess(blocked, body.index('Waiting on parts'))
+        self.assertNotIn('Shipped', body)
+        self.assertNotIn('Next week', body)
+        # A blocked task is listed as blocked whatever its date
+        self.assertIn('1 blocked', self.bodies()['bob@example.com'])
+        self.assertNotIn('Overdue -', self.bodies()['bob@example.com'])
+
+    def test_watermark_lists_only_changes(self):
+        self.task(self.ada, 'Late invoice', days=-2)
+        changed = self.task(self.ada, 'Call back', status='IN_PROGRESS', days=-1)
+        send_digests()
+        self.assertEqual(len(mail.outbox), 1)
+
+        mail.outbox = []
+        send_digests()
+        self.assertEqual(mail.outbox, [])
+
+        changed.notes = 'edited'
+        changed.save()
+        send_digests()
+        body = self.bodies()['ada@example.com']
+        self.assertIn('Call back', body)
+        self.assertNotIn('Late invoice', body)
+        self.assertIn('2 overdue', body)
+
+    def test_date_rollover_relists_a_task(self):
+        self.task(self.ada, 'Call back')
+        send_digests()
+        mail.outbox = []
+        send_digests(day=self.today + timedelta(days=1))
+        body = self.bodies()['ada@example.com']
+        self.assertIn('Overdue -', body)
+        self.assertIn('Call back', body)
+
+    def test_dry_run_leaves_the_watermark(self):
+        self.task(self.ada, 'Late invoice', days=-2)
+        out = StringIO()
+        call_command('send_digests', '--dry-run', stdout=out)
+        self.assertIn('To: ada@example.com', out.getvalue())
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(DigestRun.objects.exists())
+
+        send_digests()
+        self.assertIn('Late invoice', self.bodies()['ada@example.com'])
+
+
+# ==================== PROFILING ====================
+
+@override_settings(REQUEST_PROFILING=True)
+class ProfilingTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        Client.objects.create(owner=self.user, name='Acme')
+
+    def test_only_staff_can_profile(self):
+        response = self.api('get', '/api/clients/', X_Profile='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-ID', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_staff_profile_is_saved(self):
+        self.user.is_staff = True
+        self.user.save()
+        response = self.api('get', '/api/clients/?_profile=1')
+        profile = RequestProfile.objects.get(pk=response['X-Profile-ID'])
+        self.assertEqual(profile.path, '/api/clients/?_profile=1')
+        self.assertGreater(profile.sql_count, 0)
+        fields = {row['field']: row for row in profile.serializer_fields}
+        self.assertEqual(fields['ClientWithCountersSerializer.name']['calls'], 1)
+        # DRF's classes are never patched, so unprofiled requests pay nothing
+        self.assertEqual(Serializer.to_representation.__module__, 'rest_framework.serializers')
+        # Requests without the switch are not timed
+        self.assertNotIn('X-Profile-ID', self.api('get', '/api/clients/'))
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_nested_serializer_fields_are_timed(self):
+        self.user.is_staff = True
+        self.user.save()
+        Task.objects.create(owner=self.user, client=Client.objects.get())
+        response = self.api('get', '/api/tasks/', X_Profile='1')
+        fields = {row['field'] for row in RequestProfile.objects.get(pk=response['X-Profile-ID']).serializer_fields}
+        self.assertLessEqual({'TaskSerializer.client', 'ClientSerializer.name'}, fields)
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        self.user.is_staff = True
+        self.user.save()
+        ids = [int(self.api('get', '/api/clients/', X_Profile='1')['X-Profile-ID']) for _ in range(3)]
+        self.assertEqual(set(RequestProfile.objects.values_list('pk', flat=True)), set(ids[1:]))
+
+    def test_switch_interval_is_left_alone_by_default(self):
+        self.user.is_staff = True
+        self.user.save()
+        interval = sys.getswitchinterval()
+        with mock.patch('core.profiling.sys.setswitchinterval') as set_interval:
+            self.api('get', '/api/clients/', X_Profile='1')
+        set_interval.assert_not_called()
+        self.assertEqual(sys.getswitchinterval(), interval)
+
+
+# ==================== COUNTERS ====================
+
+class CountersTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'pw')
+        if is_sharded():
+            place_owner(self.user, shard_aliases()[-1])
+        self.enterContext(owner_context(self.user))
+        self.acme = Client.objects.create(owner=self.user, name='Acme')
+        self.globex = Client.objects.create(owner=self.user, name='Globex')
+        self.sam = Worker.objects.create(owner=self.user, name='Sam')
+
+    def counts(self, obj):
+        obj.refresh_from_db()
+        return obj.open_tasks, obj.blocked_tasks, obj.done_tasks
+
+    def test_create_counts_client_and_worker(self):
+        Task.objects.create(owner=self.user, client=self.acme, assigned_worker=self.sam)
+        Task.objects.create(owner=self.user, client=self.acme, status='BLOCKED')
+        self.assertEqual(self.counts(self.acme), (1, 1, 0))
+        self.assertEqual(self.counts(self.sam), (1, 0, 0))
+        self.assertIsNotNone(self.acme.last_activity_at)
+
+    def test_status_change_moves_the_count(self):
+        task = Task.objects.create(owner=self.user, client=self.acme, assigned_worker=self.sam)
+        task.status = 'DONE'
+        task.save()
+        self.assertEqual(self.counts(self.acme), (0, 0, 1))
+        self.assertEqual(self.counts(self.sam), (0, 0, 1))
+
+    def test_reassignment_moves_the_count(self):
+        task = Task.objects.create(owner=self.user, client=self.acme, assigned_worker=self.sam)
+        task.client, task.assigned_worker = self.globex, None
+        task.save()
+        self.assertEqual(self.counts(self.acme), (0, 0, 0))
+        self.assertEqual(self.counts(self.globex), (1, 0, 0))
+        self.assertEqual(self.counts(self.sam), (0, 0, 0))
+
+    def test_delete_removes_the_count(self):
+        task = Task.objects.create(owner=self.user, client=self.acme, status='BLOCKED')
+        # A stale copy still removes the state as loaded
+        Task.objects.get(pk=task.pk).delete()
+        self.assertEqual(self.counts(self.acme), (0, 0, 0))
+
+    def test_reconcile_repairs_drift(self):
+        task = Task.objects.create(owner=self.user, client=self.acme, assigned_worker=self.sam)
+        Task.objects.filter(pk=task.pk).update(status='BLOCKED')  # skips signals
+        self.assertEqual(self.counts(self.acme), (1, 0, 0))
+
+        out = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=out)
+        self.assertIn('drifted 1', out.getvalue())
+        self.assertEqual(self.counts(self.acme), (1, 0, 0))
+
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(self.counts(self.acme), (0, 1, 0))
+        self.assertEqual(self.counts(self.sam), (0, 1, 0))
+
+    def test_reconcile_changes_the_list_etag(self):
+        task = Task.objects.create(owner=self.user, client=self.acme)
+        Task.objects.filter(pk=task.pk).update(status='DONE')
+        self.client.force_login(self.user)
+        with self.assertLogs('core.request', 'INFO'):
+            etag = self.client.get('/api/clients/', secure=True)['ETag']
+            call_command('reconcile_counters', '--dry-run', stdout=StringIO())
+            self.assertEqual(self.client.get('/api/clients/', secure=True, headers={'If-None-Match': etag}).status_code, 304)
+            call_command('reconcile_counters', stdout=StringIO())
+            response = self.client.get('/api/clients/', secure=True, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        done = {client['name']: client['done_tasks'] for client in response.json()}
+        self.assertEqual(done, {'Acme': 1, 'Globex': 0})
+
+
+class AdminCounterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.acme = Client.objects.create(owner=self.user, name='Acme')
+        # The shard filter only exists when sharded
+        self.query = f'?shard={shard_for_owner(self.user.pk)}' if is_sharded() else ''
+        self.client.force_login(User.objects.create_superuser('staff', 'staff@example.com', 'pw'))
+
+    def test_admin_deletes_count_the_stored_state(self):
+        first = Task.objects.create(owner=self.user, client=self.acme)
+        second = Task.objects.create(owner=self.user, client=self.acme)
+        third = Task.objects.create(owner=self.user, client=self.acme, status='BLOCKED')
+
+        response = self.client.post(
+            f'/admin/core/task/{first.pk}/delete/{self.query}', {'post': 'yes'}, secure=True,
+        )
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(f'/admin/core/task/{self.query}', {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [second.pk, third.pk],
+        }, secure=True)
+        self.assertEqual(response.status_code, 302)
+
+        self.assertFalse(Task.objects.filter(owner=self.user).exists())
+        self.acme.refresh_from_db()
+        self.assertEqual((self.acme.open_tasks, self.acme.blocked_tasks), (0, 0))
+
+
+# ==================== RECURRING TASKS ====================
+
+class RecurrenceRuleTests(SimpleTestCase):
+    def dates(self, rule, start, first, last):
+        return list(occurrences(parse_rule(rule), start, first, last))
+
+    def test_parse_rule(self):
+        rule = parse_rule('RRULE:freq=monthly;INTERVAL=2;BYDAY=1MO,-1FR;COUNT=5')
+        self.assertEqual((rule.freq, rule.interval, rule.byday, rule.count), ('MONTHLY', 2, ((1, 0), (-1, 4)), 5))
+        self.assertEqual(parse_rule('FREQ=WEEKLY;UNTIL=20260131T000000Z').until, date(2026, 1, 31))
+
+    def test_invalid_rules_are_rejected(self):
+        for text in (
+            '', 'FREQ=HOURLY', 'FREQ=DAILY;INTERVAL=0', 'FREQ=WEEKLY;BYDAY=1MO', 'FREQ=MONTHLY;BYDAY=6MO',
+            'FREQ=MONTHLY;BYMONTHDAY=32', 'FREQ=WEEKLY;BYMONTHDAY=1', 'FREQ=YEARLY;BYDAY=MO',
+            'FREQ=DAILY;COUNT=2;UNTIL=20260101', 'FREQ=DAILY;BYSETPOS=1', 'FREQ=DAILY;UNTIL=soon',
+        ):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                parse_rule(text)
+
+    def test_weekday_ordinals(self):
+        self.assertEqual(
+            self.dates('FREQ=MONTHLY;BYDAY=1MO,-1FR', date(2026, 1, 1), date(2026, 1, 1), date(2026, 3, 31)),
+            [date(2026, 1, 5), date(2026, 1, 30), date(2026, 2, 2), date(2026, 2, 27), date(2026, 3, 2), date(2026, 3, 27)],
+        )
+
+    def test_month_days(self):
+        start, end = date(2026, 1, 1), date(2026, 6, 30)
+        # Months without a 31st are skipped; -1 is always the last day
+        self.assertEqual(
+            self.dates('FREQ=MONTHLY;BYMONTHDAY=31', start, start, end),
+            [date(2026, 1, 31), date(2026, 3, 31), date(2026, 5, 31)],
+        )
+        self.assertEqual(
+            self.dates('FREQ=MONTHLY;BYMONTHDAY=-1', start, start, date(2026, 3, 31)),
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)],
+        )
+
+    def test_count_and_until(self):
+        start = date(2026, 1, 1)
+        # COUNT counts from the start, not from the window
+        self.assertEqual(
+            self.dates('FREQ=DAILY;COUNT=3', start, date(2026, 1, 2), date(2026, 12, 31)),
+            [date(2026, 1, 2), date(2026, 1, 3)],
+        )
+        self.assertEqual(
+            self.dates('FREQ=WEEKLY;BYDAY=MO;UNTIL=20260119', start, start, date(2026, 12, 31)),
+            [date(2026, 1, 5), date(2026, 1, 12), date(2026, 1, 19)],
+        )
+
+    def test_interval_keeps_its_phase_when_skipping_ahead(self):
+        self.assertEqual(
+            self.dates('FREQ=WEEKLY;INTERVAL=2', date(2026, 1, 1), date(2026, 1, 10), date(2026, 1, 31)),
+            [date(2026, 1, 15), date(2026, 1, 29)],
+        )
+
+
+@override_settings(RECURRENCE_WINDOW_DAYS=6)
+class RecurringTaskTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.today = timezone.localdate()
+        self.acme = Client.objects.create(owner=self.user, name='Acme')
+        response = self.api('post', '/api/recurring-tasks/', {
+            'rule': 'FREQ=DAILY', 'starts_on': self.today.isoformat(), 'client_id': self.acme.pk,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.recurring = RecurringTask.objects.get(pk=response.json()['id'])
+
+    def occurrences(self, **filters):
+        return Task.objects.filter(recurrence=self.recurring, **filters)
+
+    def test_saving_a_rule_fills_the_window(self):
+        self.assertEqual(self.occurrences().count(), 7)
+        self.recurring.refresh_from_db()
+        self.assertEqual(self.recurring.materialized_through, self.today + timedelta(days=6))
+        self.acme.refresh_from_db()
+        self.assertEqual(self.acme.open_tasks, 7)
+
+    def test_rerun_creates_nothing_twice(self):
+        self.assertEqual(Materializer().run().tasks_created, 0)
+        # A lost watermark is covered by the existing occurrences
+        RecurringTask.objects.filter(pk=self.recurring.pk).update(materialized_through=None)
+        materializer = Materializer().run()
+        self.assertEqual((materializer.rules_scanned, materializer.tasks_created), (1, 0))
+        self.assertEqual(self.occurrences().count(), 7)
+        self.acme.refresh_from_db()
+        self.assertEqual(self.acme.open_tasks, 7)
+
+    def test_later_run_extends_the_window(self):
+        materializer = Materializer(today=self.today + timedelta(days=2)).run()
+        self.assertEqual(materializer.tasks_created, 2)
+        self.acme.refresh_from_db()
+        self.assertEqual(self.acme.open_tasks, 9)
+
+    def test_schedule_change_replaces_pending_occurrences(self):
+        started = self.occurrences(due_date=self.today + timedelta(days=1)).get()
+        started.status = 'IN_PROGRESS'
+        started.save()
+
+        response = self.api('patch', f'/api/recurring-tasks/{self.recurring.pk}/', {'rule': 'FREQ=DAILY;INTERVAL=3'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(self.occurrences().values_list('due_date', 'status')),
+            [(self.today, 'TODO'), (self.today + timedelta(days=1), 'IN_PROGRESS'),
+             (self.today + timedelta(days=3), 'TODO'), (self.today + timedelta(days=6), 'TODO')],
+        )
+        self.acme.refresh_from_db()
+        self.assertEqual(self.acme.open_tasks, 4)
+
+    def test_pause_and_delete_remove_pending_occurrences(self):
+        done = self.occurrences(due_date=self.today).get()
+        done.status = 'DONE'
+        done.save()
+
+        response = self.api('patch', f'/api/recurring-tasks/{self.recurring.pk}/', {'is_active': False})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(self.occurrences().values_list('pk', flat=True)), [done.pk])
+        self.assertEqual(Materializer().run().tasks_created, 0)
+
+        self.api('patch', f'/api/recurring-tasks/{self.recurring.pk}/', {'is_active': True})
+        self.assertEqual(self.occurrences(status='TODO').count(), 6)
+        self.assertEqual(self.api('delete', f'/api/recurring-tasks/{self.recurring.pk}/').status_code, 204)
+        # The finished occurrence stays, detached from the rule
+        done.refresh_from_db()
+        self.assertIsNone(done.recurrence_id)
+        self.assertFalse(Task.objects.filter(owner=self.user, status='TODO').exists())
+        self.acme.refresh_from_db()
+        self.assertEqual((self.acme.open_tasks, self.acme.done_tasks), (0, 1))
+
+
+# ==================== LOGGING ====================
+
+class BackgroundJsonHandlerTests(SimpleTestCase):
+    def handler(self, **kwargs):
+        stream = StringIO()
+        handler = BackgroundJsonHandler(stream=stream, **{'flush_interval': 0.01, **kwargs})
+        self.addCleanup(handler.close)
+        return handler, stream
+
+    def record(self, message='hello %s', args=('world',), level=logging.INFO, **extra):
+        return logging.makeLogRecord({
+            'name': 'core.test', 'levelno': level, 'levelname': logging.getLevelName(level),
+            'msg': message, 'args': args, **extra,
+        })
+
+    def test_writes_json_lines_from_a_lazily_started_thread(self):
+        handler, stream = self.handler()
+        self.assertIsNone(handler.writer)
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            handler.handle(self.record(exc_info=sys.exc_info(), route='api/tasks/'))
+        handler.join()
+        line = json.loads(stream.getvalue())
+        self.assertEqual((line['message'], line['route'], line['level']), ('hello world', 'api/tasks/', 'INFO'))
+        self.assertIn('ValueError: boom', line['exception'])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler, stream = self.handler(queue_size=1, flush_interval=60)
+        for _ in range(3):
+            handler.handle(self.record())
+        self.assertEqual(handler.dropped, 2)
+        handler.close()  # drains what was queued
+        self.assertEqual(len(stream.getvalue().splitlines()), 1)
+
+    def test_forked_child_starts_its_own_writer(self):
+        handler, stream = self.handler()
+        handler.handle(self.record())
+        handler.join()
+        parent = handler.writer
+        # Without a real fork the parent's writer keeps running here
+        self.addCleanup(handler._stop.set)
+        with mock.patch('core.logs.os.getpid', return_value=-1):
+            handler.handle(self.record('child %s'))
+            self.assertIsNot(handler.writer, parent)
+            handler.close()
+        self.assertEqual(json.loads(stream.getvalue().splitlines()[-1])['message'], 'child world')
+
+
+class SamplingFilterTests(SimpleTestCase):
+    def record(self, name, level=logging.DEBUG):
+        return logging.makeLogRecord({'name': name, 'levelno': level})
+
+    def test_rates_apply_to_children_and_spare_warnings(self):
+        sampling = SamplingFilter({'django.db': 0.25})
+        self.assertEqual(sampling.rate_for('django.db.backends'), 0.25)
+        self.assertEqual(sampling.rate_for('core'), 1.0)
+        with mock.patch('core.logs.random.random', return_value=0.5):
+            self.assertFalse(sampling.filter(self.record('django.db.backends')))
+            self.assertTrue(sampling.filter(self.record('django.db.backends', logging.WARNING)))
+            self.assertTrue(sampling.filter(self.record('core')))
+        with mock.patch('core.logs.random.random', return_value=0.1):
+            kept = self.record('django.db.backends')
+            self.assertTrue(sampling.filter(kept))
+            self.assertEqual(kept.sample_rate, 0.25)
+
+
+class RequestLogMiddlewareTests(TestCase):
+    def setUp(self):
+        self.stream = StringIO()
+        handler = BackgroundJsonHandler(stream=self.stream, flush_interval=0.01)
+        handler.addFilter(RequestContextFilter())
+        request_logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        self.addCleanup(request_logger.removeHandler, handler)
+        self.handler = handler
+
+    def access_line(self, **headers):
+        response = self.client.get('/api/auth/csrf/', secure=True, headers=headers)
+        self.handler.join()
+        return response, json.loads(self.stream.getvalue().splitlines()[-1])
+
+    def test_access_line_carries_the_request_context(self):
+        response, line = self.access_line(X_Request_ID='render-1f2e.3')
+        self.assertEqual(response['X-Request-ID'], 'render-1f2e.3')
+        self.assertEqual(line['request_id'], 'render-1f2e.3')
+        self.assertEqual((line['method'], line['status'], line['route']), ('GET', 200, 'api/auth/csrf/'))
+        self.assertIn('duration_ms', line)
+
+    def test_untrusted_request_ids_are_replaced(self):
+        for value in ('x' * 65, 'id with spaces', '{"json": 1}'):
+            with self.subTest(value=value):
+                response, line = self.access_line(X_Request_ID=value)
+                self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+                self.assertEqual(line['request_id'], response['X-Request-ID'])
+
+
+# ==================== LOAD TEST ====================
+
+class LoadTestHelperTests(SimpleTestCase):
+    def test_percentile_uses_the_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 0.50), 50)
+        self.assertEqual(loadtest.percentile(values, 0.95), 95)
+        self.assertEqual(loadtest.percentile(values, 1.0), 100)
+        self.assertEqual(loadtest.percentile([7], 0.99), 7)
+        self.assertEqual(loadtest.percentile([1, 2, 3], 0), 1)
+        self.assertIsNone(loadtest.percentile([], 0.5))
+
+    def test_recorder_counts_unexpected_statuses_and_connection_errors(self):
+        recorder = loadtest.Recorder()
+        recorder.record('GET tasks/', 0.010, 200, 100)
+        recorder.record('GET tasks/', 0.020, 304, 0)
+        recorder.record('PATCH tasks/<id>/', 0.030, 409, 20, expected=(409,))
+        recorder.record('PATCH tasks/<id>/', 0.040, 500, 10)
+        recorder.record('PATCH tasks/<id>/', 0.050, None, 0)
+        self.assertEqual(recorder.counts(), (5, 2))
+        entry = recorder.endpoints['PATCH tasks/<id>/']
+        self.assertEqual(entry['errors'], 2)
+        self.assertEqual(entry['bytes'], 30)
+        self.assertEqual(entry['statuses'], {409: 1, 500: 1, 'connection error': 1})
+
+    def test_summarize_reports_latency_throughput_and_errors(self):
+        recorder = loadtest.Recorder()
+        for ms in range(1, 101):
+            recorder.record('GET clients/', ms / 1000, 200 if ms <= 98 else 503, 10)
+        summary = loadtest.summarize(recorder, duration=10)
+        self.assertEqual(summary['GET clients/'], {
+            'requests': 100, 'throughput': 10.0,
+            'p50_ms': 50.0, 'p95_ms': 95.0, 'p99_ms': 99.0, 'max_ms': 100.0,
+            'errors': 2, 'error_rate': 0.02,
+            'statuses': {'200': 98, '503': 2}, 'bytes': 1000,
+        })
+        self.assertIsNone(loadtest.summarize(recorder, duration=0)['GET clients/']['throughput'])
+
+    def test_parse_mix(self):
+        self.assertEqual(loadtest.parse_mix('dashboard=6, task_edit=1.5,export'),
+                         {'dashboard': 6.0, 'task_edit': 1.5, 'export': 1.0})
+        with self.assertRaisesMessage(ValueError, "Unknown action 'checkout'"):
+            loadtest.parse_mix('dashboard=1,checkout=2')
+        with self.assertRaisesMessage(ValueError, 'positive weight'):
+            loadtest.parse_mix('dashboard=0,filter=0')
+
+
+# ==================== WARM-UP ====================
+
+class WarmUpTests(TestCase):
+    databases = '__all__'
+
+    def gunicorn_hooks(self, preload='True'):
+        with mock.patch.dict('os.environ', GUNICORN_PRELOAD=preload):
+            return runpy.run_path(str(settings.BASE_DIR / 'gunicorn.conf.py'))
+
+    def test_warm_up_serves_a_request_and_connects_every_database(self):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        with self.assertLogs('core', 'INFO'):
+            timings = warm_up(WSGIHandler())
+        self.assertEqual(timings['status'], '200 OK')
+        self.assertIn('connect_ms', timings)
+        for alias in connections:
+            self.assertIsNotNone(connections[alias].connection, alias)
+
+    def test_master_closes_connections_after_warming_up(self):
+        from django.core.handlers.wsgi import WSGIHandler
+
+        calls = []
+        server = mock.Mock()
+        server.app.wsgi.return_value = WSGIHandler()
+        with mock.patch('core.warmup.warm_up', side_effect=lambda *a, **kw: calls.append(('warm_up', kw))), \
+                mock.patch.object(connections, 'close_all', side_effect=lambda: calls.append(('close_all', {}))):
+            self.gunicorn_hooks()['when_ready'](server)
+        # Nothing is opened in the master, and nothing it did open survives the fork
+        self.assertEqual(calls, [('warm_up', {'connect': False}), ('close_all', {})])
+
+    def test_workers_open_their_own_connections(self):
+        worker = mock.Mock()
+        with mock.patch('core.warmup.open_connections') as open_connections, \
+                mock.patch('core.warmup.warm_up') as warm:
+            self.gunicorn_hooks()['post_worker_init'](worker)
+            open_connections.assert_called_once_with()
+            warm.assert_not_called()
+            self.gunicorn_hooks(preload='False')['post_worker_init'](worker)
+            warm.assert_called_once_with(worker.wsgi)
+
+    def test_load_test_server_uses_the_gunicorn_config(self):
+        with mock.patch('importlib.util.find_spec', return_value=True), \
+                mock.patch('subprocess.Popen') as popen:
+            process = loadtest.start_server(8123, 2)
+        command = popen.call_args.args[0]
+        self.assertEqual(command[command.index('-c') + 1], 'gunicorn.conf.py')
+        self.assertEqual(popen.call_args.kwargs['cwd'], settings.BASE_DIR)
+        self.assertIs(process, popen.return_value)
@@ -0,0 +1,220 @@
+"""
+Admission control for the expensive paths.
+
+- Token buckets: per client IP for the anonymous auth endpoints (``login``
+  runs a full PBKDF2 hash per attempt) and per owner for heavy reads. A bucket
+  of ``N/period`` holds N tokens and refills N per period, so bursts up to N
+  pass and the sustained rate is capped. Buckets are stored as a GCRA
+  "theoretical arrival time", one number per key.
+- Concurrency caps: at most ``ADMISSION_CONCURRENCY[scope]`` requests of a
+  heavy action run at once across all workers. Slots are leased cache keys,
+  so a crashed worker only holds its slot until the lease expires.
+
+State lives in the default cache. That is Redis when ``REDIS_URL`` is set, so
+every worker shares the budgets, and the bucket update runs as one Lua script.
+No decision touches the database. Rejections raise ``Throttled``, i.e. ``429``
+with ``Retry-After``.
+"""
+
+import math
+import threading
+from abc import ABCMeta, abstractmethod
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import Throttled
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# KEYS[1]: bucket; ARGV: now, seconds per token, capacity. Returns the wait in
+# seconds as a string (Lua numbers would be truncated to integers).
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - capacity * interval
+if now < allow_at then
+    return tostring(allow_at - now)
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return '0'
+"""
+
+# KEYS[1]: slot; ARGV[1]: the lease token. Deletes the slot only while it
+# still holds that token.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_local_lock = threading.Lock()
+
+
+def parse_rate(rate):
+    """``'10/min'`` -> (10, 60)"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0]]
+
+
+def _redis_client(key):
+    """The raw redis client behind Django's RedisCache, else None"""
+    backend = getattr(cache, '_cache', None)
+    if backend is None or not hasattr(backend, 'get_client'):
+        return None
+    return backend.get_client(key, write=True)
+
+
+def take_token(key, capacity, period):
+    """Take one token from bucket ``key``; returns 0 or the seconds to wait"""
+    interval = period / capacity
+    now = time.time()
+    cache_key = cache.make_and_validate_key(key)
+    client = _redis_client(cache_key)
+    if client is not None:
+        return float(client.eval(GCRA_SCRIPT, 1, cache_key, now, interval, capacity))
+
+    # Other backends: atomic within a process; across processes a burst may
+    # slightly overshoot, which is why production uses Redis
+    with _local_lock:
+        tat = max(cache.get(key) or now, now)
+        new_tat = tat + interval
+        allow_at = new_tat - capacity * interval
+        if now < allow_at:
+            return allow_at - now
+        cache.set(key, new_tat, timeout=math.ceil(new_tat - now))
+        return 0
+
+
+# ==================== THROTTLES ====================
+
+class TokenBucketThrottle(BaseThrottle, metaclass=ABCMeta):
+    """
+    Rate from ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'][scope]``; subclasses
+    say whose bucket a request draws from
+    """
+    scope = None
+
+    @abstractmethod
+    def get_ident_key(self, request):
+        """Bucket identity for this request"""
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        if not rate:
+            return True
+        capacity, period = parse_rate(rate)
+        self.retry_after = take_token(
+            f'throttle:{self.scope}:{self.get_ident_key(request)}', capacity, period
+        )
+        return self.retry_after == 0
+
+    def wait(self):
+        return self.retry_after
+
+
+class ClientIPThrottle(TokenBucketThrottle):
+    """Per client address (``NUM_PROXIES`` decides which X-Forwarded-For entry)"""
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+class LoginThrottle(ClientIPThrottle):
+    scope = 'login'
+
+
+class CsrfThrottle(ClientIPThrottle):
+    scope = 'csrf'
+
+
+class OwnerThrottle(TokenBucketThrottle):
+    """Per owner; the user is already loaded by authentication"""
+    scope = 'expensive'
+
+    def get_ident_key(self, request):
+        user = request.user
+        return f'user:{user.pk}' if user.is_authenticated else f'ip:{self.get_ident(request)}'
+
+
+# ==================== CONCURRENCY ====================
+
+def acquire_slot(scope):
+    """
+    Lease one of the scope's slots. Returns (slot_key, token) or None when
+    every slot is taken. On Redis the token is stored as a plain string with
+    ``SET NX`` so ``release_slot`` can compare it in Lua; ``cache.add`` is
+    atomic on the other backends.
+    """
+    limit = settings.ADMISSION_CONCURRENCY.get(scope)
+    if not limit:
+        return 'unlimited', None
+    token = uuid.uuid4().hex
+    for index in range(limit):
+        slot_key = f'admission:{scope}:{index}'
+        cache_key = cache.make_and_validate_key(slot_key)
+        client = _redis_client(cache_key)
+        if client is not None:
+            leased = client.set(cache_key, token, nx=True, ex=settings.ADMISSION_LEASE_SECONDS)
+        else:
+            leased = cache.add(slot_key, token, timeout=settings.ADMISSION_LEASE_SECONDS)
+        if leased:
+            return slot_key, token
+    return None
+
+
+def release_slot(lease):
+    """
+    Free a leased slot, unless it expired and was leased again meanwhile. The
+    compare and delete is one Lua call on Redis.
+    """
+    slot_key, token = lease
+    if token is None:
+        return
+    cache_key = cache.make_and_validate_key(slot_key)
+    client = _redis_client(cache_key)
+    if client is not None:
+        client.eval(RELEASE_SCRIPT, 1, cache_key, token)
+        return
+    with _local_lock:
+        if cache.get(slot_key) == token:
+            cache.delete(slot_key)
+
+
+class ConcurrencyLimitMixin:
+    """
+    For views and viewset actions with a ``concurrency_scope``, e.g.
+    ``@action(..., concurrency_scope='analytics')``. The slot is taken after
+    authentication, permissions and throttles pass, and released when
+    dispatch returns, including when the handler raises an exception that
+    DRF does not turn into a response.
+    """
+    concurrency_scope = None
+    concurrency_retry_after = 1
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.concurrency_scope:
+            self._admission_lease = acquire_slot(self.concurrency_scope)
+            if self._admission_lease is None:
+                raise Throttled(
+                    wait=self.concurrency_retry_after,
+                    detail='Too many of these requests are running. Try again shortly.'
+                )
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            lease = getattr(self, '_admission_lease', None)
+            if lease is not None:
+                release_slot(lease)
+                self._admission_lease = None
@@ -1,8 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    ClientViewSet, WorkerViewSet, TaskViewSet,
-    user_login, user_logout, check_auth, get_csrf_token,
+    ClientViewSet, WorkerViewSet, TaskViewSet, RecurringTaskViewSet,
+    SyncView, user_login, user_logout, check_auth, get_csrf_token,
     #create_initial_admin
 )
 
@@ -10,6 +10,7 @@ router = DefaultRouter()
 router.register(r'clients', ClientViewSet, basename='client')
 router.register(r'workers', WorkerViewSet, basename='worker')
 router.register(r'tasks', TaskViewSet, basename='task')
+router.register(r'recurring-tasks', RecurringTaskViewSet, basename='recurring-task')
 
 urlpatterns = [
     # Authentication endpoints
@@ -21,6 +22,9 @@ urlpatterns = [
     # Development endpoint (remove in production)
 #    path('auth/create-admin/', create_initial_admin, name='create_admin'),
     
+    # Offline writes queued by the PWA, replayed on reconnect
+    path('sync/', SyncView.as_view(), name='sync'),
+
     # API routes
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,24 +1,41 @@
+from collections import defaultdict
 from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import api_view, permission_classes, action
+from rest_framework.decorators import api_view, permission_classes, throttle_classes, action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
 from django.middleware.csrf import get_token
 from django.http import JsonResponse
-from .models import Client, Worker, Task
-from .serializers import ClientSerializer, WorkerSerializer, TaskSerializer, UserSerializer
+from django.db.models import Count
+from .models import Client, Worker, Task, RecurringTask
+from .serializers import (
+    ClientWithCountersSerializer, WorkerWithCountersSerializer, TaskSerializer,
+    RecurringTaskSerializer, UserSerializer,
+)
+from .caching import ConditionalGetMixin
+from .concurrency import VersionedWriteMixin
+from .filters import CounterFilterBackend, TaskFilterBackend, parse_date_param
+from .idempotency import IdempotentCreateMixin, replay, validate_log
+from .profiling import ProfiledSerializerMixin
+from .recurrence import Materializer, clear_upcoming
+from .throttling import ConcurrencyLimitMixin, CsrfThrottle, LoginThrottle, OwnerThrottle
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@throttle_classes([CsrfThrottle])
 def get_csrf_token(request):
     """Get CSRF token for the session"""
     return Response({'csrfToken': get_token(request)})
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginThrottle])  # before authenticate() pays for a password hash
 def user_login(request):
     """Handle user login"""
     username = request.data.get('username')
@@ -75,9 +92,14 @@ def check_auth(request):
 
 # ==================== USER-AWARE VIEWSETS ====================
 
-class ClientViewSet(viewsets.ModelViewSet):
-    serializer_class = ClientSerializer
+# ?ordering= values for clients and workers; the counters are indexed per owner
+COUNTER_ORDERING_FIELDS = ['name', 'created_at', 'open_tasks', 'blocked_tasks', 'done_tasks', 'last_activity_at']
+
+class ClientViewSet(ProfiledSerializerMixin, ConditionalGetMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
+    serializer_class = ClientWithCountersSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [CounterFilterBackend, OrderingFilter]
+    ordering_fields = COUNTER_ORDERING_FIELDS
     
     def get_queryset(self):
         # Return only clients belonging to the current user
@@ -87,9 +109,11 @@ class ClientViewSet(viewsets.ModelViewSet):
         # Automatically assign the current user as owner
         serializer.save(owner=self.request.user)
 
-class WorkerViewSet(viewsets.ModelViewSet):
-    serializer_class = WorkerSerializer
+class WorkerViewSet(ProfiledSerializerMixin, ConditionalGetMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
+    serializer_class = WorkerWithCountersSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [CounterFilterBackend, OrderingFilter]
+    ordering_fields = COUNTER_ORDERING_FIELDS
     
     def get_queryset(self):
         # Return only workers belonging to the current user
@@ -99,9 +123,14 @@ class WorkerViewSet(viewsets.ModelViewSet):
         # Automatically assign the current user as owner
         serializer.save(owner=self.request.user)
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ProfiledSerializerMixin, ConditionalGetMixin, IdempotentCreateMixin, VersionedWriteMixin, ConcurrencyLimitMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
+    filter_backends = [TaskFilterBackend, OrderingFilter]
+    # Whitelisted ?ordering= values; each leads an owner-scoped index
+    ordering_fields = ['updated_at', 'due_date', 'created_at', 'status']
+    ordering = ['-updated_at']
+    calendar_max_days = 62
     
     def get_queryset(self):
         """
@@ -126,9 +155,49 @@ class TaskViewSet(viewsets.ModelViewSet):
         context['user'] = self.request.user
         return context
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], throttle_classes=[OwnerThrottle], concurrency_scope='calendar')
+    def calendar(self, request):
+        """Per-day task counts by status for ?from=&to= (one grouped query)"""
+        start = parse_date_param(request.query_params, 'from')
+        end = parse_date_param(request.query_params, 'to')
+        if not start or not end:
+            raise ValidationError({'detail': 'from and to are required (YYYY-MM-DD).'})
+        if end < start or (end - start).days >= self.calendar_max_days:
+            raise ValidationError({'detail': f'Range must be 1 to {self.calendar_max_days} days.'})
+
+        queryset = self.filter_queryset(self.get_queryset())\
+            .filter(due_date__gte=start, due_date__lte=end)\
+            .order_by()
+        return self.conditional_response(
+            request,
+            lambda: self._calendar(queryset, start, end),
+            queryset
+        )
+
+    def _calendar(self, queryset, start, end):
+        days = defaultdict(lambda: {'total': 0, 'by_status': {}})
+        rows = queryset.values('due_date', 'status').annotate(count=Count('id'))
+        for row in rows:
+            day = days[row['due_date'].isoformat()]
+            day['total'] += row['count']
+            day['by_status'][row['status']] = row['count']
+
+        return Response({
+            'from': start.isoformat(),
+            'to': end.isoformat(),
+            'days': [{'date': date, **days[date]} for date in sorted(days)],
+        })
+
+    @action(detail=False, methods=['get'], throttle_classes=[OwnerThrottle], concurrency_scope='analytics')
     def analytics(self, request):
         """Analytics endpoint for the current user"""
+        return self.conditional_response(
+            request,
+            lambda: self._analytics(request),
+            Task.objects.filter(owner=request.user)
+        )
+
+    def _analytics(self, request):
         user = request.user
         
         # Get counts
@@ -157,6 +226,55 @@ class TaskViewSet(viewsets.ModelViewSet):
             'user': UserSerializer(user).data
         })
 
+class RecurringTaskViewSet(ProfiledSerializerMixin, IdempotentCreateMixin, viewsets.ModelViewSet):
+    """
+    Recurring task rules. Occurrences in the look-ahead window are created as
+    soon as a rule is saved; the nightly materializer extends them.
+    """
+    serializer_class = RecurringTaskSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return RecurringTask.objects.filter(owner=self.request.user)\
+            .select_related('client', 'assigned_worker')\
+            .order_by('-created_at')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['user'] = self.request.user
+        return context
+
+    def perform_create(self, serializer):
+        recurring = serializer.save(owner=self.request.user)
+        Materializer().materialize(recurring._state.db, [recurring])
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        schedule = (instance.rule, instance.starts_on, instance.is_active)
+        recurring = serializer.save()
+        # Upcoming occurrences that nobody started follow a new schedule;
+        # template edits apply to occurrences created from now on
+        if (recurring.rule, recurring.starts_on, recurring.is_active) != schedule:
+            clear_upcoming(recurring)
+        if recurring.is_active:
+            Materializer().materialize(recurring._state.db, [recurring])
+
+    def perform_destroy(self, instance):
+        # Started or finished occurrences stay, detached from the rule
+        clear_upcoming(instance)
+        instance.delete()
+
+# ==================== OFFLINE SYNC ====================
+
+class SyncView(ConcurrencyLimitMixin, APIView):
+    """Apply the PWA's queued offline writes in one request (see core/idempotency.py)"""
+    permission_classes = [IsAuthenticated]
+    concurrency_scope = 'sync'
+
+    def post(self, request):
+        results = replay(request.user, validate_log(request.data))
+        return Response({'results': results})
+
 # ==================== ADMIN MANAGEMENT ====================
 
 #@api_view(['POST'])
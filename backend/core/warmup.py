@@ -0,0 +1,164 @@
+"""
+Warm-up pass run before a process takes traffic (see ``gunicorn.conf.py``).
+
+The first request of a fresh process otherwise pays for URL resolver
+population, DRF settings and renderer imports, serializer field construction,
+the middleware chain's lazy imports and opening DB connections. With
+``preload_app`` the import work happens once in the gunicorn master and is
+shared copy-on-write; each worker then only opens its own connections.
+
+Only import this module's heavy dependencies inside functions:
+``measure_startup`` runs before Django is set up.
+"""
+
+import io
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Resolved once so their resolver and regex caches are built
+WARM_PATHS = (
+    '/api/auth/csrf/',
+    '/api/auth/login/',
+    '/api/auth/check/',
+    '/api/clients/',
+    '/api/clients/1/',
+    '/api/workers/',
+    '/api/tasks/',
+    '/api/tasks/1/',
+    '/api/tasks/analytics/',
+    '/api/tasks/calendar/',
+)
+
+
+def warm_request(application, path='/api/auth/csrf/', session_lookup=False):
+    """
+    Run an anonymous GET through the full WSGI stack. It needs no database
+    unless ``session_lookup`` sends an unknown session cookie, which costs one
+    session SELECT like any logged-in request.
+    """
+    from django.conf import settings
+
+    host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'HTTP_X_FORWARDED_PROTO': 'https',
+        'HTTP_X_REQUEST_ID': 'warm-up',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'https',
+    }
+    if session_lookup:
+        environ['HTTP_COOKIE'] = f'{settings.SESSION_COOKIE_NAME}=warm-up'
+    status = []
+    response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        b''.join(response)
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return status[0] if status else None
+
+
+def open_connections():
+    """Connect to every configured database (persistent via CONN_MAX_AGE)"""
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def warm_up(application=None, connect=True):
+    """
+    Resolve routes, build serializers, import lazily loaded DRF settings,
+    push one request through ``application`` and (``connect=True``) open a
+    connection to every database. Returns timings in milliseconds.
+    """
+    from django.urls import Resolver404, get_resolver, resolve
+    from rest_framework.settings import api_settings
+
+    timings = {}
+    started = time.perf_counter()
+
+    def lap(name):
+        nonlocal started
+        now = time.perf_counter()
+        timings[name] = round((now - started) * 1000, 2)
+        started = now
+
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for path in WARM_PATHS:
+        try:
+            resolve(path)
+        except Resolver404:
+            pass
+    lap('routes_ms')
+
+    from .serializers import UserSerializer
+    from .urls import router
+    for serializer_class in [UserSerializer] + [viewset.serializer_class for _, viewset, _ in router.registry]:
+        serializer_class().fields
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                 'DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES'):
+        getattr(api_settings, name)
+    lap('serializers_ms')
+
+    if application is not None:
+        timings['status'] = warm_request(application)
+        lap('request_ms')
+
+    if connect:
+        open_connections()
+        lap('connect_ms')
+
+    logger.info('Warm-up done', extra=timings)
+    return timings
+
+
+def measure_startup(warm=True):
+    """
+    Time a cold start in this (fresh) process and print it as JSON: settings
+    import, ``django.setup()``, WSGI handler, optional warm-up, then the first
+    and second request (each with a session lookup, so the first one opens the
+    DB connection unless the warm-up did). Used by the ``startup_benchmark`` command.
+    """
+    report = {}
+    started = time.perf_counter()
+
+    def lap(name):
+        nonlocal started
+        now = time.perf_counter()
+        report[name] = round((now - started) * 1000, 2)
+        started = now
+
+    from django.conf import settings
+    settings.INSTALLED_APPS
+    lap('settings_ms')
+
+    import django
+    django.setup(set_prefix=False)
+    lap('setup_ms')
+
+    from django.core.handlers.wsgi import WSGIHandler
+    application = WSGIHandler()
+    lap('handler_ms')
+
+    if warm:
+        warm_up(application)
+        lap('warm_up_ms')
+
+    warm_request(application, session_lookup=True)
+    lap('first_request_ms')
+    warm_request(application, session_lookup=True)
+    lap('second_request_ms')
+
+    print(json.dumps(report))
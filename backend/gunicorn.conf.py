@@ -0,0 +1,41 @@
+"""
+gunicorn settings for production (``gunicorn backend.wsgi:application -c gunicorn.conf.py``).
+
+With ``preload_app`` the master imports Django, the URLconf, serializers and
+DRF settings once and runs the warm-up pass; workers are forked from it and
+share that memory copy-on-write, so starting or recycling a worker costs
+almost nothing. Each worker opens its own DB connections before it accepts
+its first request. ``GUNICORN_PRELOAD=False`` restores per-worker imports
+(needed for ``--reload``).
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Recycle workers to cap memory growth; cheap now that workers start preloaded
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from django.db import connections
+    from core.warmup import warm_up
+
+    warm_up(server.app.wsgi(), connect=False)
+    # Connections must not be shared with forked workers
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    from core.warmup import open_connections, warm_up
+
+    if preload_app:
+        # Preloaded workers inherit everything but the DB connections
+        open_connections()
+    else:
+        warm_up(worker.wsgi)
@@ -135,4 +135,98 @@ export const authAPI = {
     },
 };
 
+// Offline writes: queued in localStorage while the network is down and
+// replayed in one request on reconnect. Every mutation carries an
+// idempotency key, so resending the queue after a lost response is safe.
+const QUEUE_KEY = 'offlineMutations';
+const SYNC_BATCH_SIZE = 500;  // SYNC_MAX_MUTATIONS on the backend; refs resolve within a batch
+
+const newIdempotencyKey = () => (
+    window.crypto && window.crypto.randomUUID
+        ? window.crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+);
+
+// True when a request failed without reaching the server
+export const isOfflineError = (error) => !error.response;
+
+// Rows created offline use their ref as id until the queue is replayed
+const OFFLINE_ID_PREFIX = 'offline:';
+export const isOfflineId = (id) => typeof id === 'string' && id.startsWith(OFFLINE_ID_PREFIX);
+// An id as the sync log expects it: { ref } for rows created offline
+export const queuedId = (id) => (isOfflineId(id) ? { ref: id } : id);
+// The mutation's id and its *_id fields, the values that may be refs
+const idValues = ({ id, data = {} }) => [
+    id,
+    ...Object.entries(data).filter(([name]) => name.endsWith('_id')).map(([, value]) => value),
+];
+
+export const offlineQueue = {
+    pending: () => JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]'),
+
+    // type: 'client' | 'worker' | 'task'; op: 'create' | 'update' | 'delete'.
+    // Creates get a `ref` (an offline id) that later mutations use in place of
+    // the id the row doesn't have yet, e.g. data: { client_id: { ref } }.
+    enqueue: ({ type, op, id, version, data }) => {
+        const key = newIdempotencyKey();
+        const mutation = { key, type, op };
+        if (id !== undefined) mutation.id = queuedId(id);
+        if (op === 'create') mutation.ref = `${OFFLINE_ID_PREFIX}${key}`;
+        if (version !== undefined) mutation.version = version;
+        if (data !== undefined) {
+            mutation.data = Object.fromEntries(Object.entries(data).map(
+                ([name, value]) => [name, name.endsWith('_id') ? queuedId(value) : value]
+            ));
+        }
+        localStorage.setItem(QUEUE_KEY, JSON.stringify([...offlineQueue.pending(), mutation]));
+        return mutation;
+    },
+
+    // Replay the queue; returns the per-mutation results. Mutations the server
+    // answered (applied or rejected) leave the queue; on a network error or a
+    // failed request everything stays queued for the next attempt.
+    flush: async () => {
+        const results = [];
+        let queued = offlineQueue.pending();
+        while (queued.length > 0) {
+            const batch = queued.slice(0, SYNC_BATCH_SIZE);
+            const response = await api.post('sync/', { mutations: batch });
+            results.push(...response.data.results);
+            const sent = new Set(batch.map((mutation) => mutation.key));
+            queued = offlineQueue.pending().filter((mutation) => !sent.has(mutation.key));
+            localStorage.setItem(QUEUE_KEY, JSON.stringify(queued));
+        }
+        if (results.length > 0) {
+            window.dispatchEvent(new CustomEvent('offline-sync', { detail: results }));
+        }
+        return results;
+    },
+};
+
+// Send a write now, or queue it when the network is down. Writes that follow
+// queued ones, or touch rows that only exist in the queue, are queued as well
+// so the server sees them in order. Returns { data } once the server answered,
+// or { queued } with the mutation (a create's `queued.ref` is its offline id).
+// Server errors are thrown as usual.
+export const sendOrQueue = async (request, mutation) => {
+    const mustQueue = offlineQueue.pending().length > 0 || idValues(mutation).some(isOfflineId);
+    if (!mustQueue) {
+        try {
+            const response = await request();
+            return { data: response.data };
+        } catch (error) {
+            if (!isOfflineError(error)) throw error;
+        }
+    }
+    const queued = offlineQueue.enqueue(mutation);
+    if (navigator.onLine) {
+        offlineQueue.flush().catch((error) => console.error('Offline sync failed:', error));
+    }
+    return { queued };
+};
+
+window.addEventListener('online', () => {
+    offlineQueue.flush().catch((error) => console.error('Offline sync failed:', error));
+});
+
 export default api;
\ No newline at end of file
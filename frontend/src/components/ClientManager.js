@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
-import api from '../api';
+import api, { sendOrQueue } from '../api';
 
-function ClientManager({ clients, onRefresh, searchQuery }) {
+function ClientManager({ clients, onRefresh, onQueued, searchQuery }) {
   const [showCreate, setShowCreate] = useState(false);
   const [showEdit, setShowEdit] = useState(false);
   const [editingClient, setEditingClient] = useState(null);
@@ -27,23 +27,23 @@ function ClientManager({ clients, onRefresh, searchQuery }) {
       }
 
       try {
-        if (client) {
-          await api.patch(`clients/${client.id}/`, {
-            name,
-            contact_email: contactEmail || null,
-            phone: phone || null,
-            notes: notes || null,
-          });
+        const data = {
+          name,
+          contact_email: contactEmail || null,
+          phone: phone || null,
+          notes: notes || null,
+        };
+        const { queued } = client
+          ? await sendOrQueue(() => api.patch(`clients/${client.id}/`, data),
+              { type: 'client', op: 'update', id: client.id, data })
+          : await sendOrQueue(() => api.post('clients/', data),
+              { type: 'client', op: 'create', data });
+        if (queued) {
+          onQueued(queued, data);
         } else {
-          await api.post('clients/', {
-            name,
-            contact_email: contactEmail || null,
-            phone: phone || null,
-            notes: notes || null,
-          });
+          onRefresh();
         }
         onSuccess();
-        onRefresh();
         onClose();
       } catch (err) {
         let errMsg = 'Failed to save client. Check console for details.';
@@ -157,8 +157,13 @@ function ClientManager({ clients, onRefresh, searchQuery }) {
             <h3>Delete {deletingClient.name}?</h3>
             <p>This cannot be undone.</p>
             <button onClick={async () => {
-              await api.delete(`clients/${deletingClient.id}/`);
-              onRefresh();
+              const { queued } = await sendOrQueue(() => api.delete(`clients/${deletingClient.id}/`),
+                { type: 'client', op: 'delete', id: deletingClient.id });
+              if (queued) {
+                onQueued(queued);
+              } else {
+                onRefresh();
+              }
               setDeletingClient(null);
             }} style={{ padding: '12px 24px', background: '#d32f2f', color: 'white', border: 'none', borderRadius: '8px', marginRight: '12px' }}>
               Delete
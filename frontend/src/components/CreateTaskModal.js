@@ -3,12 +3,26 @@ import { useCreateBlockNote } from "@blocknote/react";
 import { BlockNoteView } from "@blocknote/mantine";
 import "@blocknote/core/fonts/inter.css";
 import "@blocknote/mantine/style.css";
-import api from '../api';
+import api, { isOfflineError, sendOrQueue } from '../api';
 
-function CreateTaskModal({ clients, workers, onClose, onSuccess }) {
+// Repeat choices -> recurring task rule (weekly/monthly repeat on the due date's weekday/day)
+const REPEAT_RULES = {
+  DAILY: 'FREQ=DAILY',
+  WEEKDAYS: 'FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR',
+  WEEKLY: 'FREQ=WEEKLY',
+  MONTHLY: 'FREQ=MONTHLY',
+};
+
+const localISODate = (date) => {
+  const offset = date.getTimezoneOffset() * 60000;
+  return new Date(date.getTime() - offset).toISOString().slice(0, 10);
+};
+
+function CreateTaskModal({ clients, workers, onClose, onSuccess, onQueued }) {
   const [clientId, setClientId] = useState('');
   const [workerId, setWorkerId] = useState('');
   const [dueDate, setDueDate] = useState('');
+  const [repeat, setRepeat] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [isMobile, setIsMobile] = useState(window.innerWidth <= 768);
@@ -56,18 +70,40 @@ function CreateTaskModal({ clients, workers, onClose, onSuccess }) {
     }
 
     try {
-      const response = await api.post('tasks/', {
-        description: content,                    // Send JSON array directly
-        client_id: clientId || null,
-        assigned_worker_id: workerId || null,
-        due_date: dueDate || null,
-        status: 'TODO',
-      });
-
-      onSuccess(response.data);
+      if (repeat) {
+        // A repeating task is saved as a rule; the server creates its upcoming
+        // occurrences right away, so the refreshed list already shows them
+        const response = await api.post('recurring-tasks/', {
+          description: content,
+          client_id: clientId || null,
+          assigned_worker_id: workerId || null,
+          rule: REPEAT_RULES[repeat],
+          starts_on: dueDate || localISODate(new Date()),
+        });
+        onSuccess(response.data);
+      } else {
+        const data = {
+          description: content,                    // Send JSON array directly
+          client_id: clientId || null,
+          assigned_worker_id: workerId || null,
+          due_date: dueDate || null,
+          status: 'TODO',
+        };
+        const { data: created, queued } = await sendOrQueue(() => api.post('tasks/', data),
+          { type: 'task', op: 'create', data });
+        if (queued) {
+          onQueued(queued, data);
+        } else {
+          onSuccess(created);
+        }
+      }
       onClose(); // Close modal on success
     } catch (err) {
-      setError(err.response?.data?.detail || 'Failed to create task. Try again.');
+      if (isOfflineError(err)) {
+        setError('Repeating tasks can only be created while online.');
+      } else {
+        setError(err.response?.data?.detail || 'Failed to create task. Try again.');
+      }
       console.error('Create task error:', err);
     } finally {
       setLoading(false);
@@ -208,28 +244,64 @@ function CreateTaskModal({ clients, workers, onClose, onSuccess }) {
             </div>
           </div>
 
-          <div style={{ marginBottom: '30px' }}>
-            <label style={{ 
-              display: 'block', 
-              marginBottom: '8px', 
-              fontWeight: 'bold',
-              fontSize: isMobile ? '15px' : '14px'
-            }}>
-              Due Date
-            </label>
-            <input
-              type="date"
-              value={dueDate}
-              onChange={(e) => setDueDate(e.target.value)}
-              style={{ 
-                width: '100%', 
-                padding: isMobile ? '14px' : '12px', 
-                borderRadius: '8px', 
-                border: '1px solid #d1d5db',
-                fontSize: isMobile ? '16px' : '14px',
-                backgroundColor: '#fafafa'
-              }}
-            />
+          <div style={{ 
+            display: 'grid', 
+            gridTemplateColumns: isMobile ? '1fr' : '1fr 1fr', 
+            gap: isMobile ? '16px' : '20px', 
+            marginBottom: '30px' 
+          }}>
+            <div>
+              <label style={{ 
+                display: 'block', 
+                marginBottom: '8px', 
+                fontWeight: 'bold',
+                fontSize: isMobile ? '15px' : '14px'
+              }}>
+                {repeat ? 'First Due Date' : 'Due Date'}
+              </label>
+              <input
+                type="date"
+                value={dueDate}
+                onChange={(e) => setDueDate(e.target.value)}
+                style={{ 
+                  width: '100%', 
+                  padding: isMobile ? '14px' : '12px', 
+                  borderRadius: '8px', 
+                  border: '1px solid #d1d5db',
+                  fontSize: isMobile ? '16px' : '14px',
+                  backgroundColor: '#fafafa'
+                }}
+              />
+            </div>
+
+            <div>
+              <label style={{ 
+                display: 'block', 
+                marginBottom: '8px', 
+                fontWeight: 'bold',
+                fontSize: isMobile ? '15px' : '14px'
+              }}>
+                Repeat
+              </label>
+              <select
+                value={repeat}
+                onChange={(e) => setRepeat(e.target.value)}
+                style={{ 
+                  width: '100%', 
+                  padding: isMobile ? '14px' : '12px', 
+                  borderRadius: '8px', 
+                  border: '1px solid #d1d5db',
+                  fontSize: isMobile ? '16px' : '14px',
+                  backgroundColor: '#fafafa'
+                }}
+              >
+                <option value="">Does not repeat</option>
+                <option value="DAILY">Every day</option>
+                <option value="WEEKDAYS">Every weekday</option>
+                <option value="WEEKLY">Every week</option>
+                <option value="MONTHLY">Every month</option>
+              </select>
+            </div>
           </div>
 
           {error && (
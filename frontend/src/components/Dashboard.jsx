@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from '../api';
+import api, { offlineQueue, sendOrQueue } from '../api';
 import CreateTaskModal from './CreateTaskModal';
 import EditTaskModal from './EditTaskModal';
 import ClientManager from './ClientManager';
@@ -42,6 +42,23 @@ function Dashboard({ user, onLogout }) {
     fetchData();
   }, []);
 
+  // Offline writes replayed: report the rejected ones and load the server's rows
+  useEffect(() => {
+    const handleSync = (event) => {
+      const failed = event.detail.filter((result) => result.status >= 400);
+      if (failed.length > 0) {
+        alert(`${failed.length} change(s) made offline could not be saved.`);
+      }
+      fetchData();
+    };
+    window.addEventListener('offline-sync', handleSync);
+    // Left over from an earlier session
+    if (offlineQueue.pending().length > 0 && navigator.onLine) {
+      offlineQueue.flush().catch((error) => console.error('Offline sync failed:', error));
+    }
+    return () => window.removeEventListener('offline-sync', handleSync);
+  }, []);
+
   const fetchData = async () => {
     try {
       setLoading(true);
@@ -60,10 +77,35 @@ function Dashboard({ user, onLogout }) {
     }
   };
 
+  // Show a queued offline write right away; the rows stay marked pending
+  // until the queue is replayed and the lists are fetched again
+  const handleQueued = (mutation, data = {}) => {
+    const setRows = { client: setClients, worker: setWorkers, task: setTasks }[mutation.type];
+    const row = { ...data, pending: true };
+    if (mutation.type === 'task') {
+      // The task list shows related names; the form only has their ids
+      const byId = (rows, id) => rows.find((item) => String(item.id) === String(id)) || null;
+      if ('client_id' in data) row.client = byId(clients, data.client_id);
+      if ('assigned_worker_id' in data) row.assigned_worker = byId(workers, data.assigned_worker_id);
+    }
+    if (mutation.op === 'create') {
+      setRows((rows) => [{ ...row, id: mutation.ref }, ...rows]);
+      return;
+    }
+    const id = mutation.id.ref || mutation.id;
+    if (mutation.op === 'delete') {
+      setRows((rows) => rows.filter((item) => item.id !== id));
+    } else {
+      setRows((rows) => rows.map((item) => (item.id === id ? { ...item, ...row } : item)));
+    }
+  };
+
   const handleDeleteTask = async () => {
     if (!deletingTask) return;
     try {
-      await api.delete(`tasks/${deletingTask.id}/`);
+      // Removed from the list either way; a queued delete is sent on reconnect
+      await sendOrQueue(() => api.delete(`tasks/${deletingTask.id}/`),
+        { type: 'task', op: 'delete', id: deletingTask.id });
       setTasks(tasks.filter(t => t.id !== deletingTask.id));
       setDeletingTask(null);
     } catch (err) {
@@ -489,6 +531,9 @@ function Dashboard({ user, onLogout }) {
                           }}>
                             <RichTextPreview content={task.description} />
                           </div>
+                          {task.pending && (
+                            <div style={{ fontSize: '12px', color: '#999' }}>Waiting to sync</div>
+                          )}
                           {isMobile && (
                             <div style={{ 
                               display: 'flex', 
@@ -676,8 +721,8 @@ function Dashboard({ user, onLogout }) {
               )}
 
               {/* Other Tabs */}
-              {activeTab === 'clients' && <ClientManager clients={clients} onRefresh={fetchData} searchQuery={searchQuery} />}
-              {activeTab === 'workers' && <WorkerManager workers={workers} onRefresh={fetchData} searchQuery={searchQuery} />}
+              {activeTab === 'clients' && <ClientManager clients={clients} onRefresh={fetchData} onQueued={handleQueued} searchQuery={searchQuery} />}
+              {activeTab === 'workers' && <WorkerManager workers={workers} onRefresh={fetchData} onQueued={handleQueued} searchQuery={searchQuery} />}
               {activeTab === 'analytics' && (
                 <AnalyticsTab tasks={tasks} clients={clients} workers={workers} />
               )}
@@ -736,6 +781,7 @@ function Dashboard({ user, onLogout }) {
           workers={workers} 
           onClose={() => setShowCreateModal(false)} 
           onSuccess={fetchData} 
+          onQueued={handleQueued}
         />
       )}
       
@@ -746,6 +792,7 @@ function Dashboard({ user, onLogout }) {
           workers={workers} 
           onClose={() => setShowEditModal(false)} 
           onSuccess={fetchData} 
+          onQueued={handleQueued}
         />
       )}
       
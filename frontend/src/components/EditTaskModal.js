@@ -3,9 +3,9 @@ import { useCreateBlockNote } from "@blocknote/react";
 import { BlockNoteView } from "@blocknote/mantine";
 import "@blocknote/core/fonts/inter.css";
 import "@blocknote/mantine/style.css";
-import api from '../api';
+import api, { isOfflineId, sendOrQueue } from '../api';
 
-function EditTaskModal({ task, clients, workers, onClose, onSuccess }) {
+function EditTaskModal({ task, clients, workers, onClose, onSuccess, onQueued }) {
   const [clientId, setClientId] = useState(task.client?.id || '');
   const [workerId, setWorkerId] = useState(task.assigned_worker?.id || '');
   const [dueDate, setDueDate] = useState(task.due_date || '');
@@ -49,18 +49,38 @@ function EditTaskModal({ task, clients, workers, onClose, onSuccess }) {
     const richDescription = editor.document;
 
     try {
-      const response = await api.patch(`tasks/${task.id}/`, {
+      // If-Match rejects the save (409) if someone else edited the task since
+      // it was loaded; return=minimal skips the full task since we refetch anyway
+      const headers = { Prefer: 'return=minimal' };
+      const version = task.version && !isOfflineId(task.id) ? task.version : undefined;
+      if (version) {
+        headers['If-Match'] = `"${version}"`;
+      }
+      const data = {
         description: richDescription,           // send JSON directly
         client_id: clientId || null,
         assigned_worker_id: workerId || null,
         due_date: dueDate || null,
         status,
-      });
-
-      onSuccess(response.data);
+      };
+      // Queued offline edits carry the same version, so a conflicting edit
+      // made meanwhile is reported when the queue is replayed
+      const { data: updated, queued } = await sendOrQueue(
+        () => api.patch(`tasks/${task.id}/`, data, { headers }),
+        { type: 'task', op: 'update', id: task.id, version, data }
+      );
+      if (queued) {
+        onQueued(queued, data);
+      } else {
+        onSuccess(updated);
+      }
       onClose();
     } catch (err) {
-      setError('Failed to update task. Try again.');
+      if (err.response && err.response.status === 409) {
+        setError('This task was changed by someone else. Close and reopen it to see the latest version.');
+      } else {
+        setError('Failed to update task. Try again.');
+      }
       console.error(err);
     } finally {
       setLoading(false);
@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
-import api from '../api';
+import api, { sendOrQueue } from '../api';
 
-function WorkerManager({ workers, onRefresh, searchQuery }) {  // ← Added searchQuery prop
+function WorkerManager({ workers, onRefresh, onQueued, searchQuery }) {  // ← Added searchQuery prop
   const [showCreate, setShowCreate] = useState(false);
   const [showEdit, setShowEdit] = useState(false);
   const [editingWorker, setEditingWorker] = useState(null);
@@ -18,13 +18,18 @@ function WorkerManager({ workers, onRefresh, searchQuery }) {  // ← Added sear
       e.preventDefault();
       setLoading(true);
       try {
-        if (worker) {
-          await api.patch(`workers/${worker.id}/`, { name, skills, availability, contact_email: contactEmail });
+        const data = { name, skills, availability, contact_email: contactEmail };
+        const { queued } = worker
+          ? await sendOrQueue(() => api.patch(`workers/${worker.id}/`, data),
+              { type: 'worker', op: 'update', id: worker.id, data })
+          : await sendOrQueue(() => api.post('workers/', data),
+              { type: 'worker', op: 'create', data });
+        if (queued) {
+          onQueued(queued, data);
         } else {
-          await api.post('workers/', { name, skills, availability, contact_email: contactEmail });
+          onRefresh();
         }
         onSuccess();
-        onRefresh();
       } catch (err) {
         alert('Failed to save worker');
       } finally {
@@ -119,8 +124,13 @@ function WorkerManager({ workers, onRefresh, searchQuery }) {  // ← Added sear
             <h3>Delete {deletingWorker.name}?</h3>
             <p>This cannot be undone.</p>
             <button onClick={async () => {
-              await api.delete(`workers/${deletingWorker.id}/`);
-              onRefresh();
+              const { queued } = await sendOrQueue(() => api.delete(`workers/${deletingWorker.id}/`),
+                { type: 'worker', op: 'delete', id: deletingWorker.id });
+              if (queued) {
+                onQueued(queued);
+              } else {
+                onRefresh();
+              }
               setDeletingWorker(null);
             }} style={{ padding: '12px 24px', background: '#d32f2f', color: 'white', border: 'none', borderRadius: '8px', marginRight: '12px' }}>
               Delete